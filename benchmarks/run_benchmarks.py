@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Benchmark de geração, serialização e upload dos scripts de setup
+Cada caso roda em um processo isolado contra um S3 local (moto ou binário do MinIO)
+e os resultados são salvos em JSON para comparação entre versões
+"""
+
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETUP_DIR = os.path.join(ROOT_DIR, 'src', '02_setup')
+sys.path.insert(0, SETUP_DIR)
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+# Bucket usado pelos casos de upload
+BENCHMARK_BUCKET = "benchmark-zone"
+
+# Geradores avaliados: nome do caso -> (script, função)
+GENERATORS = {
+    'landing_csv': ('02_landing_csv.py', 'generate_fake_data_records'),
+    'landing_json': ('03_landing_json.py', 'generate_fake_data_records'),
+    'landing_parquet': ('04_landing_parquet.py', 'generate_fake_data_records'),
+    'bronze': ('03_bronze_zone.py', 'generate_bronze_data'),
+    'silver': ('04_silver_zone.py', 'generate_silver_data'),
+    'gold': ('05_gold_zone.py', 'generate_gold_data'),
+}
+
+# Serializadores e o gerador que fornece a entrada de cada um
+SERIALIZERS = {
+    'csv': 'landing_csv',
+    'json': 'landing_json',
+    'ndjson': 'landing_json',
+    'parquet': 'landing_parquet',
+}
+
+# Caminhos de upload: put_object do arquivo inteiro, multipart de um corpo pronto
+# e serialização Parquet direto no multipart (o caminho usado pelos scripts)
+UPLOADS = ['put_object', 'multipart', 'streaming_parquet']
+
+STAGES = ['generate', 'serialize', 'upload']
+
+MB = 1024 * 1024
+
+
+class CountingSink(io.RawIOBase):
+    """Destino de escrita que só conta os bytes recebidos"""
+
+    def __init__(self):
+        super().__init__()
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return len(data)
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo atual em MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    return peak / MB if sys.platform == 'darwin' else peak / 1024
+
+
+def generate(case, rows, seed):
+    """Gera os dados de um caso com a função do script correspondente"""
+    from scripts import load_script
+
+    file_name, function_name = GENERATORS[case]
+    return getattr(load_script(file_name), function_name)(rows, seed=seed)
+
+
+def serialize(fmt, data, fileobj):
+    """Serializa os dados no formato pedido para um arquivo de destino"""
+    from serializers import iter_csv_chunks, iter_json_array_chunks, iter_ndjson_chunks, write_parquet
+
+    if fmt == 'parquet':
+        write_parquet(data, fileobj)
+        return
+    if fmt == 'csv':
+        chunks = iter_csv_chunks(data)
+    elif fmt == 'json':
+        chunks = iter_json_array_chunks(data)
+    else:
+        chunks = iter_ndjson_chunks([data])
+    for chunk in chunks:
+        fileobj.write(chunk)
+
+
+def bench_generate(case, rows, seed):
+    """Mede a geração de um dataset"""
+    start = time.perf_counter()
+    generate(case, rows, seed)
+    elapsed = time.perf_counter() - start
+    return {
+        'stage': 'generate',
+        'case': case,
+        'rows': rows,
+        'seconds': elapsed,
+        'rows_per_sec': rows / elapsed,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def bench_serialize(fmt, rows, seed):
+    """Mede a serialização (sem I/O) de um dataset já gerado"""
+    data = generate(SERIALIZERS[fmt], rows, seed)
+    sink = CountingSink()
+    start = time.perf_counter()
+    serialize(fmt, data, sink)
+    elapsed = time.perf_counter() - start
+    return {
+        'stage': 'serialize',
+        'case': fmt,
+        'rows': rows,
+        'seconds': elapsed,
+        'bytes': sink.bytes_written,
+        'rows_per_sec': rows / elapsed,
+        'mb_per_sec': sink.bytes_written / MB / elapsed,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def bench_upload(path, rows, seed, objects):
+    """Mede o upload de vários objetos Parquet, com a latência de cada um"""
+    from storage import MultipartUploadWriter, get_s3_client, upload_stream
+    from serializers import write_parquet
+
+    table = generate('landing_parquet', rows, seed)
+    buffer = io.BytesIO()
+    write_parquet(table, buffer)
+    body = buffer.getvalue()
+
+    s3_client = get_s3_client()
+    latencies = []
+    for index in range(objects):
+        file_path = f"benchmarks/{path}/{rows}/object_{index:05d}.parquet"
+        start = time.perf_counter()
+        if path == 'put_object':
+            s3_client.put_object(Bucket=BENCHMARK_BUCKET, Key=file_path, Body=body)
+        elif path == 'multipart':
+            chunks = (body[offset:offset + MB] for offset in range(0, len(body), MB))
+            upload_stream(s3_client, BENCHMARK_BUCKET, file_path, chunks)
+        else:
+            with MultipartUploadWriter(s3_client, BENCHMARK_BUCKET, file_path) as writer:
+                write_parquet(table, writer)
+        latencies.append(time.perf_counter() - start)
+
+    elapsed = sum(latencies)
+    return {
+        'stage': 'upload',
+        'case': path,
+        'rows': rows,
+        'objects': objects,
+        'seconds': elapsed,
+        'bytes': len(body) * objects,
+        'rows_per_sec': rows * objects / elapsed,
+        'mb_per_sec': len(body) * objects / MB / elapsed,
+        'latency_p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'latency_p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_isolated(function, *args):
+    """Executa um caso em um processo novo, para que o pico de memória seja só dele"""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(function, *args).result()
+
+
+def free_port():
+    """Encontra uma porta TCP livre na máquina local"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    """Espera até que algo esteja escutando na porta"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise TimeoutError(f"Nada escutando em 127.0.0.1:{port} após {timeout}s")
+
+
+def start_s3(kind, minio_binary):
+    """Sobe o S3 local do benchmark e aponta os scripts para ele; devolve a função de parada"""
+    if kind == 'external':
+        return lambda: None
+
+    port = free_port()
+    os.environ['MINIO_ENDPOINT'] = f"127.0.0.1:{port}"
+    os.environ['MINIO_SECURE'] = 'false'
+
+    if kind == 'moto':
+        from moto.server import ThreadedMotoServer
+
+        server = ThreadedMotoServer(ip_address='127.0.0.1', port=port)
+        server.start()
+        return server.stop
+
+    data_dir = tempfile.mkdtemp(prefix='minio-benchmark-')
+    env = dict(os.environ,
+               MINIO_ROOT_USER=os.environ.get('MINIO_ACCESS_KEY', 'minioadmin'),
+               MINIO_ROOT_PASSWORD=os.environ.get('MINIO_SECRET_KEY', 'minioadmin'))
+    process = subprocess.Popen(
+        [minio_binary, 'server', data_dir, '--address', f"127.0.0.1:{port}"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_for_port(port)
+
+    def stop():
+        process.terminate()
+        process.wait()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return stop
+
+
+def compare_results(results, baseline_path, tolerance):
+    """Compara com um resultado anterior e devolve os casos que ficaram mais lentos"""
+    with open(baseline_path) as f:
+        baseline = {
+            (result['stage'], result['case'], result['rows']): result
+            for result in json.load(f)['results']
+        }
+
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['stage'], result['case'], result['rows']))
+        if previous is None:
+            continue
+        ratio = result['rows_per_sec'] / previous['rows_per_sec']
+        if ratio < 1 - tolerance:
+            regressions.append(dict(result, baseline_rows_per_sec=previous['rows_per_sec'], ratio=ratio))
+    return regressions
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000],
+                        help='Quantidades de registros avaliadas (padrão: 10000 100000)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES,
+                        help='Etapas avaliadas (padrão: todas)')
+    parser.add_argument('--objects', type=int, default=20,
+                        help='Objetos enviados por caso de upload (padrão: 20)')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Seed dos dados gerados (padrão: 42)')
+    parser.add_argument('--s3', choices=['moto', 'minio', 'external'], default='moto',
+                        help='S3 local usado nos uploads: moto em processo, binário do MinIO '
+                             'ou o endpoint de MINIO_ENDPOINT (padrão: moto)')
+    parser.add_argument('--minio-binary', default='minio',
+                        help='Caminho do binário do MinIO para --s3 minio')
+    parser.add_argument('--output', default=None,
+                        help='Arquivo JSON de saída (padrão: benchmarks/results/benchmark_{timestamp}.json)')
+    parser.add_argument('--compare', default=None,
+                        help='Resultado anterior para detectar regressões de throughput')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Queda de rows/s tolerada na comparação (padrão: 0.10)')
+    args = parser.parse_args()
+    logger.info("Iniciando benchmark...")
+
+    stop_s3 = start_s3(args.s3, args.minio_binary) if 'upload' in args.stages else (lambda: None)
+    results = []
+    try:
+        if 'upload' in args.stages:
+            from storage import get_s3_client
+            from botocore.exceptions import ClientError
+
+            try:
+                get_s3_client().create_bucket(Bucket=BENCHMARK_BUCKET)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('BucketAlreadyOwnedByYou', 'BucketAlreadyExists'):
+                    raise
+
+        for rows in args.rows:
+            cases = []
+            if 'generate' in args.stages:
+                cases += [(bench_generate, case, rows, args.seed) for case in GENERATORS]
+            if 'serialize' in args.stages:
+                cases += [(bench_serialize, fmt, rows, args.seed) for fmt in SERIALIZERS]
+            if 'upload' in args.stages:
+                cases += [(bench_upload, path, rows, args.seed, args.objects) for path in UPLOADS]
+
+            for function, *case_args in cases:
+                result = run_isolated(function, *case_args)
+                results.append(result)
+                logger.info(
+                    f"{result['stage']:<9} {result['case']:<17} rows={rows:<9} "
+                    f"{result['rows_per_sec']:>12,.0f} rows/s  "
+                    f"{result.get('mb_per_sec', 0):>8.1f} MB/s  "
+                    f"pico {result['peak_rss_mb']:>7.0f} MB"
+                    + (f"  p50 {result['latency_p50_ms']:.1f} ms  p99 {result['latency_p99_ms']:.1f} ms"
+                       if 'latency_p50_ms' in result else '')
+                )
+    finally:
+        stop_s3()
+
+    # Salvar os resultados
+    output = args.output or os.path.join(ROOT_DIR, 'benchmarks', 'results', f"benchmark_{int(time.time())}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            's3': args.s3,
+            'results': results,
+        }, f, indent=2)
+    logger.info(f"Resultados salvos em {output}")
+
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.tolerance)
+        for regression in regressions:
+            logger.error(
+                f"Regressão em {regression['stage']}/{regression['case']} rows={regression['rows']}: "
+                f"{regression['rows_per_sec']:,.0f} rows/s vs {regression['baseline_rows_per_sec']:,.0f} "
+                f"({regression['ratio']:.0%})"
+            )
+        if regressions:
+            sys.exit(1)
+        logger.info("Nenhuma regressão encontrada")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
-def main():
-    print("Hello from jupyter-yt!")
+#!/usr/bin/env python3
+"""
+Ponto de entrada do projeto: executa o pipeline de setup do Data Lake
+(criação dos buckets, landing, zonas e promoções) em um único processo
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src', '02_setup'))
+
+from pipeline import main
 
 
 if __name__ == "__main__":
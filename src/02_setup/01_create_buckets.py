@@ -3,19 +3,17 @@
 Script para criar buckets no MinIO seguindo o padrão de Data Lake
 """
 
-import boto3
 from botocore.exceptions import ClientError
+import argparse
 import logging
 
+from metrics import add_metrics_arguments, script_stage
+from storage import get_s3_client
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuração do MinIO
-MINIO_ENDPOINT = "localhost:9000"
-MINIO_ACCESS_KEY = "minioadmin"
-MINIO_SECRET_KEY = "minioadmin"
-
 # Lista de buckets para criar seguindo o padrão de Data Lake
 BUCKETS = [
     "landing-zone",  # Dados brutos que chegam
@@ -24,16 +22,6 @@ BUCKETS = [
     "gold-zone"      # Dados finais para consumo
 ]
 
-def create_s3_client():
-    """Cria cliente S3 para MinIO"""
-    return boto3.client(
-        's3',
-        endpoint_url=f'http://{MINIO_ENDPOINT}',
-        aws_access_key_id=MINIO_ACCESS_KEY,
-        aws_secret_access_key=MINIO_SECRET_KEY,
-        region_name='us-east-1'  # MinIO precisa de uma região
-    )
-
 def create_bucket(s3_client, bucket_name):
     """Cria um bucket no MinIO"""
     try:
@@ -49,18 +37,29 @@ def create_bucket(s3_client, bucket_name):
             logger.error(f"Error creating bucket {bucket_name}: {e}")
             return False
 
-def main():
-    """Função principal para criar todos os buckets"""
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+@script_stage('buckets')
+def run(args):
+    """Cria todos os buckets (usado pelo main e pelo pipeline)"""
     logger.info("Starting bucket creation process...")
     
-    # Cria cliente S3
-    s3_client = create_s3_client()
+    # Cliente S3 compartilhado
+    s3_client = get_s3_client()
     
     # Cria cada bucket
-    for bucket in BUCKETS:
-        create_bucket(s3_client, bucket)
+    results = [create_bucket(s3_client, bucket) for bucket in BUCKETS]
     
     logger.info("Bucket creation process completed!")
+    return all(results)
+
+def main():
+    """Função principal para criar todos os buckets"""
+    run(parse_args())
 
 if __name__ == "__main__":
     main()
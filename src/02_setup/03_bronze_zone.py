@@ -4,74 +4,72 @@ Script para gerar dados CSV no bucket bronze-zone
 Dados limpos e estruturados do sistema Protheus
 """
 
-import boto3
 import pandas as pd
-from faker import Faker
-import random
-import time
 import logging
+from functools import partial
+
+from batch_generator import DEFAULT_BATCH_ROWS, BatchGenerator, format_dates, years
+from metrics import script_stage
+from partitioning import save_partitioned, save_streamed
+from serializers import write_csv, write_csv_batches
+from sharding import parse_generation_args, resolve_num_records, run_sharded, run_timestamp
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuração do MinIO
-MINIO_ENDPOINT = "localhost:9000"
-MINIO_ACCESS_KEY = "minioadmin"
-MINIO_SECRET_KEY = "minioadmin"
+def generate_bronze_columns(gen, num_records):
+    """Gera as colunas de um lote de dados da bronze zone"""
+    return {
+        'cliente_id': gen.uuid4(num_records),
+        'nome_completo': gen.text('name', num_records),
+        'email': gen.text('email', num_records),
+        'telefone': gen.text('phone_number', num_records),
+        'endereco_completo': gen.text('address', num_records),
+        'cidade': gen.text('city', num_records),
+        'estado': gen.text('state', num_records),
+        'cep': gen.text('postcode', num_records),
+        'data_nascimento': format_dates(gen.date_of_birth(18, 80, num_records)),
+        'data_cadastro': format_dates(gen.date_between(years(2), num_records)),
+        'salario_mensal': gen.uniform(2000, 15000, num_records),
+        'status_cliente': gen.choice(['ATIVO', 'INATIVO', 'SUSPENSO'], num_records),
+        'empresa': gen.text('company', num_records),
+        'cargo': gen.text('job', num_records),
+        'data_atualizacao': gen.timestamp()
+    }
 
-# Configurar Faker para português brasileiro
-fake = Faker('pt_BR')
+def generate_bronze_data(num_records, seed=None, reference_date=None):
+    """Gera dados limpos e estruturados para bronze zone em lote"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    return pd.DataFrame(generate_bronze_columns(gen, num_records))
 
-def generate_bronze_data(num_records):
-    """Gera dados limpos e estruturados para bronze zone"""
-    records = []
-    
-    for _ in range(num_records):
-        record = {
-            'cliente_id': fake.uuid4(),
-            'nome_completo': fake.name(),
-            'email': fake.email(),
-            'telefone': fake.phone_number(),
-            'endereco_completo': fake.address(),
-            'cidade': fake.city(),
-            'estado': fake.state(),
-            'cep': fake.postcode(),
-            'data_nascimento': fake.date_of_birth(minimum_age=18, maximum_age=80).strftime('%Y-%m-%d'),
-            'data_cadastro': fake.date_between(start_date='-2y', end_date='today').strftime('%Y-%m-%d'),
-            'salario_mensal': round(random.uniform(2000, 15000), 2),
-            'status_cliente': random.choice(['ATIVO', 'INATIVO', 'SUSPENSO']),
-            'empresa': fake.company(),
-            'cargo': fake.job(),
-            'data_atualizacao': time.strftime('%Y-%m-%d %H:%M:%S')
-        }
-        records.append(record)
-    
-    return records
+def generate_bronze_record_batches(num_records, seed=None, reference_date=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """Gera os dados em RecordBatches Arrow de tamanho fixo, sem materializar o dataset inteiro"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    yield from gen.iter_record_batches(generate_bronze_columns, num_records, batch_rows=batch_rows)
 
 def save_to_minio_bucket(data, bucket_name, file_path):
     """Salva dados no MinIO"""
     try:
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=f'http://{MINIO_ENDPOINT}',
-            aws_access_key_id=MINIO_ACCESS_KEY,
-            aws_secret_access_key=MINIO_SECRET_KEY,
-            region_name='us-east-1'
-        )
-        
-        # Converter para DataFrame e depois CSV
+        # Converter para DataFrame
         df = pd.DataFrame(data)
-        csv_content = df.to_csv(index=False, encoding='utf-8')
         
-        # Upload para MinIO
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=file_path,
-            Body=csv_content.encode('utf-8'),
-            ContentType='text/csv'
-        )
+        # Serializar o CSV em blocos direto no upload em streaming (multipart upload)
+        results = save_partitioned(write_csv, df, bucket_name, file_path)
+
+        for result in results:
+            if result['status'] == 'ok':
+                logger.info(f"Dados salvos em {bucket_name}/{result['key']}")
+        return all(result['status'] == 'ok' for result in results)
         
+    except Exception as e:
+        logger.error(f"Erro ao salvar dados: {e}")
+        return False
+
+def save_batches_to_minio_bucket(batches, bucket_name, file_path):
+    """Salva RecordBatches no MinIO como CSV, um lote por vez (memória limitada a um lote)"""
+    try:
+        save_streamed(write_csv_batches, batches, bucket_name, file_path)
         logger.info(f"Dados salvos em {bucket_name}/{file_path}")
         return True
         
@@ -79,28 +77,48 @@ def save_to_minio_bucket(data, bucket_name, file_path):
         logger.error(f"Erro ao salvar dados: {e}")
         return False
 
-def main():
-    """Função principal"""
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    return parse_generation_args(__doc__, argv=argv)
+
+@script_stage('bronze')
+def run(args):
+    """Gera os dados e salva no MinIO (usado pelo main e pelo pipeline)"""
     logger.info("Iniciando geração de dados para Bronze Zone...")
     
-    # Gerar número aleatório de registros
-    num_records = random.randint(2000, 8000)
+    # Número de registros: --rows ou aleatório
+    num_records = resolve_num_records(args, 2000, 8000)
     logger.info(f"Número de registros a serem gerados: {num_records}")
     
-    # Gerar dados falsos
-    data = generate_bronze_data(num_records)
-    
     # Definir caminho do arquivo no bucket
-    timestamp = int(time.time())
+    timestamp = run_timestamp(args)
     file_path = f"processed/protheus/clients_bronze_{timestamp}.csv"
     
-    # Salvar no MinIO
-    success = save_to_minio_bucket(data, "bronze-zone", file_path)
+    # Gerar tudo de uma vez ou em lotes Arrow (--batch-rows)
+    if args.batch_rows:
+        generate_fn = partial(generate_bronze_record_batches, batch_rows=args.batch_rows)
+        save_fn = save_batches_to_minio_bucket
+    else:
+        generate_fn = generate_bronze_data
+        save_fn = save_to_minio_bucket
+    
+    # Gerar e salvar no MinIO (um objeto por shard)
+    success = run_sharded(
+        generate_fn, save_fn, num_records, "bronze-zone", file_path,
+        workers=args.workers, seed=args.seed, rows_per_shard=args.rows_per_shard,
+        reference_date=args.as_of
+    )
     
     if success:
         logger.info("Processo concluído com sucesso!")
     else:
         logger.error("Erro no processo!")
+    
+    return success
+
+def main():
+    """Função principal"""
+    run(parse_args())
 
 if __name__ == "__main__":
     main()
@@ -4,112 +4,185 @@ Script para gerar dados JSON e salvar no bucket landing-zone
 Simulando dados de clientes do sistema SAP
 """
 
-import boto3
-import json
-from faker import Faker
-import random
-import time
 import logging
+from functools import partial
+
+from batch_generator import DEFAULT_BATCH_ROWS, BatchGenerator, build_records, format_dates, years
+from catalog import RollingFileStats, record_files
+from compression import add_compression_arguments, compressed_file_path, compression_options, write_compressed
+from metrics import script_stage
+from partitioning import add_partition_arguments, save_partitioned, save_streamed
+from serializers import DEFAULT_NDJSON_CHUNK_LINES, iter_ndjson_chunks, write_json_array, write_json_array_batches
+from schemas import LANDING_JSON_SCHEMA, text_schema
+from sharding import build_generation_parser, parse_generation_args, resolve_num_records, run_sharded, run_timestamp
+from storage import get_s3_client, upload_rolling
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuração do MinIO
-MINIO_ENDPOINT = "localhost:9000"
-MINIO_ACCESS_KEY = "minioadmin"
-MINIO_SECRET_KEY = "minioadmin"
-
-# Configurar Faker para português brasileiro
-fake = Faker('pt_BR')
+# Schema dos lotes Arrow: o do registro, com as datas como texto (como ficam no JSON)
+CLIENTS_SCHEMA = text_schema(LANDING_JSON_SCHEMA)
 
-def generate_fake_data_records(num_records):
-    """Gera dados falsos de clientes"""
-    records = []
-    
-    for _ in range(num_records):
-        record = {
-            'id': fake.uuid4(),
-            'nome': fake.name(),
-            'email': fake.email(),
-            'telefone': fake.phone_number(),
-            'endereco': {
-                'rua': fake.street_address(),
-                'cidade': fake.city(),
-                'estado': fake.state(),
-                'cep': fake.postcode(),
-                'pais': 'Brasil'
-            },
-            'data_nascimento': fake.date_of_birth(minimum_age=18, maximum_age=80).strftime('%Y-%m-%d'),
-            'data_cadastro': fake.date_between(start_date='-2y', end_date='today').strftime('%Y-%m-%d'),
-            'salario': round(random.uniform(1000, 15000), 2),
-            'status': random.choice(['ATIVO', 'INATIVO', 'PENDENTE']),
-            'empresa': {
-                'nome': fake.company(),
-                'cnpj': fake.cnpj(),
-                'setor': random.choice(['Tecnologia', 'Varejo', 'Saúde', 'Educação', 'Financeiro'])
-            },
-            'preferencias': {
-                'comunicacao': random.choice(['email', 'telefone', 'sms']),
-                'idioma': 'pt-BR',
-                'newsletter': random.choice([True, False])
-            }
+def generate_fake_data_columns(gen, num_records):
+    """Gera as colunas (com objetos aninhados) de um lote de clientes"""
+    return {
+        'id': gen.uuid4(num_records),
+        'nome': gen.text('name', num_records),
+        'email': gen.text('email', num_records),
+        'telefone': gen.text('phone_number', num_records),
+        'endereco': {
+            'rua': gen.text('street_address', num_records),
+            'cidade': gen.text('city', num_records),
+            'estado': gen.text('state', num_records),
+            'cep': gen.text('postcode', num_records),
+            'pais': 'Brasil'
+        },
+        'data_nascimento': format_dates(gen.date_of_birth(18, 80, num_records)),
+        'data_cadastro': format_dates(gen.date_between(years(2), num_records)),
+        'salario': gen.uniform(1000, 15000, num_records),
+        'status': gen.choice(['ATIVO', 'INATIVO', 'PENDENTE'], num_records),
+        'empresa': {
+            'nome': gen.text('company', num_records),
+            'cnpj': gen.text('cnpj', num_records),
+            'setor': gen.choice(['Tecnologia', 'Varejo', 'Saúde', 'Educação', 'Financeiro'], num_records)
+        },
+        'preferencias': {
+            'comunicacao': gen.choice(['email', 'telefone', 'sms'], num_records),
+            'idioma': 'pt-BR',
+            'newsletter': gen.booleans(num_records)
         }
-        records.append(record)
-    
-    return records
+    }
 
-def save_to_minio_bucket(data, bucket_name, file_path):
-    """Salva dados no MinIO"""
+def generate_fake_data_records(num_records, seed=None, reference_date=None):
+    """Gera dados falsos de clientes em lote (colunas inteiras de uma vez)"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    return build_records(generate_fake_data_columns(gen, num_records))
+
+def generate_fake_data_batches(num_records, seed=None, reference_date=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """Gera os registros em lotes de tamanho fixo, sem materializar o dataset inteiro"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    for columns in gen.iter_batches(generate_fake_data_columns, num_records, batch_rows):
+        yield build_records(columns)
+
+def generate_fake_data_record_batches(num_records, seed=None, reference_date=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """Gera os dados em RecordBatches Arrow (objetos aninhados como structs), sem materializar o dataset inteiro"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    yield from gen.iter_record_batches(generate_fake_data_columns, num_records, CLIENTS_SCHEMA, batch_rows)
+
+def save_to_minio_bucket(data, bucket_name, file_path, partition_by=None, compression=None, compression_level=None):
+    """Salva dados no MinIO (um objeto por partição, enviados em paralelo)"""
     try:
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=f'http://{MINIO_ENDPOINT}',
-            aws_access_key_id=MINIO_ACCESS_KEY,
-            aws_secret_access_key=MINIO_SECRET_KEY,
-            region_name='us-east-1'
-        )
+        # Serializar o JSON em blocos (comprimidos, se pedido) direto no upload em streaming
+        write_fn = partial(write_compressed, write_json_array, compression=compression,
+                           compression_level=compression_level)
+        file_path = compressed_file_path(file_path, compression)
+        results = save_partitioned(write_fn, data, bucket_name, file_path, partition_by=partition_by)
+
+        for result in results:
+            if result['status'] == 'ok':
+                logger.info(f"Dados salvos em {bucket_name}/{result['key']}")
+        return all(result['status'] == 'ok' for result in results)
+        
+    except Exception as e:
+        logger.error(f"Erro ao salvar dados: {e}")
+        return False
+
+def save_batches_to_minio_bucket(batches, bucket_name, file_path, compression=None, compression_level=None):
+    """Salva RecordBatches no MinIO como um array JSON, um lote por vez (memória limitada a um lote)"""
+    try:
+        write_fn = partial(write_compressed, write_json_array_batches, compression=compression,
+                           compression_level=compression_level)
+        file_path = compressed_file_path(file_path, compression)
+        save_streamed(write_fn, batches, bucket_name, file_path)
+        logger.info(f"Dados salvos em {bucket_name}/{file_path}")
+        return True
         
-        # Converter para JSON
-        json_content = json.dumps(data, indent=2, ensure_ascii=False)
+    except Exception as e:
+        logger.error(f"Erro ao salvar dados: {e}")
+        return False
+
+def save_ndjson_to_minio_bucket(batches, bucket_name, file_path, max_file_size=None, compression=None,
+                                compression_level=None):
+    """Salva lotes de registros no MinIO como NDJSON (um registro por linha), em streaming"""
+    try:
+        s3_client = get_s3_client()
         
-        # Upload para MinIO
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=file_path,
-            Body=json_content.encode('utf-8'),
-            ContentType='application/json'
+        # Serializar cada lote assim que é gerado, abrindo um novo objeto a cada max_file_size bytes
+        # (cada um comprimido de forma independente) e acumulando as estatísticas do catálogo de cada objeto
+        file_stats = RollingFileStats()
+        file_paths = upload_rolling(
+            s3_client, bucket_name, file_path,
+            file_stats.chunks(batches, iter_ndjson_chunks, DEFAULT_NDJSON_CHUNK_LINES),
+            max_object_size=max_file_size, content_type='application/x-ndjson', on_object=file_stats.on_object,
+            compression=compression, compression_level=compression_level
         )
+        record_files(s3_client, bucket_name, file_stats.entries)
         
-        logger.info(f"Dados salvos em {bucket_name}/{file_path}")
+        for path in file_paths:
+            logger.info(f"Dados salvos em {bucket_name}/{path}")
         return True
         
     except Exception as e:
         logger.error(f"Erro ao salvar dados: {e}")
         return False
 
-def main():
-    """Função principal"""
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    parser = build_generation_parser(__doc__)
+    parser.add_argument('--format', choices=['json', 'ndjson'], default='json',
+                        help='json: array indentado (padrão); ndjson: um registro por linha, em streaming')
+    parser.add_argument('--max-file-size', type=int, default=None,
+                        help='Com --format ndjson, abre um novo objeto a cada N MB')
+    add_partition_arguments(parser, ['endereco.estado', 'data_cadastro'])
+    add_compression_arguments(parser)
+    args = parse_generation_args(__doc__, parser, argv)
+    if args.partition_by and args.format == 'ndjson':
+        parser.error("--partition-by ainda não é suportado com --format ndjson")
+    return args
+
+@script_stage('landing_json')
+def run(args):
+    """Gera os dados e salva no MinIO (usado pelo main e pelo pipeline)"""
     logger.info("Iniciando geração de dados JSON...")
     
-    # Gerar número aleatório de registros
-    num_records = random.randint(1000, 10000)
+    # Número de registros: --rows ou aleatório
+    num_records = resolve_num_records(args, 1000, 10000)
     logger.info(f"Número de registros a serem gerados: {num_records}")
     
-    # Gerar dados falsos
-    data = generate_fake_data_records(num_records)
-    
     # Definir caminho do arquivo no bucket
-    timestamp = int(time.time())
-    file_path = f"dataway/sap/clients/clients_data_{timestamp}.json"
+    timestamp = run_timestamp(args)
+    if args.format == 'ndjson':
+        file_path = f"dataway/sap/clients/clients_data_{timestamp}.ndjson"
+        max_file_size = args.max_file_size * 1024 * 1024 if args.max_file_size else None
+        generate_fn = partial(generate_fake_data_batches, batch_rows=args.batch_rows or DEFAULT_BATCH_ROWS)
+        save_fn = partial(save_ndjson_to_minio_bucket, max_file_size=max_file_size, **compression_options(args))
+    elif args.batch_rows:
+        file_path = f"dataway/sap/clients/clients_data_{timestamp}.json"
+        generate_fn = partial(generate_fake_data_record_batches, batch_rows=args.batch_rows)
+        save_fn = partial(save_batches_to_minio_bucket, **compression_options(args))
+    else:
+        file_path = f"dataway/sap/clients/clients_data_{timestamp}.json"
+        generate_fn = generate_fake_data_records
+        save_fn = partial(save_to_minio_bucket, partition_by=args.partition_by, **compression_options(args))
     
-    # Salvar no MinIO
-    success = save_to_minio_bucket(data, "landing-zone", file_path)
+    # Gerar e salvar no MinIO (um objeto por shard)
+    success = run_sharded(
+        generate_fn, save_fn, num_records, "landing-zone", file_path,
+        workers=args.workers, seed=args.seed, rows_per_shard=args.rows_per_shard,
+        reference_date=args.as_of
+    )
     
     if success:
         logger.info("Processo concluído com sucesso!")
     else:
         logger.error("Erro no processo!")
+    
+    return success
+
+def main():
+    """Função principal"""
+    run(parse_args())
 
 if __name__ == "__main__":
     main()
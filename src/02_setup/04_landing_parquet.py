@@ -4,83 +4,78 @@ Script para gerar dados Parquet e salvar no bucket landing-zone
 Simulando dados de clientes do sistema Cloud X
 """
 
-import boto3
-import pandas as pd
-from faker import Faker
-import random
-import time
 import logging
-import io
+from functools import partial
+
+from batch_generator import DEFAULT_BATCH_ROWS, BatchGenerator, build_table, years
+from metrics import script_stage
+from partitioning import add_partition_arguments, save_partitioned, save_streamed
+from serializers import add_parquet_arguments, parquet_options, write_parquet, write_parquet_batches
+from schemas import LANDING_PARQUET_SCHEMA
+from sharding import build_generation_parser, parse_generation_args, resolve_num_records, run_sharded, run_timestamp
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuração do MinIO
-MINIO_ENDPOINT = "localhost:9000"
-MINIO_ACCESS_KEY = "minioadmin"
-MINIO_SECRET_KEY = "minioadmin"
+# Schema explícito do Parquet (do registro de schemas)
+CLIENTS_SCHEMA = LANDING_PARQUET_SCHEMA
 
-# Configurar Faker para português brasileiro
-fake = Faker('pt_BR')
+def generate_fake_data_columns(gen, num_records):
+    """Gera as colunas de um lote de clientes"""
+    return {
+        'id': gen.uuid4(num_records),
+        'nome': gen.text('name', num_records),
+        'email': gen.text('email', num_records),
+        'telefone': gen.text('phone_number', num_records),
+        'endereco': gen.text('address', num_records),
+        'cidade': gen.text('city', num_records),
+        'estado': gen.text('state', num_records),
+        'cep': gen.text('postcode', num_records),
+        'data_nascimento': gen.date_of_birth(18, 80, num_records),
+        'data_cadastro': gen.date_between(years(2), num_records),
+        'salario': gen.uniform(1000, 15000, num_records),
+        'status': gen.choice(['ATIVO', 'INATIVO', 'PENDENTE'], num_records),
+        'empresa': gen.text('company', num_records),
+        'score_credito': gen.randint(300, 850, num_records),
+        'limite_credito': gen.uniform(1000, 50000, num_records),
+        'ultima_compra': gen.date_between(years(1), num_records),
+        'total_compras': gen.uniform(0, 100000, num_records),
+        'categoria': gen.choice(['PREMIUM', 'STANDARD', 'BASIC'], num_records),
+        'canal_preferido': gen.choice(['ONLINE', 'LOJA_FISICA', 'TELEFONE', 'APP'], num_records)
+    }
 
-def generate_fake_data_records(num_records):
-    """Gera dados falsos de clientes"""
-    records = []
-    
-    for _ in range(num_records):
-        record = {
-            'id': fake.uuid4(),
-            'nome': fake.name(),
-            'email': fake.email(),
-            'telefone': fake.phone_number(),
-            'endereco': fake.address(),
-            'cidade': fake.city(),
-            'estado': fake.state(),
-            'cep': fake.postcode(),
-            'data_nascimento': fake.date_of_birth(minimum_age=18, maximum_age=80),
-            'data_cadastro': fake.date_between(start_date='-2y', end_date='today'),
-            'salario': round(random.uniform(1000, 15000), 2),
-            'status': random.choice(['ATIVO', 'INATIVO', 'PENDENTE']),
-            'empresa': fake.company(),
-            'score_credito': random.randint(300, 850),
-            'limite_credito': round(random.uniform(1000, 50000), 2),
-            'ultima_compra': fake.date_between(start_date='-1y', end_date='today'),
-            'total_compras': round(random.uniform(0, 100000), 2),
-            'categoria': random.choice(['PREMIUM', 'STANDARD', 'BASIC']),
-            'canal_preferido': random.choice(['ONLINE', 'LOJA_FISICA', 'TELEFONE', 'APP'])
-        }
-        records.append(record)
-    
-    return records
+def generate_fake_data_records(num_records, seed=None, reference_date=None):
+    """Gera dados falsos de clientes em lote (colunas inteiras de uma vez)"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    return build_table(generate_fake_data_columns(gen, num_records), CLIENTS_SCHEMA)
 
-def save_to_minio_bucket(data, bucket_name, file_path):
-    """Salva dados no MinIO"""
+def generate_fake_data_record_batches(num_records, seed=None, reference_date=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """Gera os dados em RecordBatches Arrow com o schema do Parquet, sem materializar o dataset inteiro"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    yield from gen.iter_record_batches(generate_fake_data_columns, num_records, CLIENTS_SCHEMA, batch_rows)
+
+def save_to_minio_bucket(data, bucket_name, file_path, partition_by=None, **parquet_kwargs):
+    """Salva a tabela Arrow no MinIO como Parquet (um objeto por partição, enviados em paralelo)"""
     try:
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=f'http://{MINIO_ENDPOINT}',
-            aws_access_key_id=MINIO_ACCESS_KEY,
-            aws_secret_access_key=MINIO_SECRET_KEY,
-            region_name='us-east-1'
-        )
-        
-        # Converter para DataFrame
-        df = pd.DataFrame(data)
-        
-        # Converter DataFrame para Parquet em memória
-        parquet_buffer = io.BytesIO()
-        df.to_parquet(parquet_buffer, index=False, engine='pyarrow')
-        parquet_buffer.seek(0)
-        
-        # Upload para MinIO
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=file_path,
-            Body=parquet_buffer.getvalue(),
-            ContentType='application/octet-stream'
-        )
+        # Escrever o Parquet direto no upload em streaming (multipart upload)
+        write_fn = partial(write_parquet, **parquet_kwargs)
+        results = save_partitioned(write_fn, data, bucket_name, file_path, partition_by=partition_by)
+
+        for result in results:
+            if result['status'] == 'ok':
+                logger.info(f"Dados salvos em {bucket_name}/{result['key']}")
+        return all(result['status'] == 'ok' for result in results)
         
+    except Exception as e:
+        logger.error(f"Erro ao salvar dados: {e}")
+        return False
+
+def save_batches_to_minio_bucket(batches, bucket_name, file_path, **parquet_kwargs):
+    """Salva RecordBatches no MinIO como Parquet, um lote por vez (memória limitada a um lote)"""
+    try:
+        write_fn = partial(write_parquet_batches, schema=LANDING_PARQUET_SCHEMA, **parquet_kwargs)
+        save_streamed(write_fn, batches, bucket_name, file_path)
         logger.info(f"Dados salvos em {bucket_name}/{file_path}")
         return True
         
@@ -88,28 +83,52 @@ def save_to_minio_bucket(data, bucket_name, file_path):
         logger.error(f"Erro ao salvar dados: {e}")
         return False
 
-def main():
-    """Função principal"""
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    parser = build_generation_parser(__doc__)
+    add_parquet_arguments(parser)
+    add_partition_arguments(parser, ['estado', 'data_cadastro'])
+    args = parse_generation_args(__doc__, parser, argv)
+    return args
+
+@script_stage('landing_parquet')
+def run(args):
+    """Gera os dados e salva no MinIO (usado pelo main e pelo pipeline)"""
     logger.info("Iniciando geração de dados Parquet...")
     
-    # Gerar número aleatório de registros
-    num_records = random.randint(1000, 10000)
+    # Número de registros: --rows ou aleatório
+    num_records = resolve_num_records(args, 1000, 10000)
     logger.info(f"Número de registros a serem gerados: {num_records}")
     
-    # Gerar dados falsos
-    data = generate_fake_data_records(num_records)
-    
     # Definir caminho do arquivo no bucket
-    timestamp = int(time.time())
+    timestamp = run_timestamp(args)
     file_path = f"dataway/cloud_x/clients/clients_data_{timestamp}.parquet"
     
-    # Salvar no MinIO
-    success = save_to_minio_bucket(data, "landing-zone", file_path)
+    # Gerar tudo de uma vez ou em lotes Arrow (--batch-rows)
+    if args.batch_rows:
+        generate_fn = partial(generate_fake_data_record_batches, batch_rows=args.batch_rows)
+        save_fn = partial(save_batches_to_minio_bucket, **parquet_options(args))
+    else:
+        generate_fn = generate_fake_data_records
+        save_fn = partial(save_to_minio_bucket, partition_by=args.partition_by, **parquet_options(args))
+    
+    # Gerar e salvar no MinIO (um objeto por shard)
+    success = run_sharded(
+        generate_fn, save_fn, num_records, "landing-zone", file_path,
+        workers=args.workers, seed=args.seed, rows_per_shard=args.rows_per_shard,
+        reference_date=args.as_of
+    )
     
     if success:
         logger.info("Processo concluído com sucesso!")
     else:
         logger.error("Erro no processo!")
+    
+    return success
+
+def main():
+    """Função principal"""
+    run(parse_args())
 
 if __name__ == "__main__":
     main()
@@ -4,129 +4,210 @@ Script para gerar dados JSON no bucket silver-zone
 Dados processados e enriquecidos do sistema SAP
 """
 
-import boto3
-import json
-from faker import Faker
-import random
-import time
+import pyarrow as pa
 import logging
+from functools import partial
+
+from batch_generator import DEFAULT_BATCH_ROWS, BatchGenerator, build_records, format_dates, years
+from catalog import DATASETS, RollingFileStats, record_files
+from merge import merge_dataset
+from metrics import script_stage
+from partitioning import save_partitioned, save_streamed
+from serializers import DEFAULT_NDJSON_CHUNK_LINES, iter_ndjson_chunks, write_json_array, write_json_array_batches
+from schemas import DATASET_SCHEMAS, text_schema
+from sharding import build_generation_parser, parse_generation_args, resolve_num_records, run_sharded, run_timestamp
+from storage import get_s3_client, upload_rolling
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuração do MinIO
-MINIO_ENDPOINT = "localhost:9000"
-MINIO_ACCESS_KEY = "minioadmin"
-MINIO_SECRET_KEY = "minioadmin"
-
-# Configurar Faker para português brasileiro
-fake = Faker('pt_BR')
+# Schema dos lotes Arrow: o do registro, com datas e timestamps como texto (como ficam no JSON)
+SILVER_SCHEMA = text_schema(DATASET_SCHEMAS['silver'])
 
-def generate_silver_data(num_records):
-    """Gera dados processados e enriquecidos para silver zone"""
-    records = []
-    
-    for _ in range(num_records):
-        # Dados base
-        nome = fake.name()
-        email = fake.email()
-        
-        record = {
-            'cliente_id': fake.uuid4(),
-            'dados_pessoais': {
-                'nome_completo': nome,
-                'email_principal': email,
-                'telefone_principal': fake.phone_number(),
-                'data_nascimento': fake.date_of_birth(minimum_age=18, maximum_age=80).strftime('%Y-%m-%d'),
-                'genero': random.choice(['M', 'F', 'O']),
-                'estado_civil': random.choice(['SOLTEIRO', 'CASADO', 'DIVORCIADO', 'VIUVO'])
-            },
-            'endereco': {
-                'logradouro': fake.street_address(),
-                'bairro': fake.city_suffix(),
-                'cidade': fake.city(),
-                'estado': fake.state(),
-                'cep': fake.postcode(),
-                'pais': 'Brasil',
-                'tipo_endereco': random.choice(['RESIDENCIAL', 'COMERCIAL', 'CORRESPONDENCIA'])
-            },
-            'dados_profissionais': {
-                'empresa': fake.company(),
-                'cargo': fake.job(),
-                'salario_bruto': round(random.uniform(3000, 20000), 2),
-                'data_admissao': fake.date_between(start_date='-5y', end_date='today').strftime('%Y-%m-%d'),
-                'setor': random.choice(['Tecnologia', 'Varejo', 'Saúde', 'Educação', 'Financeiro', 'Industrial'])
-            },
-            'preferencias_cliente': {
-                'canal_preferido': random.choice(['EMAIL', 'SMS', 'WHATSAPP', 'TELEFONE']),
-                'idioma': 'pt-BR',
-                'recebe_promocoes': random.choice([True, False]),
-                'tipo_produto_interesse': random.choice(['Tecnologia', 'Roupas', 'Casa', 'Esportes', 'Livros'])
-            },
-            'metadados': {
-                'data_cadastro': fake.date_between(start_date='-2y', end_date='today').strftime('%Y-%m-%d'),
-                'data_ultima_atualizacao': time.strftime('%Y-%m-%d %H:%M:%S'),
-                'origem_dados': 'SAP',
-                'versao_dados': '1.0',
-                'status_processamento': 'PROCESSADO'
-            }
+def generate_silver_columns(gen, num_records):
+    """Gera as colunas (com objetos aninhados) de um lote de dados da silver zone"""
+    return {
+        'cliente_id': gen.uuid4(num_records),
+        'dados_pessoais': {
+            'nome_completo': gen.text('name', num_records),
+            'email_principal': gen.text('email', num_records),
+            'telefone_principal': gen.text('phone_number', num_records),
+            'data_nascimento': format_dates(gen.date_of_birth(18, 80, num_records)),
+            'genero': gen.choice(['M', 'F', 'O'], num_records),
+            'estado_civil': gen.choice(['SOLTEIRO', 'CASADO', 'DIVORCIADO', 'VIUVO'], num_records)
+        },
+        'endereco': {
+            'logradouro': gen.text('street_address', num_records),
+            'bairro': gen.text('city_suffix', num_records),
+            'cidade': gen.text('city', num_records),
+            'estado': gen.text('state', num_records),
+            'cep': gen.text('postcode', num_records),
+            'pais': 'Brasil',
+            'tipo_endereco': gen.choice(['RESIDENCIAL', 'COMERCIAL', 'CORRESPONDENCIA'], num_records)
+        },
+        'dados_profissionais': {
+            'empresa': gen.text('company', num_records),
+            'cargo': gen.text('job', num_records),
+            'salario_bruto': gen.uniform(3000, 20000, num_records),
+            'data_admissao': format_dates(gen.date_between(years(5), num_records)),
+            'setor': gen.choice(['Tecnologia', 'Varejo', 'Saúde', 'Educação', 'Financeiro', 'Industrial'], num_records)
+        },
+        'preferencias_cliente': {
+            'canal_preferido': gen.choice(['EMAIL', 'SMS', 'WHATSAPP', 'TELEFONE'], num_records),
+            'idioma': 'pt-BR',
+            'recebe_promocoes': gen.booleans(num_records),
+            'tipo_produto_interesse': gen.choice(['Tecnologia', 'Roupas', 'Casa', 'Esportes', 'Livros'], num_records)
+        },
+        'metadados': {
+            'data_cadastro': format_dates(gen.date_between(years(2), num_records)),
+            'data_ultima_atualizacao': gen.timestamp(),
+            'origem_dados': 'SAP',
+            'versao_dados': '1.0',
+            'status_processamento': 'PROCESSADO'
         }
-        records.append(record)
-    
-    return records
+    }
+
+def generate_silver_data(num_records, seed=None, reference_date=None):
+    """Gera dados processados e enriquecidos para silver zone em lote"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    return build_records(generate_silver_columns(gen, num_records))
+
+def generate_silver_batches(num_records, seed=None, reference_date=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """Gera os registros em lotes de tamanho fixo, sem materializar o dataset inteiro"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    for columns in gen.iter_batches(generate_silver_columns, num_records, batch_rows):
+        yield build_records(columns)
+
+def generate_silver_record_batches(num_records, seed=None, reference_date=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """Gera os dados em RecordBatches Arrow (objetos aninhados como structs), sem materializar o dataset inteiro"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    yield from gen.iter_record_batches(generate_silver_columns, num_records, SILVER_SCHEMA, batch_rows)
 
 def save_to_minio_bucket(data, bucket_name, file_path):
     """Salva dados no MinIO"""
     try:
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=f'http://{MINIO_ENDPOINT}',
-            aws_access_key_id=MINIO_ACCESS_KEY,
-            aws_secret_access_key=MINIO_SECRET_KEY,
-            region_name='us-east-1'
-        )
+        # Serializar o JSON em blocos direto no upload em streaming (multipart upload)
+        results = save_partitioned(write_json_array, data, bucket_name, file_path)
+
+        for result in results:
+            if result['status'] == 'ok':
+                logger.info(f"Dados salvos em {bucket_name}/{result['key']}")
+        return all(result['status'] == 'ok' for result in results)
         
-        # Converter para JSON
-        json_content = json.dumps(data, indent=2, ensure_ascii=False)
+    except Exception as e:
+        logger.error(f"Erro ao salvar dados: {e}")
+        return False
+
+def save_batches_to_minio_bucket(batches, bucket_name, file_path):
+    """Salva RecordBatches no MinIO como um array JSON, um lote por vez (memória limitada a um lote)"""
+    try:
+        save_streamed(write_json_array_batches, batches, bucket_name, file_path)
+        logger.info(f"Dados salvos em {bucket_name}/{file_path}")
+        return True
         
-        # Upload para MinIO
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=file_path,
-            Body=json_content.encode('utf-8'),
-            ContentType='application/json'
+    except Exception as e:
+        logger.error(f"Erro ao salvar dados: {e}")
+        return False
+
+def save_ndjson_to_minio_bucket(batches, bucket_name, file_path, max_file_size=None):
+    """Salva lotes de registros no MinIO como NDJSON (um registro por linha), em streaming"""
+    try:
+        s3_client = get_s3_client()
+        
+        # Serializar cada lote assim que é gerado, abrindo um novo objeto a cada max_file_size bytes
+        # e acumulando as estatísticas do catálogo de cada objeto
+        file_stats = RollingFileStats()
+        file_paths = upload_rolling(
+            s3_client, bucket_name, file_path,
+            file_stats.chunks(batches, iter_ndjson_chunks, DEFAULT_NDJSON_CHUNK_LINES),
+            max_object_size=max_file_size, content_type='application/x-ndjson', on_object=file_stats.on_object
         )
+        record_files(s3_client, bucket_name, file_stats.entries)
         
-        logger.info(f"Dados salvos em {bucket_name}/{file_path}")
+        for path in file_paths:
+            logger.info(f"Dados salvos em {bucket_name}/{path}")
         return True
         
     except Exception as e:
         logger.error(f"Erro ao salvar dados: {e}")
         return False
 
-def main():
-    """Função principal"""
+def merge_to_minio_bucket(batches, bucket_name, file_path):
+    """Aplica os registros gerados à silver existente por cliente_id (upsert), em vez de gravar um snapshot"""
+    try:
+        s3_client = get_s3_client()
+        summary = merge_dataset(s3_client, bucket_name, DATASETS['silver'][1], pa.Table.from_batches(list(batches)),
+                                file_path, schema=SILVER_SCHEMA)
+        logger.info(f"Merge em {bucket_name}: {summary['updated']} atualizado(s), {summary['inserted']} novo(s), "
+                    f"{summary['stale']} ignorado(s) (sem versão mais nova), "
+                    f"{summary['files_rewritten']} de {summary['files']} arquivo(s) reescrito(s)")
+        return True
+
+    except Exception as e:
+        logger.error(f"Erro ao aplicar o merge: {e}")
+        return False
+
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    parser = build_generation_parser(__doc__)
+    parser.add_argument('--format', choices=['json', 'ndjson'], default='json',
+                        help='json: array indentado (padrão); ndjson: um registro por linha, em streaming')
+    parser.add_argument('--max-file-size', type=int, default=None,
+                        help='Com --format ndjson, abre um novo objeto a cada N MB')
+    parser.add_argument('--merge', action='store_true',
+                        help='Aplica os registros à silver existente por cliente_id (a versão mais recente de '
+                             'metadados.data_ultima_atualizacao vence), reescrevendo só os arquivos afetados')
+    args = parse_generation_args(__doc__, parser, argv)
+    return args
+
+@script_stage('silver')
+def run(args):
+    """Gera os dados e salva no MinIO (usado pelo main e pelo pipeline)"""
     logger.info("Iniciando geração de dados para Silver Zone...")
     
-    # Gerar número aleatório de registros
-    num_records = random.randint(1500, 6000)
+    # Número de registros: --rows ou aleatório
+    num_records = resolve_num_records(args, 1500, 6000)
     logger.info(f"Número de registros a serem gerados: {num_records}")
     
-    # Gerar dados falsos
-    data = generate_silver_data(num_records)
-    
     # Definir caminho do arquivo no bucket
-    timestamp = int(time.time())
-    file_path = f"enriched/sap/clients_silver_{timestamp}.json"
+    timestamp = run_timestamp(args)
+    if args.merge:
+        # Só as chaves novas vão para este arquivo; os shards são aplicados um de cada vez
+        file_path = f"enriched/sap/clients_silver_{timestamp}.{args.format}"
+        generate_fn = partial(generate_silver_record_batches, batch_rows=args.batch_rows or DEFAULT_BATCH_ROWS)
+        save_fn = merge_to_minio_bucket
+    elif args.format == 'ndjson':
+        file_path = f"enriched/sap/clients_silver_{timestamp}.ndjson"
+        max_file_size = args.max_file_size * 1024 * 1024 if args.max_file_size else None
+        generate_fn = partial(generate_silver_batches, batch_rows=args.batch_rows or DEFAULT_BATCH_ROWS)
+        save_fn = partial(save_ndjson_to_minio_bucket, max_file_size=max_file_size)
+    elif args.batch_rows:
+        file_path = f"enriched/sap/clients_silver_{timestamp}.json"
+        generate_fn = partial(generate_silver_record_batches, batch_rows=args.batch_rows)
+        save_fn = save_batches_to_minio_bucket
+    else:
+        file_path = f"enriched/sap/clients_silver_{timestamp}.json"
+        generate_fn = generate_silver_data
+        save_fn = save_to_minio_bucket
     
-    # Salvar no MinIO
-    success = save_to_minio_bucket(data, "silver-zone", file_path)
+    # Gerar e salvar no MinIO (um objeto por shard)
+    success = run_sharded(
+        generate_fn, save_fn, num_records, "silver-zone", file_path,
+        workers=1 if args.merge else args.workers, seed=args.seed, rows_per_shard=args.rows_per_shard,
+        reference_date=args.as_of
+    )
     
     if success:
         logger.info("Processo concluído com sucesso!")
     else:
         logger.error("Erro no processo!")
+    
+    return success
+
+def main():
+    """Função principal"""
+    run(parse_args())
 
 if __name__ == "__main__":
     main()
@@ -4,99 +4,86 @@ Script para gerar dados Parquet no bucket gold-zone
 Dados finais otimizados para consumo do sistema Cloud X
 """
 
-import boto3
-import pandas as pd
-from faker import Faker
-import random
-import time
 import logging
-import io
+from functools import partial
+
+from batch_generator import DEFAULT_BATCH_ROWS, BatchGenerator, build_table, years
+from derivations import GOLD_RULES, derive_columns
+from metrics import script_stage
+from partitioning import add_partition_arguments, save_partitioned, save_streamed
+from serializers import add_parquet_arguments, parquet_options, write_parquet, write_parquet_batches
+from schemas import GOLD_SCHEMA
+from sharding import build_generation_parser, parse_generation_args, resolve_num_records, run_sharded, run_timestamp
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Configuração do MinIO
-MINIO_ENDPOINT = "localhost:9000"
-MINIO_ACCESS_KEY = "minioadmin"
-MINIO_SECRET_KEY = "minioadmin"
+def generate_gold_columns(gen, num_records):
+    """Gera as colunas de um lote de dados da gold zone (as derivadas vêm das regras de GOLD_RULES)"""
+    columns = {
+        'cliente_id': gen.uuid4(num_records),
+        'nome_completo': gen.text('name', num_records),
+        'email': gen.text('email', num_records),
+        'telefone': gen.text('phone_number', num_records),
+        'idade': gen.randint(25, 65, num_records),
+        'cidade': gen.text('city', num_records),
+        'estado': gen.text('state', num_records),
+        'regiao': gen.choice(['NORTE', 'NORDESTE', 'CENTRO-OESTE', 'SUDESTE', 'SUL'], num_records),
+        'salario_bruto': gen.uniform(4000, 25000, num_records),
+        'empresa': gen.text('company', num_records),
+        'cargo': gen.text('job', num_records),
+        'setor': gen.choice(['Tecnologia', 'Varejo', 'Saúde', 'Educação', 'Financeiro', 'Industrial'], num_records),
+        'score_credito': gen.randint(400, 850, num_records),
+        'limite_credito': gen.uniform(2000, 100000, num_records),
+        'total_compras_ano': gen.uniform(0, 150000, num_records),
+        'ticket_medio': gen.uniform(50, 5000, num_records),
+        'frequencia_compras': gen.randint(1, 52, num_records),
+        'ultima_compra': gen.date_between(years(1), num_records),
+        'status_cliente': gen.choice(['ATIVO', 'INATIVO', 'POTENCIAL'], num_records),
+        'segmento_cliente': gen.choice(['PREMIUM', 'STANDARD', 'BASIC', 'VIP'], num_records),
+        'canal_preferido': gen.choice(['DIGITAL', 'FISICO', 'HIBRIDO'], num_records),
+        'propensao_compra': gen.uniform(0, 1, num_records, decimals=3),
+        'valor_vida_cliente': gen.uniform(1000, 500000, num_records),
+        'data_cadastro': gen.date_between(years(3), num_records),
+        'data_ultima_atualizacao': gen.timestamp(),
+        'origem_dados': 'CLOUD_X',
+        'versao_dados': '2.0'
+    }
+    # Faixas, risco e dias desde o cadastro (mesmas regras usadas nos dados reais)
+    return derive_columns(columns, GOLD_RULES, gen.reference_date)
 
-# Configurar Faker para português brasileiro
-fake = Faker('pt_BR')
+def generate_gold_data(num_records, seed=None, reference_date=None):
+    """Gera dados finais otimizados para gold zone em lote"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    return build_table(generate_gold_columns(gen, num_records), GOLD_SCHEMA)
 
-def generate_gold_data(num_records):
-    """Gera dados finais otimizados para gold zone"""
-    records = []
-    
-    for _ in range(num_records):
-        # Dados calculados e enriquecidos
-        salario = round(random.uniform(4000, 25000), 2)
-        idade = random.randint(25, 65)
-        
-        record = {
-            'cliente_id': fake.uuid4(),
-            'nome_completo': fake.name(),
-            'email': fake.email(),
-            'telefone': fake.phone_number(),
-            'idade': idade,
-            'faixa_etaria': 'JOVEM' if idade < 30 else 'ADULTO' if idade < 50 else 'SENIOR',
-            'cidade': fake.city(),
-            'estado': fake.state(),
-            'regiao': random.choice(['NORTE', 'NORDESTE', 'CENTRO-OESTE', 'SUDESTE', 'SUL']),
-            'salario_bruto': salario,
-            'faixa_salarial': 'BAIXA' if salario < 5000 else 'MEDIA' if salario < 10000 else 'ALTA',
-            'empresa': fake.company(),
-            'cargo': fake.job(),
-            'setor': random.choice(['Tecnologia', 'Varejo', 'Saúde', 'Educação', 'Financeiro', 'Industrial']),
-            'score_credito': random.randint(400, 850),
-            'categoria_risco': 'BAIXO' if random.randint(400, 850) > 700 else 'MEDIO' if random.randint(400, 850) > 600 else 'ALTO',
-            'limite_credito': round(random.uniform(2000, 100000), 2),
-            'total_compras_ano': round(random.uniform(0, 150000), 2),
-            'ticket_medio': round(random.uniform(50, 5000), 2),
-            'frequencia_compras': random.randint(1, 52),
-            'ultima_compra': fake.date_between(start_date='-1y', end_date='today'),
-            'status_cliente': random.choice(['ATIVO', 'INATIVO', 'POTENCIAL']),
-            'segmento_cliente': random.choice(['PREMIUM', 'STANDARD', 'BASIC', 'VIP']),
-            'canal_preferido': random.choice(['DIGITAL', 'FISICO', 'HIBRIDO']),
-            'propensao_compra': round(random.uniform(0, 1), 3),
-            'valor_vida_cliente': round(random.uniform(1000, 500000), 2),
-            'data_cadastro': fake.date_between(start_date='-3y', end_date='today'),
-            'dias_desde_cadastro': random.randint(1, 1095),
-            'data_ultima_atualizacao': time.strftime('%Y-%m-%d %H:%M:%S'),
-            'origem_dados': 'CLOUD_X',
-            'versao_dados': '2.0'
-        }
-        records.append(record)
-    
-    return records
+def generate_gold_record_batches(num_records, seed=None, reference_date=None, batch_rows=DEFAULT_BATCH_ROWS):
+    """Gera os dados em RecordBatches Arrow com o schema do Parquet, sem materializar o dataset inteiro"""
+    gen = BatchGenerator(seed=seed, reference_date=reference_date)
+    yield from gen.iter_record_batches(generate_gold_columns, num_records, GOLD_SCHEMA, batch_rows)
 
-def save_to_minio_bucket(data, bucket_name, file_path):
-    """Salva dados no MinIO"""
+def save_to_minio_bucket(data, bucket_name, file_path, partition_by=None, **parquet_kwargs):
+    """Salva a tabela Arrow no MinIO como Parquet (um objeto por partição, enviados em paralelo)"""
     try:
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=f'http://{MINIO_ENDPOINT}',
-            aws_access_key_id=MINIO_ACCESS_KEY,
-            aws_secret_access_key=MINIO_SECRET_KEY,
-            region_name='us-east-1'
-        )
-        
-        # Converter para DataFrame
-        df = pd.DataFrame(data)
-        
-        # Converter DataFrame para Parquet em memória
-        parquet_buffer = io.BytesIO()
-        df.to_parquet(parquet_buffer, index=False, engine='pyarrow')
-        parquet_buffer.seek(0)
-        
-        # Upload para MinIO
-        s3_client.put_object(
-            Bucket=bucket_name,
-            Key=file_path,
-            Body=parquet_buffer.getvalue(),
-            ContentType='application/octet-stream'
-        )
+        # Escrever o Parquet direto no upload em streaming (multipart upload)
+        write_fn = partial(write_parquet, **parquet_kwargs)
+        results = save_partitioned(write_fn, data, bucket_name, file_path, partition_by=partition_by)
+
+        for result in results:
+            if result['status'] == 'ok':
+                logger.info(f"Dados salvos em {bucket_name}/{result['key']}")
+        return all(result['status'] == 'ok' for result in results)
         
+    except Exception as e:
+        logger.error(f"Erro ao salvar dados: {e}")
+        return False
+
+def save_batches_to_minio_bucket(batches, bucket_name, file_path, **parquet_kwargs):
+    """Salva RecordBatches no MinIO como Parquet, um lote por vez (memória limitada a um lote)"""
+    try:
+        write_fn = partial(write_parquet_batches, schema=GOLD_SCHEMA, **parquet_kwargs)
+        save_streamed(write_fn, batches, bucket_name, file_path)
         logger.info(f"Dados salvos em {bucket_name}/{file_path}")
         return True
         
@@ -104,28 +91,52 @@ def save_to_minio_bucket(data, bucket_name, file_path):
         logger.error(f"Erro ao salvar dados: {e}")
         return False
 
-def main():
-    """Função principal"""
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    parser = build_generation_parser(__doc__)
+    add_parquet_arguments(parser)
+    add_partition_arguments(parser, ['estado', 'regiao', 'data_cadastro'])
+    args = parse_generation_args(__doc__, parser, argv)
+    return args
+
+@script_stage('gold')
+def run(args):
+    """Gera os dados e salva no MinIO (usado pelo main e pelo pipeline)"""
     logger.info("Iniciando geração de dados para Gold Zone...")
     
-    # Gerar número aleatório de registros
-    num_records = random.randint(1000, 4000)
+    # Número de registros: --rows ou aleatório
+    num_records = resolve_num_records(args, 1000, 4000)
     logger.info(f"Número de registros a serem gerados: {num_records}")
     
-    # Gerar dados falsos
-    data = generate_gold_data(num_records)
-    
     # Definir caminho do arquivo no bucket
-    timestamp = int(time.time())
+    timestamp = run_timestamp(args)
     file_path = f"analytics/cloud_x/clients_gold_{timestamp}.parquet"
     
-    # Salvar no MinIO
-    success = save_to_minio_bucket(data, "gold-zone", file_path)
+    # Gerar tudo de uma vez ou em lotes Arrow (--batch-rows)
+    if args.batch_rows:
+        generate_fn = partial(generate_gold_record_batches, batch_rows=args.batch_rows)
+        save_fn = partial(save_batches_to_minio_bucket, **parquet_options(args))
+    else:
+        generate_fn = generate_gold_data
+        save_fn = partial(save_to_minio_bucket, partition_by=args.partition_by, **parquet_options(args))
+    
+    # Gerar e salvar no MinIO (um objeto por shard)
+    success = run_sharded(
+        generate_fn, save_fn, num_records, "gold-zone", file_path,
+        workers=args.workers, seed=args.seed, rows_per_shard=args.rows_per_shard,
+        reference_date=args.as_of
+    )
     
     if success:
         logger.info("Processo concluído com sucesso!")
     else:
         logger.error("Erro no processo!")
+    
+    return success
+
+def main():
+    """Função principal"""
+    run(parse_args())
 
 if __name__ == "__main__":
     main()
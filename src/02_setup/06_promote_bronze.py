@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Script para promover os CSVs do Protheus da landing-zone para a bronze-zone
+Processa de forma incremental apenas os arquivos novos desde a última execução
+"""
+
+import argparse
+import contextvars
+import io
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from catalog import consolidate_catalog, file_entry, record_files
+from compaction import is_compacted
+from compression import split_compression
+from key_index import KeyIndex, rebuild_key_index
+from metrics import add_metrics_arguments, script_stage
+from partitioning import parse_partition_values
+from serializers import iter_csv_chunks
+from storage import get_s3_client, list_objects, read_json_object, upload_stream, write_json_object
+from validation import DATASET_RULES, check_table, quarantine_file_path, quarantine_rows
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Origem e destino da promoção
+LANDING_BUCKET = "landing-zone"
+LANDING_PREFIX = "dataway/protheus/clients/"
+BRONZE_BUCKET = "bronze-zone"
+BRONZE_PREFIX = "processed/protheus/"
+
+# Manifesto com a marca d'água da promoção (arquivos com _ são ignorados pelo Spark)
+MANIFEST_PATH = f"{BRONZE_PREFIX}_promotion_manifest.json"
+
+# Objetos que chegam atrasados (LastModified antes da marca d'água) ainda são
+# considerados dentro desta janela; o manifesto guarda as chaves da janela
+LATE_ARRIVAL_WINDOW = timedelta(hours=1)
+
+# Mapeamento das colunas da landing (Protheus) para a bronze
+BRONZE_COLUMN_MAPPING = {
+    'id': 'cliente_id',
+    'nome': 'nome_completo',
+    'endereco': 'endereco_completo',
+    'salario': 'salario_mensal',
+    'status': 'status_cliente',
+}
+
+# Ordem das colunas na bronze zone (mesma de 03_bronze_zone.py)
+BRONZE_COLUMNS = [
+    'cliente_id', 'nome_completo', 'email', 'telefone', 'endereco_completo', 'cidade', 'estado', 'cep',
+    'data_nascimento', 'data_cadastro', 'salario_mensal', 'status_cliente', 'empresa', 'cargo',
+    'data_atualizacao'
+]
+
+# Regras de qualidade aplicadas aos CSVs da landing antes da promoção
+LANDING_RULES = DATASET_RULES['landing_csv']
+
+def load_manifest(s3_client):
+    """Carrega o manifesto da promoção (vazio na primeira execução)"""
+    return read_json_object(s3_client, BRONZE_BUCKET, MANIFEST_PATH, default={'watermark': None, 'promoted': {}})
+
+def find_new_objects(s3_client, manifest):
+    """
+    Lista os CSVs da landing (comprimidos ou não) ainda não promovidos desde a marca d'água.
+
+    Arquivos gerados pela compactação da landing são ignorados: as linhas
+    deles já foram promovidas a partir dos arquivos originais.
+    """
+    watermark = manifest['watermark']
+    since = datetime.fromisoformat(watermark) - LATE_ARRIVAL_WINDOW if watermark else None
+
+    new_objects = []
+    for obj in list_objects(s3_client, LANDING_BUCKET, LANDING_PREFIX):
+        if not split_compression(obj['Key'])[0].endswith('.csv') or obj['Key'] in manifest['promoted']:
+            continue
+        if is_compacted(obj['Key']):
+            continue
+        if since is not None and obj['LastModified'] < since:
+            continue
+        new_objects.append(obj)
+    return sorted(new_objects, key=lambda obj: obj['LastModified'])
+
+def bronze_file_path(landing_key):
+    """
+    Caminho na bronze zone preservando as partições do arquivo de origem.
+
+    Os arquivos promovidos usam o prefixo clients_promoted_, que nunca
+    coincide com o clients_bronze_{timestamp} gerado pelo 03_bronze_zone.py
+    (no pipeline os dois podem rodar no mesmo segundo).
+    """
+    relative_path = split_compression(landing_key)[0][len(LANDING_PREFIX):]
+    directory, file_name = os.path.split(relative_path)
+    if file_name.startswith('clients_data_'):
+        file_name = 'clients_promoted_' + file_name[len('clients_data_'):]
+    else:
+        file_name = 'promoted_' + file_name
+    return BRONZE_PREFIX + '/'.join(part for part in (directory, file_name) if part)
+
+def to_bronze(df, landing_key):
+    """Aplica o mapeamento de colunas da bronze zone a um CSV da landing"""
+    df = df.rename(columns=BRONZE_COLUMN_MAPPING)
+    if 'cargo' not in df.columns:
+        df['cargo'] = None
+    df['data_atualizacao'] = time.strftime('%Y-%m-%d %H:%M:%S')
+
+    # Colunas de partição continuam só no caminho, como na landing
+    partition_columns = parse_partition_values(landing_key[len(LANDING_PREFIX):])
+    return df[[column for column in BRONZE_COLUMNS if column not in partition_columns]]
+
+def promote_object(s3_client, landing_key, validate=True, key_index=None):
+    """
+    Lê um CSV da landing, converte para o layout da bronze e grava na bronze zone.
+
+    Com validate as linhas que violam LANDING_RULES não são promovidas:
+    vão para a quarentena da bronze (_quarantine/, com os motivos).
+    Com key_index os clientes já presentes na bronze (ou em outro arquivo
+    desta execução) são descartados antes da gravação.
+    """
+    response = s3_client.get_object(Bucket=LANDING_BUCKET, Key=landing_key)
+    df = pd.read_csv(io.BytesIO(response['Body'].read()), dtype={'cep': str, 'telefone': str, 'id': str},
+                     compression=split_compression(landing_key)[1])
+    file_path = bronze_file_path(landing_key)
+
+    rejected = 0
+    if validate:
+        valid, reasons, report = check_table(df, LANDING_RULES)
+        rejected = report['rejected']
+        if rejected:
+            quarantine_key = quarantine_file_path(BRONZE_PREFIX, file_path)
+            quarantine_rows(s3_client, BRONZE_BUCKET, quarantine_key, df, valid, reasons)
+            logger.warning(f"{LANDING_BUCKET}/{landing_key}: {rejected} linha(s) rejeitada(s) "
+                           f"-> {BRONZE_BUCKET}/{quarantine_key}")
+            df = df[valid]
+
+    duplicates = 0
+    if key_index is not None:
+        is_new = key_index.claim(df['id'])
+        duplicates = int((~is_new).sum())
+        if duplicates:
+            logger.info(f"{LANDING_BUCKET}/{landing_key}: {duplicates} cliente(s) já promovido(s) descartado(s)")
+            df = df[is_new]
+
+    bronze_df = to_bronze(df, landing_key)
+    try:
+        bytes_written = upload_stream(
+            s3_client, BRONZE_BUCKET, file_path, iter_csv_chunks(bronze_df), content_type='text/csv'
+        )
+    except Exception:
+        if key_index is not None:
+            key_index.release(df['id'])
+        raise
+
+    logger.info(f"Promovido {LANDING_BUCKET}/{landing_key} -> {BRONZE_BUCKET}/{file_path}")
+    return {'bronze_key': file_path, 'rows': len(bronze_df), 'rejected': rejected, 'duplicates': duplicates,
+            'catalog': file_entry(file_path, bronze_df, bytes_written)}
+
+def update_manifest(manifest, new_objects, promoted, failed):
+    """Avança a marca d'água sem passar de nenhum arquivo que falhou"""
+    for obj in new_objects:
+        if obj['Key'] in promoted:
+            manifest['promoted'][obj['Key']] = dict(
+                {key: value for key, value in promoted[obj['Key']].items() if key != 'catalog'},
+                last_modified=obj['LastModified'].isoformat(),
+                promoted_at=time.strftime('%Y-%m-%d %H:%M:%S')
+            )
+
+    last_modified = [datetime.fromisoformat(entry['last_modified']) for entry in manifest['promoted'].values()]
+    if manifest['watermark']:
+        last_modified.append(datetime.fromisoformat(manifest['watermark']))
+    if not last_modified:
+        return manifest
+
+    watermark = max(last_modified)
+    failed_last_modified = [obj['LastModified'] for obj in new_objects if obj['Key'] in failed]
+    if failed_last_modified:
+        watermark = min(watermark, min(failed_last_modified))
+    manifest['watermark'] = watermark.isoformat()
+
+    # Só as chaves dentro da janela de atraso precisam continuar no manifesto
+    since = watermark - LATE_ARRIVAL_WINDOW
+    manifest['promoted'] = {
+        key: entry for key, entry in manifest['promoted'].items()
+        if datetime.fromisoformat(entry['last_modified']) >= since
+    }
+    return manifest
+
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Arquivos promovidos em paralelo (padrão: 8)')
+    parser.add_argument('--skip-validation', action='store_true',
+                        help='Promove todas as linhas, sem aplicar as regras de qualidade')
+    parser.add_argument('--skip-dedup', action='store_true',
+                        help='Não descarta clientes já presentes na bronze (índice de chaves)')
+    parser.add_argument('--rebuild-key-index', action='store_true',
+                        help='Recria o índice de chaves a partir dos arquivos da bronze antes de promover')
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+@script_stage('promote_bronze')
+def run(args):
+    """Promove os arquivos novos da landing (usado pelo main e pelo pipeline)"""
+    logger.info("Iniciando promoção landing -> bronze...")
+
+    s3_client = get_s3_client()
+    manifest = load_manifest(s3_client)
+    new_objects = find_new_objects(s3_client, manifest)
+    logger.info(f"Arquivos novos a serem promovidos: {len(new_objects)}")
+
+    # Índice dos cliente_id já gravados na bronze, consultado arquivo a arquivo
+    key_index = None
+    if args.rebuild_key_index:
+        key_index = rebuild_key_index(s3_client, BRONZE_BUCKET, BRONZE_PREFIX, 'cliente_id')
+    elif not args.skip_dedup:
+        key_index = KeyIndex(s3_client, BRONZE_BUCKET, BRONZE_PREFIX)
+
+    # Promover os arquivos em paralelo (no contexto da etapa, para as métricas)
+    promoted, failed = {}, set()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, promote_object, s3_client, obj['Key'],
+                            not args.skip_validation, key_index): obj['Key']
+            for obj in new_objects
+        }
+        for future in as_completed(futures):
+            landing_key = futures[future]
+            try:
+                promoted[landing_key] = future.result()
+            except Exception as e:
+                logger.error(f"Erro ao promover {LANDING_BUCKET}/{landing_key}: {e}")
+                failed.add(landing_key)
+
+    # Registrar os arquivos novos no catálogo da bronze zone
+    record_files(s3_client, BRONZE_BUCKET, [result['catalog'] for result in promoted.values()])
+    consolidate_catalog(s3_client, BRONZE_BUCKET, BRONZE_PREFIX)
+
+    # Persistir a nova marca d'água
+    write_json_object(s3_client, BRONZE_BUCKET, MANIFEST_PATH, update_manifest(manifest, new_objects, promoted, failed))
+
+    # Só depois do manifesto: se a execução parar entre os dois, os arquivos não
+    # são promovidos de novo, e no pior caso uma duplicata passa (nunca se perde linha)
+    if key_index is not None:
+        key_index.commit()
+
+    if not failed:
+        logger.info(f"Processo concluído com sucesso! {len(promoted)} arquivo(s) promovido(s)")
+    else:
+        logger.error(f"Erro no processo! {len(failed)} arquivo(s) não promovido(s)")
+
+    return not failed
+
+def main():
+    """Função principal"""
+    run(parse_args())
+
+if __name__ == "__main__":
+    main()
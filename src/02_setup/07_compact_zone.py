@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Script para compactar os arquivos pequenos dos datasets das zonas
+Junta os arquivos pequenos de cada partição em arquivos maiores, trocando-os no catálogo de uma só vez
+"""
+
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+from catalog import CONVERTED_DATASETS, DATASETS
+from compaction import DEFAULT_SMALL_FILE_SIZE, DEFAULT_TARGET_SIZE, MB, compact_dataset, is_compacted
+from metrics import add_metrics_arguments, script_stage
+from scripts import load_script
+from storage import get_s3_client, list_objects
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# As cópias em Parquet espelham arquivo a arquivo a origem (a conversão troca e remove cada cópia),
+# e a promoção ignora os arquivos compactados da landing do Protheus
+DEFAULT_DATASETS = [
+    name for name in DATASETS if name not in CONVERTED_DATASETS.values() and name != 'landing_csv'
+]
+
+def promoted_only(s3_client):
+    """
+    Filtro da landing do Protheus: só arquivos que a promoção não vai mais ler.
+
+    São os já compactados, os registrados no manifesto e os anteriores à
+    janela de atraso da marca d'água. O manifesto só guarda as chaves da
+    janela, e a promoção não olha mais os arquivos mais antigos que ela (um
+    arquivo que falhou segura a marca d'água, então nunca fica antes da janela).
+    """
+    promotion = load_script('06_promote_bronze.py')
+    manifest = promotion.load_manifest(s3_client)
+    promoted = set(manifest['promoted'])
+    if manifest['watermark']:
+        since = datetime.fromisoformat(manifest['watermark']) - promotion.LATE_ARRIVAL_WINDOW
+        promoted.update(
+            obj['Key'] for obj in list_objects(s3_client, promotion.LANDING_BUCKET, promotion.LANDING_PREFIX)
+            if obj['LastModified'] < since
+        )
+    return lambda key: is_compacted(key) or key in promoted
+
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--datasets', nargs='+', choices=list(DATASETS), default=DEFAULT_DATASETS,
+                        help='Datasets compactados (padrão: todos, menos as cópias em Parquet e a landing do Protheus)')
+    parser.add_argument('--target-size', type=int, default=DEFAULT_TARGET_SIZE // MB,
+                        help=f'Tamanho alvo dos arquivos compactados em MB (padrão: {DEFAULT_TARGET_SIZE // MB})')
+    parser.add_argument('--small-file-size', type=int, default=DEFAULT_SMALL_FILE_SIZE // MB,
+                        help=f'Arquivos menores que isso (em MB) são compactados (padrão: {DEFAULT_SMALL_FILE_SIZE // MB})')
+    parser.add_argument('--min-age-hours', type=float, default=24,
+                        help='Só compacta arquivos registrados há pelo menos tantas horas (padrão: 24)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Arquivos compactados gerados em paralelo (padrão: 4)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Só mostra o que seria compactado')
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+@script_stage('compact')
+def run(args):
+    """Compacta os datasets selecionados (usado pelo main e pelo pipeline)"""
+    logger.info("Iniciando compactação dos arquivos pequenos...")
+
+    s3_client = get_s3_client()
+    created_before = datetime.now() - timedelta(hours=args.min_age_hours)
+    failed = []
+    for name in args.datasets:
+        bucket, prefix = DATASETS[name]
+        try:
+            summary = compact_dataset(
+                s3_client, bucket, prefix,
+                target_size=args.target_size * MB,
+                small_file_size=args.small_file_size * MB,
+                created_before=created_before,
+                eligible=promoted_only(s3_client) if name == 'landing_csv' else None,
+                workers=args.workers,
+                dry_run=args.dry_run
+            )
+        except Exception as e:
+            logger.error(f"Erro ao compactar {bucket}/{prefix}: {e}")
+            failed.append(name)
+            continue
+
+        if args.dry_run:
+            logger.info(f"{bucket}/{prefix}: {summary['replaced']} arquivo(s) em {summary['bins']} lote(s) "
+                        f"seriam compactados ({summary['bytes_before'] / MB:.1f} MB)")
+        else:
+            logger.info(f"{bucket}/{prefix}: {summary['replaced']} arquivo(s) ({summary['bytes_before'] / MB:.1f} MB) "
+                        f"-> {summary['outputs']} arquivo(s) ({summary['bytes_after'] / MB:.1f} MB)")
+        if summary['failed']:
+            failed.append(name)
+
+    if not failed:
+        logger.info("Processo concluído com sucesso!")
+    else:
+        logger.error(f"Erro no processo! Datasets com problema: {', '.join(failed)}")
+
+    return not failed
+
+def main():
+    """Função principal"""
+    run(parse_args())
+
+if __name__ == "__main__":
+    main()
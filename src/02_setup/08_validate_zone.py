@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Script para validar a qualidade dos dados dos datasets das zonas
+Aplica as regras de validation.DATASET_RULES aos arquivos novos e grava as linhas rejeitadas na quarentena
+"""
+
+import argparse
+import logging
+
+from catalog import DATASETS
+from metrics import add_metrics_arguments, script_stage
+from storage import get_s3_client
+from validation import DATASET_RULES, QUARANTINE_DIR, validate_dataset
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A landing do Protheus já é validada na promoção para a bronze (e as cópias em Parquet, na origem)
+DEFAULT_DATASETS = [name for name in DATASET_RULES if name != 'landing_csv']
+
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--datasets', nargs='+', choices=list(DATASET_RULES), default=DEFAULT_DATASETS,
+                        help='Datasets validados (padrão: todos, menos a landing do Protheus)')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Arquivos validados em paralelo (padrão: 8)')
+    parser.add_argument('--revalidate', action='store_true',
+                        help='Valida de novo os arquivos já validados')
+    parser.add_argument('--report-only', action='store_true',
+                        help='Só grava a quarentena e o relatório, sem remover as linhas rejeitadas dos arquivos')
+    parser.add_argument('--max-reject-ratio', type=float, default=None,
+                        help='Falha a etapa se a fração de linhas rejeitadas de um dataset passar disso')
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+@script_stage('validate')
+def run(args):
+    """Valida os datasets selecionados (usado pelo main e pelo pipeline)"""
+    logger.info("Iniciando validação dos dados...")
+
+    s3_client = get_s3_client()
+    failed = []
+    for name in args.datasets:
+        bucket, prefix = DATASETS[name]
+        try:
+            summary = validate_dataset(s3_client, bucket, prefix, DATASET_RULES[name],
+                                       workers=args.workers, revalidate=args.revalidate,
+                                       report_only=args.report_only)
+        except Exception as e:
+            logger.error(f"Erro ao validar {bucket}/{prefix}: {e}")
+            failed.append(name)
+            continue
+
+        logger.info(f"{bucket}/{prefix}: {summary['files']} arquivo(s), {summary['rows']} linha(s), "
+                    f"{summary['rejected']} rejeitada(s) em {prefix}{QUARANTINE_DIR}, "
+                    f"{summary['cleaned']} arquivo(s) regravado(s) sem elas")
+        for rule, count in sorted(summary['violations'].items()):
+            logger.info(f"  {rule}: {count}")
+        reject_ratio = summary['rejected'] / summary['rows'] if summary['rows'] else 0
+        if summary['failed'] or (args.max_reject_ratio is not None and reject_ratio > args.max_reject_ratio):
+            failed.append(name)
+
+    if not failed:
+        logger.info("Processo concluído com sucesso!")
+    else:
+        logger.error(f"Erro no processo! Datasets com problema: {', '.join(failed)}")
+
+    return not failed
+
+def main():
+    """Função principal"""
+    run(parse_args())
+
+if __name__ == "__main__":
+    main()
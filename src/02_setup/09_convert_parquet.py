@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Script para manter cópias em Parquet dos datasets JSON (landing do SAP e silver)
+Converte os arquivos novos em Parquet com colunas struct nativas, lendo só os campos usados nas consultas
+"""
+
+import argparse
+import logging
+
+from catalog import CONVERTED_DATASETS, DATASETS
+from conversion import DEFAULT_ROW_GROUP_SIZE, convert_dataset, flat_prefix
+from metrics import add_metrics_arguments, script_stage
+from serializers import add_parquet_arguments, parquet_options
+from storage import get_s3_client
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--datasets', nargs='+', choices=list(CONVERTED_DATASETS), default=list(CONVERTED_DATASETS),
+                        help='Datasets JSON convertidos (padrão: todos)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Arquivos convertidos em paralelo, um processo por arquivo (padrão: 4)')
+    parser.add_argument('--flatten', action='store_true',
+                        help='Grava a projeção achatada (structs como colunas simples) no prefixo ..._flat/')
+    parser.add_argument('--columns', nargs='+', default=None,
+                        help='Com --flatten, só estas colunas (ex.: cliente_id dados_profissionais.salario_bruto)')
+    parser.add_argument('--derive', action='store_true',
+                        help='Com --flatten, acrescenta as colunas derivadas pelas regras da gold (derivations.py) '
+                             'aos datasets que têm regras (silver); use --rebuild ao ligar ou desligar')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Converte de novo todos os arquivos, inclusive os já convertidos')
+    add_parquet_arguments(parser)
+    # Cada row group fica em memória até ser gravado
+    parser.set_defaults(row_group_size=DEFAULT_ROW_GROUP_SIZE)
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.columns and not args.flatten:
+        parser.error("--columns requer --flatten")
+    if args.derive and not args.flatten:
+        parser.error("--derive requer --flatten")
+    if args.sort_by:
+        parser.error("--sort-by não é suportado na conversão (os arquivos são gravados em streaming)")
+    return args
+
+@script_stage('convert_parquet')
+def run(args):
+    """Converte os datasets selecionados (usado pelo main e pelo pipeline)"""
+    logger.info("Iniciando conversão dos datasets JSON para Parquet...")
+
+    s3_client = get_s3_client()
+    options = parquet_options(args)
+    options.pop('sort_by')
+    failed = []
+    for name in args.datasets:
+        target = CONVERTED_DATASETS[name]
+        bucket, prefix = DATASETS[target]
+        if args.flatten:
+            prefix = flat_prefix(prefix)
+        try:
+            summary = convert_dataset(s3_client, name, target, columns=args.columns, flatten=args.flatten,
+                                      derive=args.derive, rebuild=args.rebuild, workers=args.workers, **options)
+        except Exception as e:
+            logger.error(f"Erro ao converter {name} para {bucket}/{prefix}: {e}")
+            failed.append(name)
+            continue
+
+        logger.info(f"{summary['source']} -> {summary['target']}: {summary['files']} arquivo(s), "
+                    f"{summary['rows']} linha(s), {summary['bytes_in'] / 1e6:.1f} MB -> "
+                    f"{summary['bytes_out'] / 1e6:.1f} MB, {summary['removed']} cópia(s) removida(s)")
+        if summary['failed']:
+            failed.append(name)
+
+    if not failed:
+        logger.info("Processo concluído com sucesso!")
+    else:
+        logger.error(f"Erro no processo! Datasets com problema: {', '.join(failed)}")
+
+    return not failed
+
+def main():
+    """Função principal"""
+    run(parse_args())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Script para atualizar os rollups pré-agregados da gold
+Soma ao rollup os agregados parciais dos arquivos novos (e subtrai os dos removidos) sem reler o histórico
+"""
+
+import argparse
+import logging
+
+from catalog import DATASETS
+from metrics import add_metrics_arguments, script_stage
+from rollups import GOLD_DIMENSIONS, lookup, update_rollups
+from storage import get_s3_client
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def parse_args(argv=None):
+    """Lê os argumentos de linha de comando"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Arquivos novos agregados em paralelo (padrão: 4)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Recalcula o rollup a partir de todos os arquivos da gold')
+    parser.add_argument('--show', nargs='+', choices=GOLD_DIMENSIONS, default=None,
+                        help='Mostra o rollup agrupado por estas dimensões depois de atualizar')
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+@script_stage('gold_rollups')
+def run(args):
+    """Atualiza o rollup da gold (usado pelo main e pelo pipeline)"""
+    logger.info("Iniciando atualização dos rollups da gold...")
+
+    s3_client = get_s3_client()
+    bucket, prefix = DATASETS['gold']
+    try:
+        summary = update_rollups(s3_client, bucket, prefix, rebuild=args.rebuild, workers=args.workers)
+    except Exception as e:
+        logger.error(f"Erro ao atualizar os rollups de {bucket}/{prefix}: {e}")
+        logger.error("Erro no processo!")
+        return False
+
+    logger.info(f"{bucket}/{prefix}: {summary['files_added']} arquivo(s) novo(s) ({summary['rows_added']} linha(s)), "
+                f"{summary['files_removed']} removido(s); rollup com {summary['groups']} grupo(s) e "
+                f"{summary['rows']} linha(s)")
+    if args.show:
+        for row in lookup(args.show, s3_client=s3_client).to_pylist():
+            logger.info("  " + ", ".join(f"{column}={value:.2f}" if isinstance(value, float) else f"{column}={value}"
+                                         for column, value in row.items()))
+
+    logger.info("Processo concluído com sucesso!")
+    return True
+
+def main():
+    """Função principal"""
+    run(parse_args())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Motor de geração em lote de dados sintéticos
+Gera colunas inteiras de uma vez com NumPy em vez de um dict por linha
+"""
+
+import os
+import threading
+import time
+import uuid
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+from faker import Faker
+
+# Tamanho padrão dos pools de valores gerados pelo Faker (pode ser sobrescrito por variável de ambiente)
+DEFAULT_POOL_SIZE = int(os.environ.get('DATAGEN_POOL_SIZE', 10_000))
+
+# Seed dos pools: fixa, para que todas as execuções e shards compartilhem os mesmos
+# arquivos em disco (a variação entre execuções vem da amostragem, não do pool)
+DEFAULT_POOL_SEED = 0
+
+# Diretório dos pools persistidos (um arquivo Arrow por locale, seed, provider e tamanho)
+POOL_CACHE_DIR = os.environ.get(
+    'DATAGEN_POOL_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'spark-module1', 'pools')
+)
+
+# Quantidade padrão de linhas por lote na geração em streaming
+DEFAULT_BATCH_ROWS = 50_000
+
+# Dias por ano usados nos intervalos de datas (mesma convenção do Faker)
+DAYS_PER_YEAR = 365
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_file_path(locale, seed, provider, size):
+    """Caminho do arquivo Arrow de um pool no cache em disco"""
+    return os.path.join(POOL_CACHE_DIR, locale, f"seed-{seed}", f"{provider}-{size}.arrow")
+
+
+def build_pool(locale, seed, provider, size):
+    """Gera um pool de valores com o Faker (a parte cara, feita uma vez por pool)"""
+    fake = Faker(locale)
+    fake.seed_instance(seed)
+    method = getattr(fake, provider)
+    return pa.array([method() for _ in range(size)], type=pa.string())
+
+
+def _write_pool(file_path, values):
+    """Grava o pool de forma atômica (outros processos podem estar gravando o mesmo pool)"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with ipc.new_file(sink, pa.schema([('value', values.type)])) as writer:
+            writer.write_batch(pa.record_batch([values], names=['value']))
+    os.replace(tmp_path, file_path)
+
+
+def _read_pool(file_path):
+    """Lê o pool do disco via memory map"""
+    with pa.memory_map(file_path, 'r') as source:
+        table = ipc.open_file(source).read_all()
+    return table.column('value').to_numpy(zero_copy_only=False).astype(object)
+
+
+def load_pool(locale, seed, provider, size):
+    """
+    Retorna o pool de um provider do Faker como array NumPy de objetos.
+
+    O pool é lido do cache em disco (ou gerado e gravado na primeira vez)
+    e mantido em memória pelo resto do processo. Cada provider tem seu
+    próprio arquivo, então scripts que não usam um campo nunca o carregam.
+    Se o cache não puder ser gravado, o pool gerado é usado só em memória.
+    """
+    key = (locale, seed, provider, size)
+    if key not in _pools:
+        with _pools_lock:
+            if key not in _pools:
+                file_path = pool_file_path(locale, seed, provider, size)
+                try:
+                    _pools[key] = _read_pool(file_path)
+                except (FileNotFoundError, pa.ArrowInvalid):
+                    values = build_pool(locale, seed, provider, size)
+                    try:
+                        _write_pool(file_path, values)
+                    except OSError:
+                        pass
+                    _pools[key] = values.to_numpy(zero_copy_only=False).astype(object)
+    return _pools[key]
+
+
+class BatchGenerator:
+    """Gera colunas de dados sintéticos a partir de um gerador NumPy"""
+
+    def __init__(self, seed=None, locale='pt_BR', pool_size=DEFAULT_POOL_SIZE, reference_date=None,
+                 pool_seed=DEFAULT_POOL_SEED):
+        self.seed = seed
+        self.locale = locale
+        self.pool_size = pool_size
+        self.pool_seed = pool_seed
+        self.rng = np.random.default_rng(seed)
+        self.fixed_reference = reference_date is not None
+        self.reference_date = np.datetime64(reference_date or date.today(), 'D')
+
+    def pool(self, provider):
+        """Retorna o pool de valores pré-gerados para um provider do Faker"""
+        return load_pool(self.locale, self.pool_seed, provider, self.pool_size)
+
+    def text(self, provider, n):
+        """Amostra n valores de texto do pool de um provider do Faker"""
+        values = self.pool(provider)
+        return values[self.rng.integers(0, len(values), n)]
+
+    def uuid4(self, n):
+        """Gera n UUIDs versão 4 distintos de forma vetorizada"""
+        raw = np.frombuffer(self.rng.bytes(16 * n), dtype=np.uint8).reshape(n, 16).copy()
+        raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+        raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+        hex_digits = np.frombuffer(raw.tobytes().hex().encode('ascii'), dtype=np.uint8).reshape(n, 32)
+        dash = np.full((n, 1), ord('-'), dtype=np.uint8)
+        formatted = np.hstack([
+            hex_digits[:, 0:8], dash,
+            hex_digits[:, 8:12], dash,
+            hex_digits[:, 12:16], dash,
+            hex_digits[:, 16:20], dash,
+            hex_digits[:, 20:32],
+        ]).tobytes().decode('ascii')
+        return np.array([formatted[i:i + 36] for i in range(0, 36 * n, 36)], dtype=object)
+
+    def choice(self, options, n):
+        """Escolhe n valores de uma lista de opções (equivalente a random.choice)"""
+        return np.asarray(options, dtype=object)[self.rng.integers(0, len(options), n)]
+
+    def booleans(self, n):
+        """Gera n valores booleanos"""
+        return self.rng.integers(0, 2, n).astype(bool)
+
+    def uniform(self, low, high, n, decimals=2):
+        """Gera n valores decimais entre low e high (equivalente a random.uniform)"""
+        return np.round(self.rng.uniform(low, high, n), decimals)
+
+    def randint(self, low, high, n):
+        """Gera n inteiros entre low e high inclusive (equivalente a random.randint)"""
+        return self.rng.integers(low, high, n, endpoint=True)
+
+    def date_between(self, days_ago, n, end_days_ago=0):
+        """Gera n datas entre hoje - days_ago e hoje - end_days_ago"""
+        offsets = self.rng.integers(end_days_ago, days_ago, n, endpoint=True)
+        return self.reference_date - offsets.astype('timedelta64[D]')
+
+    def date_of_birth(self, minimum_age, maximum_age, n):
+        """Gera n datas de nascimento para idades entre minimum_age e maximum_age"""
+        return self.date_between(
+            (maximum_age + 1) * DAYS_PER_YEAR - 1, n, end_days_ago=minimum_age * DAYS_PER_YEAR
+        )
+
+    def iter_batches(self, build_columns, num_records, batch_rows=DEFAULT_BATCH_ROWS):
+        """Chama build_columns(self, n) em lotes de até batch_rows linhas"""
+        for start in range(0, num_records, batch_rows):
+            yield build_columns(self, min(batch_rows, num_records - start))
+
+    def iter_record_batches(self, build_columns, num_records, schema=None, batch_rows=DEFAULT_BATCH_ROWS):
+        """
+        Gera os dados como RecordBatches Arrow de até batch_rows linhas.
+
+        Só um lote existe em memória por vez, então o número de linhas não é
+        limitado pela RAM. Colunas aninhadas viram structs; com schema todos
+        os lotes têm exatamente os mesmos tipos.
+        """
+        for columns in self.iter_batches(build_columns, num_records, batch_rows):
+            yield build_record_batch(columns, schema)
+
+    def timestamp(self):
+        """Data/hora de referência no formato usado nos metadados das zonas"""
+        if self.fixed_reference:
+            # Data de referência fixa: saída reprodutível entre execuções
+            return f"{self.reference_date} 00:00:00"
+        return time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def years(value):
+    """Converte anos em dias para os intervalos de datas"""
+    return value * DAYS_PER_YEAR
+
+
+def format_dates(values):
+    """Converte um array datetime64[D] em strings YYYY-MM-DD"""
+    # Poucas datas distintas: formata só os valores únicos e reindexa
+    unique, inverse = np.unique(values, return_inverse=True)
+    return np.datetime_as_string(unique, unit='D').astype(object)[inverse]
+
+
+def build_records(columns):
+    """Monta a lista de dicts (com objetos aninhados) a partir de colunas"""
+    num_records = _num_rows(columns)
+    names = list(columns)
+    values = []
+    for value in columns.values():
+        if isinstance(value, dict):
+            values.append(build_records(value))
+        elif np.isscalar(value):
+            values.append([value] * num_records)
+        else:
+            values.append(np.asarray(value).tolist())
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def build_table(columns, schema):
+    """Monta uma tabela Arrow com o schema explícito a partir de colunas"""
+    return pa.Table.from_batches([build_record_batch(columns, schema)])
+
+
+def build_record_batch(columns, schema=None):
+    """
+    Monta um RecordBatch Arrow a partir de colunas (dicts aninhados viram structs).
+
+    Sem schema os tipos são inferidos dos arrays NumPy; com schema cada
+    coluna (inclusive os campos dos structs) é convertida para o tipo dele.
+    """
+    arrays, fields = _build_arrays(columns, _num_rows(columns), schema)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema or pa.schema(fields))
+
+
+def _build_arrays(columns, num_records, fields=None):
+    types = {field.name: field.type for field in fields} if fields is not None else {}
+    names = [field.name for field in fields] if fields is not None else list(columns)
+    arrays = []
+    for name in names:
+        value = columns[name]
+        if isinstance(value, dict):
+            child_fields = list(types[name]) if name in types else None
+            children, child_fields = _build_arrays(value, num_records, child_fields)
+            array = pa.StructArray.from_arrays(children, fields=child_fields)
+        else:
+            if np.isscalar(value):
+                value = np.full(num_records, value, dtype=object)
+            array = pa.array(value, type=types.get(name))
+        arrays.append(array)
+    if fields is not None:
+        return arrays, list(fields)
+    return arrays, [pa.field(name, array.type) for name, array in zip(names, arrays)]
+
+
+def _num_rows(columns):
+    """Descobre o número de linhas de um conjunto (possivelmente aninhado) de colunas"""
+    for value in columns.values():
+        if isinstance(value, dict):
+            return _num_rows(value)
+        if not np.isscalar(value):
+            return len(value)
+    raise ValueError("Ao menos uma coluna precisa ser um array")
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Catálogo dos datasets gravados nas zonas
+Cada dataset guarda em _catalog.json as chaves, formatos, contagens, tamanhos, schema e
+estatísticas por coluna dos seus arquivos, para planejar leituras sem listar o bucket
+"""
+
+import hashlib
+import logging
+import math
+import os
+import time
+import uuid
+from datetime import date, datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import metrics
+from compression import split_compression
+from partitioning import parse_partition_values
+from storage import delete_objects, list_objects, read_json_object, update_json_object, write_json_object
+
+logger = logging.getLogger(__name__)
+
+# Catálogo consolidado e segmentos ainda não consolidados (arquivos com _ são ignorados pelo Spark)
+CATALOG_FILE = '_catalog.json'
+SEGMENTS_DIR = '_catalog/'
+
+# Strings mais longas não guardam min/max (endereços, por exemplo, não servem para filtrar)
+MAX_STAT_LENGTH = 64
+
+# Formato do arquivo pela extensão
+FORMATS = {
+    '.csv': 'csv',
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.parquet': 'parquet',
+}
+
+# Datasets das zonas: bucket e prefixo do catálogo
+DATASETS = {
+    'landing_csv': ('landing-zone', 'dataway/protheus/clients/'),
+    'landing_json': ('landing-zone', 'dataway/sap/clients/'),
+    'landing_parquet': ('landing-zone', 'dataway/cloud_x/clients/'),
+    'bronze': ('bronze-zone', 'processed/protheus/'),
+    'silver': ('silver-zone', 'enriched/sap/'),
+    'gold': ('gold-zone', 'analytics/cloud_x/'),
+    # Cópias em Parquet dos datasets JSON, geradas pela conversão (09_convert_parquet.py)
+    'landing_json_parquet': ('landing-zone', 'dataway/sap/clients_parquet/'),
+    'silver_parquet': ('silver-zone', 'enriched/sap_parquet/'),
+}
+
+# Dataset JSON de origem -> cópia em Parquet (espelho mantido pela conversão, não compactado à parte)
+CONVERTED_DATASETS = {
+    'landing_json': 'landing_json_parquet',
+    'silver': 'silver_parquet',
+}
+
+# Operadores aceitos nos filtros (mesmos do pyarrow/Spark)
+OPERATORS = ('=', '==', '!=', '<', '<=', '>', '>=', 'in', 'not in')
+
+
+def dataset_prefix(file_path):
+    """Prefixo do dataset de um arquivo (diretório sem os níveis de partição chave=valor)"""
+    parts = file_path.split('/')[:-1]
+    while parts and '=' in parts[-1]:
+        parts.pop()
+    return '/'.join(parts) + '/' if parts else ''
+
+
+def schema_fingerprint(schema):
+    """Impressão digital curta do schema (nomes e tipos das colunas)"""
+    return hashlib.sha256(schema.remove_metadata().to_string().encode('utf-8')).hexdigest()[:16]
+
+
+def to_table(data):
+    """Converte uma tabela ou RecordBatch Arrow, DataFrame ou lista de registros em tabela Arrow"""
+    if isinstance(data, pa.Table):
+        return data
+    if isinstance(data, pa.RecordBatch):
+        return pa.Table.from_batches([data])
+    if isinstance(data, pd.DataFrame):
+        return pa.Table.from_pandas(data, preserve_index=False)
+    return pa.Table.from_pylist(list(data))
+
+
+def flatten_table(table):
+    """Expande structs em colunas com nomes pontuados (endereco.estado)"""
+    while any(pa.types.is_struct(field.type) for field in table.schema):
+        table = table.flatten()
+    return table
+
+
+def _is_ordered(data_type):
+    return (pa.types.is_integer(data_type) or pa.types.is_floating(data_type)
+            or pa.types.is_decimal(data_type) or pa.types.is_temporal(data_type)
+            or pa.types.is_string(data_type) or pa.types.is_large_string(data_type)
+            or pa.types.is_boolean(data_type))
+
+
+def _json_value(value):
+    """Valor de estatística em formato JSON (datas em ISO, NaN descartado)"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def column_stats(table):
+    """
+    Estatísticas por coluna de uma tabela: tipo, nulos e min/max.
+
+    Structs são expandidos em colunas pontuadas. min/max só aparecem quando
+    são limites confiáveis; colunas sem nenhum valor têm min e max None.
+    """
+    stats = {}
+    table = flatten_table(table)
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        entry = {'type': str(column.type), 'null_count': column.null_count}
+        if _is_ordered(column.type):
+            if column.null_count == len(column):
+                entry['min'] = entry['max'] = None
+            else:
+                min_max = pc.min_max(column)
+                low, high = _json_value(min_max['min'].as_py()), _json_value(min_max['max'].as_py())
+                if low is not None and high is not None and not (
+                        isinstance(low, str) and max(len(low), len(high)) > MAX_STAT_LENGTH):
+                    entry['min'], entry['max'] = low, high
+        stats[name] = entry
+    return stats
+
+
+def merge_column_stats(left, right):
+    """Combina as estatísticas de dois blocos do mesmo arquivo"""
+    merged = {}
+    for name in list(left) + [name for name in right if name not in left]:
+        if name not in left or name not in right:
+            # Coluna ausente em um dos blocos: só os nulos continuam conhecidos
+            entry = dict(left.get(name) or right[name])
+            entry.pop('min', None)
+            entry.pop('max', None)
+            merged[name] = entry
+            continue
+        a, b = left[name], right[name]
+        entry = {'type': a['type'] if a['type'] == b['type'] else 'mixed',
+                 'null_count': a['null_count'] + b['null_count']}
+        if 'min' in a and 'min' in b:
+            lows = [value for value in (a['min'], b['min']) if value is not None]
+            highs = [value for value in (a['max'], b['max']) if value is not None]
+            try:
+                entry['min'] = min(lows) if lows else None
+                entry['max'] = max(highs) if highs else None
+            except TypeError:
+                entry.pop('min', None)
+                entry.pop('max', None)
+        merged[name] = entry
+    return merged
+
+
+class FileStats:
+    """Acumula contagem, schema e estatísticas de um arquivo escrito em vários blocos"""
+
+    def __init__(self):
+        self.rows = 0
+        self.columns = None
+        self.fingerprint = None
+
+    def add(self, data):
+        table = to_table(data)
+        self.rows += table.num_rows
+        stats = column_stats(table)
+        self.columns = stats if self.columns is None else merge_column_stats(self.columns, stats)
+        if self.fingerprint is None:
+            self.fingerprint = schema_fingerprint(table.schema)
+        return self
+
+    def track(self, batches):
+        """Repassa os lotes (ex.: RecordBatches) acumulando as estatísticas de cada um"""
+        for batch in batches:
+            self.add(batch)
+            yield batch
+
+    def entry(self, file_path, bytes_written):
+        """Entrada do catálogo para o arquivo gravado"""
+        root, compression = split_compression(file_path)
+        return {
+            'key': file_path,
+            'format': FORMATS.get(os.path.splitext(root)[1], 'binary'),
+            'compression': compression,
+            'rows': self.rows,
+            'bytes': bytes_written,
+            'schema_fingerprint': self.fingerprint,
+            'partition': parse_partition_values(file_path[len(dataset_prefix(file_path)):]),
+            'columns': self.columns or {},
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+
+def file_entry(file_path, data, bytes_written):
+    """Entrada do catálogo para um arquivo gravado de uma vez só"""
+    return FileStats().add(data).entry(file_path, bytes_written)
+
+
+def merge_entries(file_path, entries, bytes_written):
+    """Entrada do catálogo para um arquivo formado pela junção de outros (ex.: compactação)"""
+    stats = FileStats()
+    for entry in entries:
+        stats.rows += entry['rows']
+        stats.columns = entry['columns'] if stats.columns is None else merge_column_stats(stats.columns, entry['columns'])
+        stats.fingerprint = stats.fingerprint or entry['schema_fingerprint']
+    return stats.entry(file_path, bytes_written)
+
+
+class RollingFileStats:
+    """
+    Estatísticas de cada objeto gravado por upload_rolling.
+
+    chunks() serializa os lotes em blocos e acumula as estatísticas do objeto
+    atual; on_object (passado para upload_rolling) fecha a entrada do objeto
+    quando ele é concluído.
+    """
+
+    def __init__(self):
+        self.entries = []
+        self._stats = FileStats()
+
+    def chunks(self, batches, serialize_fn, chunk_rows):
+        for records in batches:
+            for start in range(0, len(records), chunk_rows):
+                block = records[start:start + chunk_rows]
+                self._stats.add(block)
+                yield from serialize_fn([block])
+
+    def on_object(self, file_path, bytes_written):
+        self.entries.append(self._stats.entry(file_path, bytes_written))
+        self._stats = FileStats()
+
+
+def record_files(s3_client, bucket_name, entries):
+    """
+    Registra arquivos recém-gravados no catálogo dos seus datasets.
+
+    Cada chamada grava um segmento novo em _catalog/ em vez de reescrever o
+    catálogo, então processos workers podem registrar arquivos ao mesmo
+    tempo. consolidate_catalog junta os segmentos depois.
+    """
+    metrics.increment('files_written', len(entries))
+    metrics.increment('rows_written', sum(entry['rows'] for entry in entries))
+    by_prefix = {}
+    for entry in entries:
+        by_prefix.setdefault(dataset_prefix(entry['key']), []).append(entry)
+    for prefix, prefix_entries in by_prefix.items():
+        segment_path = f"{prefix}{SEGMENTS_DIR}segment_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}.json"
+        write_json_object(s3_client, bucket_name, segment_path, {'files': prefix_entries})
+
+
+def _segments(s3_client, bucket_name, prefix):
+    """Segmentos pendentes do catálogo, em ordem de gravação"""
+    return sorted(obj['Key'] for obj in list_objects(s3_client, bucket_name, prefix + SEGMENTS_DIR))
+
+
+def load_catalog(s3_client, bucket_name, prefix):
+    """Carrega o catálogo de um dataset, incluindo os segmentos ainda não consolidados"""
+    catalog = read_json_object(s3_client, bucket_name, prefix + CATALOG_FILE, default={'files': {}})
+    for segment_path in _segments(s3_client, bucket_name, prefix):
+        segment = read_json_object(s3_client, bucket_name, segment_path, default={'files': []})
+        for entry in segment['files']:
+            catalog['files'][entry['key']] = entry
+    return catalog
+
+
+def consolidate_catalog(s3_client, bucket_name, prefix):
+    """
+    Junta os segmentos pendentes no _catalog.json do dataset e os remove.
+
+    A gravação é condicional (update_json_object): se outro job (merge,
+    compactação, outra etapa) gravar o catálogo ao mesmo tempo, os
+    segmentos são reaplicados sobre a versão dele, sem perder nenhuma das
+    alterações. Só os segmentos aplicados são removidos.
+    """
+    segments = _segments(s3_client, bucket_name, prefix)
+    if not segments:
+        return
+    entries = []
+    for segment_path in segments:
+        entries.extend(read_json_object(s3_client, bucket_name, segment_path, default={'files': []})['files'])
+
+    def add_entries(catalog):
+        for entry in entries:
+            catalog['files'][entry['key']] = entry
+        return catalog
+
+    catalog = update_json_object(s3_client, bucket_name, prefix + CATALOG_FILE, add_entries, default={'files': {}})
+    delete_objects(s3_client, bucket_name, segments)
+    logger.info(f"Catálogo de {bucket_name}/{prefix} atualizado: {len(catalog['files'])} arquivo(s)")
+
+
+def replace_files(s3_client, bucket_name, prefix, removed_keys, entries):
+    """
+    Troca arquivos do catálogo em uma única gravação do _catalog.json.
+
+    Quem planeja leituras pelo catálogo passa a ver os arquivos novos e
+    deixa de ver os removidos no mesmo instante. A gravação é condicional,
+    como em consolidate_catalog, e a operação é idempotente.
+    """
+    consolidate_catalog(s3_client, bucket_name, prefix)
+
+    def swap_files(catalog):
+        for key in removed_keys:
+            catalog['files'].pop(key, None)
+        for entry in entries:
+            catalog['files'][entry['key']] = entry
+        return catalog
+
+    update_json_object(s3_client, bucket_name, prefix + CATALOG_FILE, swap_files, default={'files': {}})
+
+
+def _may_match(entry, column, op, value):
+    """Diz se o arquivo pode ter linhas que satisfazem o filtro (False só quando há certeza)"""
+    if column in entry['partition']:
+        low = high = entry['partition'][column]
+        if isinstance(value, (list, tuple, set)):
+            value = [str(_json_value(item)) for item in value]
+        else:
+            value = str(_json_value(value))
+    else:
+        stats = entry['columns'].get(column)
+        if stats is None or 'min' not in stats:
+            return True
+        low, high = stats['min'], stats['max']
+        if isinstance(value, (list, tuple, set)):
+            value = [_json_value(item) for item in value]
+        else:
+            value = _json_value(value)
+
+    # Sem nenhum valor não nulo, nenhuma comparação é verdadeira
+    if low is None:
+        return False
+    try:
+        if op in ('=', '=='):
+            return low <= value <= high
+        if op == '!=':
+            return not (low == high == value)
+        if op == '<':
+            return low < value
+        if op == '<=':
+            return low <= value
+        if op == '>':
+            return high > value
+        if op == '>=':
+            return high >= value
+        if op == 'in':
+            return any(low <= item <= high for item in value)
+        if op == 'not in':
+            return not (low == high and low in value)
+    except TypeError:
+        return True
+    raise ValueError(f"Operador não suportado: {op} (use um de {OPERATORS})")
+
+
+def find_files(s3_client, bucket_name, prefix, filters=None):
+    """
+    Arquivos do dataset que podem conter linhas satisfazendo todos os filtros.
+
+    filters é uma lista de tuplas (coluna, operador, valor), como nos filtros
+    do pyarrow, por exemplo [('estado', '=', 'SP'), ('score_credito', '>=', 700)].
+    Colunas aninhadas usam nomes pontuados e colunas de partição são
+    comparadas pelo valor do caminho. Os arquivos são descartados só pelas
+    estatísticas, então os filtros ainda precisam ser aplicados na leitura.
+    """
+    catalog = load_catalog(s3_client, bucket_name, prefix)
+    return [
+        entry for _, entry in sorted(catalog['files'].items())
+        if all(_may_match(entry, column, op, value) for column, op, value in filters or [])
+    ]
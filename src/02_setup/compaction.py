@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Compactação dos arquivos pequenos dos datasets das zonas
+Junta os arquivos pequenos de cada partição em arquivos do tamanho alvo, no mesmo formato e schema
+"""
+
+import contextvars
+import io
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pyarrow.parquet as pq
+
+from catalog import consolidate_catalog, load_catalog, merge_entries, replace_files
+from compression import CODECS, open_compressed, open_decompressed, split_compression
+from serializers import DEFAULT_PARQUET_COMPRESSION, DEFAULT_ROW_GROUP_SIZE
+from storage import (MultipartUploadWriter, content_type_for, delete_objects, list_objects,
+                     read_json_object, write_json_object)
+
+logger = logging.getLogger(__name__)
+
+# Nome dos arquivos gerados pela compactação (a promoção para a bronze os ignora)
+COMPACTED_FILE_PREFIX = 'compacted_'
+
+# Registro de cada compactação: arquivos substituídos e arquivos gerados
+COMPACTION_DIR = '_compaction/'
+
+MB = 1024 * 1024
+
+# Tamanho alvo dos arquivos compactados e limite para um arquivo ser considerado pequeno
+DEFAULT_TARGET_SIZE = 256 * MB
+DEFAULT_SMALL_FILE_SIZE = 64 * MB
+
+
+def is_compacted(file_path):
+    """Diz se o arquivo foi gerado pela compactação"""
+    return os.path.basename(file_path).startswith(COMPACTED_FILE_PREFIX)
+
+
+def plan_bins(entries, target_size=DEFAULT_TARGET_SIZE, small_file_size=DEFAULT_SMALL_FILE_SIZE, created_before=None,
+              eligible=None):
+    """
+    Agrupa os arquivos pequenos do catálogo em lotes de até target_size bytes.
+
+    Só entram no mesmo lote arquivos do mesmo diretório (partição), formato,
+    compressão e schema. Arquivos a partir de small_file_size bytes ou
+    criados depois de created_before ficam de fora, assim como lotes de um
+    arquivo só e, se informado, arquivos cuja chave eligible recusa.
+    Arquivos compactados que ainda são pequenos voltam a ser candidatos,
+    então execuções seguintes só juntam o que chegou depois.
+    """
+    groups = {}
+    for entry in entries:
+        if entry['bytes'] >= small_file_size or entry['format'] == 'binary':
+            continue
+        if eligible is not None and not eligible(entry['key']):
+            continue
+        if created_before is not None and datetime.fromisoformat(entry['created_at']) > created_before:
+            continue
+        group_key = (os.path.dirname(entry['key']), entry['format'], entry.get('compression'),
+                     entry['schema_fingerprint'])
+        groups.setdefault(group_key, []).append(entry)
+
+    bins = []
+    for _, group in sorted(groups.items(), key=lambda item: str(item[0])):
+        current, current_size = [], 0
+        for entry in sorted(group, key=lambda entry: entry['key']):
+            if current and current_size + entry['bytes'] > target_size:
+                bins.append(current)
+                current, current_size = [], 0
+            current.append(entry)
+            current_size += entry['bytes']
+        bins.append(current)
+    return [files for files in bins if len(files) > 1]
+
+
+def compacted_file_path(file_path, timestamp, index):
+    """Caminho do arquivo compactado no mesmo diretório e com a mesma extensão do original"""
+    root, compression = split_compression(file_path)
+    extension = os.path.splitext(root)[1] + (CODECS[compression]['extension'] if compression else '')
+    directory = os.path.dirname(file_path)
+    file_name = f"{COMPACTED_FILE_PREFIX}{timestamp}_{index:05d}{extension}"
+    return f"{directory}/{file_name}" if directory else file_name
+
+
+def _read_file(s3_client, bucket_name, entry):
+    """Lê um arquivo pequeno inteiro, já descomprimido"""
+    raw = s3_client.get_object(Bucket=bucket_name, Key=entry['key'])['Body'].read()
+    return open_decompressed(io.BytesIO(raw), entry.get('compression')).read()
+
+
+def _ensure_newline(data):
+    return data if not data or data.endswith(b'\n') else data + b'\n'
+
+
+def _merge_csv(s3_client, bucket_name, entries, out):
+    header = None
+    for entry in entries:
+        file_header, _, rows = _read_file(s3_client, bucket_name, entry).partition(b'\n')
+        if header is None:
+            header = file_header
+            out.write(header + b'\n')
+        elif file_header != header:
+            raise ValueError(f"Cabeçalho diferente em {entry['key']}")
+        out.write(_ensure_newline(rows))
+
+
+def _merge_ndjson(s3_client, bucket_name, entries, out):
+    for entry in entries:
+        out.write(_ensure_newline(_read_file(s3_client, bucket_name, entry)))
+
+
+def _merge_json_array(s3_client, bucket_name, entries, out):
+    # Junta os elementos dos arrays sem decodificar os registros
+    out.write(b'[\n')
+    first = True
+    for entry in entries:
+        elements = _read_file(s3_client, bucket_name, entry).strip()[1:-1].strip(b'\n')
+        if elements:
+            out.write(elements if first else b',\n' + elements)
+            first = False
+    out.write(b'\n]')
+
+
+def _merge_parquet(s3_client, bucket_name, entries, out):
+    writer = None
+    try:
+        for entry in entries:
+            table = pq.read_table(io.BytesIO(_read_file(s3_client, bucket_name, entry)))
+            if writer is None:
+                writer = pq.ParquetWriter(out, table.schema, compression=DEFAULT_PARQUET_COMPRESSION)
+            writer.write_table(table, row_group_size=DEFAULT_ROW_GROUP_SIZE)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+MERGE_FUNCTIONS = {
+    'csv': _merge_csv,
+    'ndjson': _merge_ndjson,
+    'json': _merge_json_array,
+    'parquet': _merge_parquet,
+}
+
+
+def compact_files(s3_client, bucket_name, entries, file_path):
+    """
+    Junta os arquivos de um lote em file_path e devolve a entrada do catálogo do novo arquivo.
+
+    Os arquivos são lidos um de cada vez e o resultado é enviado em
+    streaming, então a memória fica limitada a um arquivo pequeno.
+    """
+    merge_fn = MERGE_FUNCTIONS[entries[0]['format']]
+    compression = entries[0].get('compression')
+    with MultipartUploadWriter(s3_client, bucket_name, file_path, content_type=content_type_for(file_path)) as writer:
+        if compression:
+            with open_compressed(writer, compression) as out:
+                merge_fn(s3_client, bucket_name, entries, out)
+        else:
+            merge_fn(s3_client, bucket_name, entries, writer)
+    return merge_entries(file_path, entries, writer.bytes_written)
+
+
+def _apply_compaction(s3_client, bucket_name, prefix, log_path, log):
+    """Troca os arquivos no catálogo, remove os substituídos e marca a compactação como concluída"""
+    replace_files(s3_client, bucket_name, prefix, log['replaced'], log['outputs'])
+    delete_objects(s3_client, bucket_name, log['replaced'])
+    log['status'] = 'done'
+    log['finished_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    write_json_object(s3_client, bucket_name, log_path, log)
+
+
+def recover_pending(s3_client, bucket_name, prefix):
+    """Conclui compactações interrompidas depois de os arquivos novos terem sido gravados"""
+    for obj in list_objects(s3_client, bucket_name, prefix + COMPACTION_DIR):
+        log = read_json_object(s3_client, bucket_name, obj['Key'])
+        if log and log.get('status') == 'pending':
+            logger.info(f"Concluindo compactação interrompida {bucket_name}/{obj['Key']}")
+            _apply_compaction(s3_client, bucket_name, prefix, obj['Key'], log)
+
+
+def compact_dataset(s3_client, bucket_name, prefix, target_size=DEFAULT_TARGET_SIZE,
+                    small_file_size=DEFAULT_SMALL_FILE_SIZE, created_before=None, eligible=None, workers=4,
+                    dry_run=False):
+    """
+    Compacta os arquivos pequenos de um dataset registrados no catálogo.
+
+    Os arquivos novos são gravados primeiro; depois a compactação é
+    registrada em _compaction/ e o catálogo troca os arquivos antigos pelos
+    novos em uma única gravação, e só então os antigos são removidos. Uma
+    execução interrompida é concluída pela próxima. eligible (chave ->
+    bool) restringe os arquivos que podem ser compactados. Retorna um resumo.
+    """
+    recover_pending(s3_client, bucket_name, prefix)
+    consolidate_catalog(s3_client, bucket_name, prefix)
+    catalog = load_catalog(s3_client, bucket_name, prefix)
+    bins = plan_bins(catalog['files'].values(), target_size, small_file_size, created_before, eligible)
+
+    summary = {
+        'bucket': bucket_name,
+        'prefix': prefix,
+        'bins': len(bins),
+        'replaced': sum(len(files) for files in bins),
+        'bytes_before': sum(entry['bytes'] for files in bins for entry in files),
+        'outputs': 0,
+        'bytes_after': 0,
+        'failed': 0,
+    }
+    if not bins or dry_run:
+        return summary
+
+    timestamp = int(time.time())
+    paths = [compacted_file_path(files[0]['key'], timestamp, index) for index, files in enumerate(bins)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, compact_files, s3_client, bucket_name, files, path)
+            for files, path in zip(bins, paths)
+        ]
+
+    replaced, outputs = [], []
+    for files, path, future in zip(bins, paths, futures):
+        try:
+            outputs.append(future.result())
+            replaced += [entry['key'] for entry in files]
+        except Exception as e:
+            logger.error(f"Erro ao compactar {bucket_name}/{path}: {e}")
+            summary['failed'] += 1
+    if not outputs:
+        return summary
+
+    log_path = f"{prefix}{COMPACTION_DIR}compaction_{timestamp}.json"
+    log = {
+        'status': 'pending',
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'replaced': replaced,
+        'outputs': outputs,
+    }
+    write_json_object(s3_client, bucket_name, log_path, log)
+    _apply_compaction(s3_client, bucket_name, prefix, log_path, log)
+
+    summary.update(replaced=len(replaced), outputs=len(outputs), bytes_after=sum(entry['bytes'] for entry in outputs))
+    return summary
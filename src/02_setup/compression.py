@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Compressão em streaming dos arquivos CSV e JSON
+gzip (compatível com qualquer leitor) ou zstd (mais rápido, requer o pacote zstandard)
+"""
+
+import gzip
+import os
+
+try:
+    import zstandard
+except ImportError:  # dependência opcional: uv sync --extra zstd
+    zstandard = None
+
+# Codecs aceitos: extensão do arquivo e Content-Encoding do objeto
+CODECS = {
+    'gzip': {'extension': '.gz', 'content_encoding': 'gzip'},
+    'zstd': {'extension': '.zst', 'content_encoding': 'zstd'},
+}
+
+# Níveis padrão (o 9 do gzip é bem mais lento e comprime pouco mais que o 6)
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+
+
+def add_compression_arguments(parser):
+    """Adiciona as opções de compressão ao parser de linha de comando"""
+    parser.add_argument('--compression', choices=['none'] + list(CODECS), default='none',
+                        help='Compressão dos arquivos: gzip (compatível) ou zstd (mais rápido) (padrão: none)')
+    parser.add_argument('--compression-level', type=int, default=None,
+                        help='Nível de compressão (padrão: 6 no gzip, 3 no zstd)')
+
+
+def compression_options(args):
+    """Converte os argumentos de linha de comando em opções de compressão"""
+    return {
+        'compression': None if args.compression == 'none' else args.compression,
+        'compression_level': args.compression_level,
+    }
+
+
+def compressed_file_path(file_path, compression):
+    """Acrescenta a extensão do codec ao nome do arquivo (ex.: .csv.gz)"""
+    if not compression:
+        return file_path
+    return file_path + CODECS[compression]['extension']
+
+
+def split_compression(file_path):
+    """Separa a extensão de compressão: ('x.csv.gz') -> ('x.csv', 'gzip')"""
+    root, ext = os.path.splitext(file_path)
+    for codec, options in CODECS.items():
+        if ext == options['extension']:
+            return root, codec
+    return file_path, None
+
+
+def content_encoding_for(file_path):
+    """Content-Encoding do objeto pela extensão de compressão (None se não comprimido)"""
+    codec = split_compression(file_path)[1]
+    return CODECS[codec]['content_encoding'] if codec else None
+
+
+def open_compressed(fileobj, compression, compression_level=None):
+    """
+    Abre um arquivo que comprime os bytes escritos e os repassa para fileobj.
+
+    O fileobj continua aberto depois de close(), que só finaliza o fluxo
+    comprimido. O gzip é gravado sem data de modificação no cabeçalho, para
+    que a mesma entrada gere sempre os mesmos bytes.
+    """
+    level = compression_level if compression_level is not None else DEFAULT_LEVELS[compression]
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=level, mtime=0)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("A compressão zstd requer o pacote zstandard (uv sync --extra zstd)")
+        return zstandard.ZstdCompressor(level=level).stream_writer(fileobj, closefd=False)
+    raise ValueError(f"Codec de compressão não suportado: {compression}")
+
+
+def open_decompressed(fileobj, compression):
+    """Abre um arquivo que descomprime o conteúdo lido de fileobj (ou o próprio fileobj)"""
+    if not compression:
+        return fileobj
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='rb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("A compressão zstd requer o pacote zstandard (uv sync --extra zstd)")
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False)
+    raise ValueError(f"Codec de compressão não suportado: {compression}")
+
+
+def write_compressed(write_fn, data, fileobj, compression=None, compression_level=None):
+    """Chama write_fn(dados, arquivo) comprimindo a saída quando há compression"""
+    if not compression:
+        return write_fn(data, fileobj)
+    with open_compressed(fileobj, compression, compression_level) as compressed:
+        write_fn(data, compressed)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Conversão dos datasets JSON (SAP) em Parquet com colunas struct nativas
+Cada arquivo é lido em streaming e gravado em row groups, com memória limitada a um row group por worker
+"""
+
+import codecs
+import json
+import logging
+import os
+import time
+from functools import partial
+
+import pyarrow as pa
+import pyarrow.json as pajson
+
+import metrics
+from catalog import DATASETS, FileStats, consolidate_catalog, flatten_table, load_catalog, replace_files
+from compression import open_decompressed, split_compression
+from derivations import DATASET_DERIVATIONS, derive_table
+from schemas import GOLD_SCHEMA, dataset_schema, text_schema
+from scripts import worker_pool
+from serializers import DEFAULT_PARQUET_COMPRESSION, write_parquet_batches
+from storage import MultipartUploadWriter, delete_objects, get_s3_client, read_json_object, write_json_object
+
+logger = logging.getLogger(__name__)
+
+# Arquivo de origem -> cópia em Parquet já gravada (no prefixo da cópia)
+CONVERSION_MANIFEST = '_conversion.json'
+
+# Registros decodificados por lote e linhas por row group do Parquet
+DEFAULT_BATCH_RECORDS = 20_000
+DEFAULT_ROW_GROUP_SIZE = 100_000
+
+# Bytes lidos do objeto por vez
+READ_BLOCK_SIZE = 8 * 1024 * 1024
+
+# Caracteres entre os objetos de um array JSON ou de um NDJSON
+_SEPARATORS = ' \t\r\n,[]'
+
+
+def flat_prefix(prefix):
+    """Prefixo da projeção achatada de uma cópia (dataway/sap/clients_parquet/ -> ..._flat/)"""
+    return prefix.rstrip('/') + '_flat/'
+
+
+def flat_name(column):
+    """Nome da coluna achatada (dados_profissionais.salario_bruto -> dados_profissionais_salario_bruto)"""
+    return column.replace('.', '_')
+
+
+def flatten_columns(table, columns=None):
+    """Expande os structs em colunas simples, opcionalmente só as colunas pontuadas de columns"""
+    table = flatten_table(table)
+    if columns:
+        table = table.select(columns)
+    return table.rename_columns([flat_name(column) for column in table.column_names])
+
+
+def iter_json_records(fileobj, block_size=READ_BLOCK_SIZE):
+    """
+    Decodifica um a um os objetos de um array JSON ou de um NDJSON lido em blocos.
+
+    Só o bloco atual e o objeto incompleto do fim dele ficam em memória,
+    então arrays indentados de qualquer tamanho são lidos sem carregar o
+    arquivo inteiro.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer, position, eof = '', 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in _SEPARATORS:
+            position += 1
+        if position < len(buffer):
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+                yield record
+                continue
+            except json.JSONDecodeError:
+                # Objeto cortado no fim do bloco: lê mais um bloco e tenta de novo
+                if eof:
+                    raise
+        elif eof:
+            return
+        block = fileobj.read(block_size)
+        eof = not block
+        buffer = buffer[position:] + text_decoder.decode(block, final=eof)
+        position = 0
+
+
+def _batched(records, batch_records):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_records:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_source_batches(s3_client, bucket_name, entry, schema, batch_records=DEFAULT_BATCH_RECORDS):
+    """
+    Lê um arquivo JSON do catálogo em lotes Arrow com o schema tipado.
+
+    NDJSON é lido pelo leitor em streaming do pyarrow; arrays JSON (e
+    NDJSON em versões do pyarrow sem esse leitor) pelo decodificador
+    incremental. Os lotes são montados com as datas como texto (como estão
+    no arquivo) e convertidos para o schema registrado.
+    """
+    body = s3_client.get_object(Bucket=bucket_name, Key=entry['key'])['Body']
+    stream = open_decompressed(body, entry.get('compression'))
+    source_schema = text_schema(schema)
+    # O leitor em streaming do pyarrow (open_json) só existe a partir do pyarrow 20
+    if entry['format'] == 'ndjson' and hasattr(pajson, 'open_json'):
+        reader = pajson.open_json(
+            pa.PythonFile(stream, mode='r'),
+            read_options=pajson.ReadOptions(block_size=READ_BLOCK_SIZE),
+            parse_options=pajson.ParseOptions(explicit_schema=source_schema, unexpected_field_behavior='ignore')
+        )
+        batches = (pa.Table.from_batches([batch]) for batch in reader)
+    elif entry['format'] in ('json', 'ndjson'):
+        batches = (
+            pa.Table.from_pylist(records, schema=source_schema)
+            for records in _batched(iter_json_records(stream), batch_records)
+        )
+    else:
+        raise ValueError(f"Formato não suportado na conversão: {entry['format']}")
+    for table in batches:
+        yield table.cast(schema)
+
+
+def _row_groups(tables, row_group_size):
+    """Junta os lotes decodificados em RecordBatches de row_group_size linhas (um row group cada)"""
+    pending, rows = [], 0
+    for table in tables:
+        pending.append(table)
+        rows += table.num_rows
+        if rows >= row_group_size:
+            combined = pa.concat_tables(pending).combine_chunks()
+            full = rows - rows % row_group_size
+            yield from combined.slice(0, full).to_batches(max_chunksize=row_group_size)
+            # O resto fica para o próximo row group
+            pending, rows = [combined.slice(full)], rows - full
+    if rows:
+        yield from pa.concat_tables(pending).combine_chunks().to_batches(max_chunksize=row_group_size)
+
+
+def converted_file_path(entry, source_prefix, target_prefix):
+    """Caminho da cópia em Parquet, com as mesmas partições e nome do arquivo de origem"""
+    relative_path = split_compression(entry['key'])[0][len(source_prefix):]
+    return target_prefix + os.path.splitext(relative_path)[0] + '.parquet'
+
+
+def convert_file(bucket_name, entry, source_prefix, target_prefix, schema, columns=None, flatten=False,
+                 rules=None, batch_records=DEFAULT_BATCH_RECORDS, compression=DEFAULT_PARQUET_COMPRESSION,
+                 compression_level=None, row_group_size=DEFAULT_ROW_GROUP_SIZE, write_page_index=False):
+    """
+    Converte um arquivo JSON do catálogo em Parquet e devolve a entrada do catálogo da cópia.
+
+    Executado nos processos workers. Os lotes são decodificados,
+    convertidos e enviados em streaming (multipart upload), então a
+    memória fica limitada a um row group. Com flatten os structs viram
+    colunas simples (opcionalmente só as de columns); com rules as colunas
+    derivadas das regras (derivations.py) são acrescentadas a cada lote,
+    com os tipos da gold.
+    """
+    s3_client = get_s3_client()
+    file_path = converted_file_path(entry, source_prefix, target_prefix)
+    tables = iter_source_batches(s3_client, bucket_name, entry, schema, batch_records)
+    target_schema = schema
+    if rules:
+        tables = (derive_table(table, rules, schema=GOLD_SCHEMA) for table in tables)
+        target_schema = derive_table(target_schema.empty_table(), rules, schema=GOLD_SCHEMA).schema
+        if columns:
+            columns = list(columns) + [column for column in rules if column not in columns]
+    if flatten:
+        tables = (flatten_columns(table, columns) for table in tables)
+        target_schema = flatten_columns(target_schema.empty_table(), columns).schema
+    stats = FileStats()
+    with metrics.timed('convert'):
+        with MultipartUploadWriter(s3_client, bucket_name, file_path,
+                                   content_type='application/vnd.apache.parquet') as writer:
+            write_parquet_batches(stats.track(_row_groups(tables, row_group_size)), writer,
+                                  compression=compression, compression_level=compression_level,
+                                  row_group_size=row_group_size, write_page_index=write_page_index,
+                                  schema=target_schema)
+    metrics.increment('rows_converted', stats.rows)
+    metrics.increment('bytes_converted', entry['bytes'])
+    return stats.entry(file_path, writer.bytes_written)
+
+
+def convert_dataset(s3_client, source_name, target_name, columns=None, flatten=False, derive=False, rebuild=False,
+                    workers=4, **options):
+    """
+    Mantém a cópia em Parquet de um dataset JSON igual ao catálogo da origem.
+
+    Só os arquivos da origem ainda não convertidos são lidos (em paralelo,
+    em workers processos); cópias de arquivos que saíram do catálogo da
+    origem (reescritos pelo merge ou pela compactação) são removidas. O
+    catálogo da cópia troca os arquivos em uma única gravação e o
+    _conversion.json guarda a cópia de cada arquivo de origem. Com flatten
+    a projeção achatada vai para o prefixo ..._flat/; com derive ela também
+    recebe as colunas derivadas de DATASET_DERIVATIONS (só a projeção, para
+    a cópia continuar com o schema registrado). Retorna um resumo.
+    """
+    if derive and not flatten:
+        raise ValueError("As colunas derivadas só são gravadas na projeção achatada (flatten)")
+    rules = DATASET_DERIVATIONS.get(source_name) if derive else None
+    source_bucket, source_prefix = DATASETS[source_name]
+    target_bucket, target_prefix = DATASETS[target_name]
+    if source_bucket != target_bucket:
+        raise ValueError(f"A cópia de {source_name} precisa ficar no mesmo bucket da origem")
+    if flatten:
+        target_prefix = flat_prefix(target_prefix)
+    schema = dataset_schema(source_name)
+
+    manifest_path = target_prefix + CONVERSION_MANIFEST
+    manifest = read_json_object(s3_client, target_bucket, manifest_path, default={'files': {}})
+    consolidate_catalog(s3_client, source_bucket, source_prefix)
+    catalog = load_catalog(s3_client, source_bucket, source_prefix)
+    pending = [
+        entry for key, entry in sorted(catalog['files'].items())
+        if rebuild or key not in manifest['files']
+    ]
+    removed = [key for key in manifest['files'] if key not in catalog['files']]
+
+    summary = {'source': f"{source_bucket}/{source_prefix}", 'target': f"{target_bucket}/{target_prefix}",
+               'files': len(pending), 'rows': 0, 'bytes_in': 0, 'bytes_out': 0, 'removed': len(removed),
+               'failed': 0}
+    outputs = {}
+    convert_fn = partial(convert_file, columns=columns, flatten=flatten, rules=rules, **options)
+    with worker_pool(workers) as executor:
+        futures = [
+            executor.submit(metrics.run_in_worker, metrics.current_stage(), convert_fn, source_bucket, entry,
+                            source_prefix, target_prefix, schema)
+            for entry in pending
+        ]
+        for entry, future in zip(pending, futures):
+            try:
+                output, worker_metrics = future.result()
+            except Exception as e:
+                logger.error(f"Erro ao converter {source_bucket}/{entry['key']}: {e}")
+                summary['failed'] += 1
+                continue
+            metrics.merge(worker_metrics)
+            outputs[entry['key']] = output
+            summary['rows'] += output['rows']
+            summary['bytes_in'] += entry['bytes']
+            summary['bytes_out'] += output['bytes']
+
+    # Cópias substituídas por um novo nome (ou de arquivos removidos) saem do catálogo junto
+    new_keys = {output['key'] for output in outputs.values()}
+    stale = [manifest['files'][key]['target'] for key in removed]
+    stale += [manifest['files'][key]['target'] for key in outputs
+              if key in manifest['files'] and manifest['files'][key]['target'] not in new_keys]
+    replace_files(s3_client, target_bucket, target_prefix, stale, list(outputs.values()))
+    delete_objects(s3_client, target_bucket, [key for key in stale if key not in new_keys])
+
+    converted_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    for key in removed:
+        manifest['files'].pop(key)
+    for key, output in outputs.items():
+        manifest['files'][key] = {'target': output['key'], 'rows': output['rows'], 'converted_at': converted_at}
+    write_json_object(s3_client, target_bucket, manifest_path, manifest)
+    return summary
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Regras de negócio das colunas derivadas, declaradas uma única vez
+Cada regra é avaliada sobre colunas inteiras (NumPy), tanto nos dados gerados quanto em lotes reais
+"""
+
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+
+# Regras da gold zone, avaliadas em ordem (uma regra pode usar colunas derivadas antes dela)
+# bucket: rótulo pela faixa de valores; bins são os limites entre as faixas e, com right,
+#         cada limite pertence à faixa de baixo (score 700 ainda é risco MEDIO)
+GOLD_RULES = {
+    'faixa_etaria': {'rule': 'bucket', 'source': 'idade', 'bins': [30, 50],
+                     'labels': ['JOVEM', 'ADULTO', 'SENIOR']},
+    'faixa_salarial': {'rule': 'bucket', 'source': 'salario_bruto', 'bins': [5000, 10000],
+                       'labels': ['BAIXA', 'MEDIA', 'ALTA']},
+    'categoria_risco': {'rule': 'bucket', 'source': 'score_credito', 'bins': [600, 700], 'right': True,
+                        'labels': ['ALTO', 'MEDIO', 'BAIXO']},
+    'dias_desde_cadastro': {'rule': 'days_since', 'source': 'data_cadastro'},
+}
+
+# As mesmas regras aplicadas aos registros reais da silver (campos dentro dos objetos aninhados)
+SILVER_RULES = {
+    'faixa_salarial': dict(GOLD_RULES['faixa_salarial'], source='dados_profissionais.salario_bruto'),
+    'dias_desde_cadastro': dict(GOLD_RULES['dias_desde_cadastro'], source='metadados.data_cadastro'),
+}
+
+# Regras aplicadas aos registros reais de cada dataset (09_convert_parquet.py --derive)
+DATASET_DERIVATIONS = {
+    'silver': SILVER_RULES,
+}
+
+
+def _bucket(columns, spec, reference_date):
+    values = np.asarray(columns[spec['source']], dtype=np.float64)
+    index = np.digitize(values, spec['bins'], right=spec.get('right', False))
+    labels = np.asarray(spec['labels'] + [None], dtype=object)
+    # Valores nulos (NaN) não caem em nenhuma faixa
+    index[np.isnan(values)] = len(spec['labels'])
+    return labels[index]
+
+
+def _days_since(columns, spec, reference_date):
+    # Aceita datas (date32/datetime64) ou texto YYYY-MM-DD, como nos JSON do SAP
+    dates = np.asarray(columns[spec['source']]).astype('datetime64[D]')
+    days = (reference_date - dates).astype(np.int64)
+    missing = np.isnat(dates)
+    if missing.any():
+        days = days.astype(object)
+        days[missing] = None
+    return days
+
+
+RULES = {
+    'bucket': _bucket,
+    'days_since': _days_since,
+}
+
+
+def rule_sources(rules):
+    """Colunas de entrada necessárias para avaliar as regras (sem as derivadas por elas)"""
+    sources = []
+    for column, spec in rules.items():
+        for source in spec.get('sources', [spec.get('source')]):
+            if source not in rules and source not in sources:
+                sources.append(source)
+    return sources
+
+
+def derive_columns(columns, rules=GOLD_RULES, reference_date=None):
+    """
+    Acrescenta (ou substitui) as colunas derivadas em um dict de colunas.
+
+    columns mapeia nome -> array; colunas aninhadas podem ser passadas com
+    nomes pontuados (dados_profissionais.salario_bruto). reference_date é a
+    data usada em days_since (padrão: hoje). Retorna um novo dict.
+    """
+    reference_date = np.datetime64(reference_date or date.today(), 'D')
+    columns = dict(columns)
+    for column, spec in rules.items():
+        if spec['rule'] not in RULES:
+            raise ValueError(f"Regra desconhecida para {column}: {spec['rule']}")
+        columns[column] = RULES[spec['rule']](columns, spec, reference_date)
+    return columns
+
+
+def _to_numpy(column):
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    return column.to_numpy(zero_copy_only=False)
+
+
+def derive_table(data, rules=GOLD_RULES, reference_date=None, schema=None):
+    """
+    Avalia as regras sobre uma tabela ou RecordBatch Arrow (ex.: lotes reais da silver).
+
+    Só as colunas de origem são convertidas para NumPy; structs são
+    expandidos para que as regras usem nomes pontuados. As colunas derivadas
+    substituem as existentes ou são acrescentadas ao final, com os tipos de
+    schema quando informado. Retorna o mesmo tipo recebido.
+    """
+    table = pa.Table.from_batches([data]) if isinstance(data, pa.RecordBatch) else data
+    flat = table
+    while any(pa.types.is_struct(field.type) for field in flat.schema):
+        flat = flat.flatten()
+    columns = {source: _to_numpy(flat.column(source)) for source in rule_sources(rules)}
+    derived = derive_columns(columns, rules, reference_date)
+
+    for column in rules:
+        field_type = schema.field(column).type if schema is not None and column in schema.names else None
+        array = pa.array(derived[column], type=field_type)
+        if column in table.column_names:
+            table = table.set_column(table.schema.get_field_index(column), column, array)
+        else:
+            table = table.append_column(column, array)
+    if isinstance(data, pa.RecordBatch):
+        # to_batches() não devolve nenhum lote para uma tabela vazia
+        return pa.RecordBatch.from_arrays([column.combine_chunks() for column in table.columns], schema=table.schema)
+    return table
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Índice persistente das chaves (id do cliente) já gravadas em um dataset
+Conjunto ordenado de hashes de 64 bits em segmentos no próprio bucket, consultado lote a lote
+pelas promoções para descartar clientes já ingeridos sem reler o histórico da zona
+"""
+
+import io
+import logging
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from catalog import consolidate_catalog, load_catalog
+from storage import delete_objects, list_objects
+from validation import read_table
+
+logger = logging.getLogger(__name__)
+
+# Segmentos do índice dentro do prefixo do dataset (ignorados pelo Spark)
+KEY_INDEX_DIR = '_keys/'
+
+# Acima disso os segmentos são fundidos em um só na próxima gravação
+MAX_SEGMENTS = 8
+
+
+def key_hashes(keys):
+    """Hashes de 64 bits das chaves não nulas e a máscara das posições que têm chave"""
+    values = pd.Series(keys, dtype=object)
+    present = values.notna().to_numpy()
+    hashes = pd.util.hash_array(values[present].astype(str).to_numpy(dtype=object))
+    return hashes, present
+
+
+def read_hashes(s3_client, bucket_name, key):
+    """Lê um array de hashes gravado por write_hashes"""
+    body = s3_client.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+    return np.load(io.BytesIO(body), allow_pickle=False)
+
+
+def write_hashes(s3_client, bucket_name, key, hashes):
+    """Grava um array de hashes (formato .npy do NumPy)"""
+    buffer = io.BytesIO()
+    np.save(buffer, hashes, allow_pickle=False)
+    s3_client.put_object(Bucket=bucket_name, Key=key, Body=buffer.getvalue(), ContentType='application/octet-stream')
+
+
+class KeyIndex:
+    """
+    Conjunto das chaves de um dataset, guardado como hashes uint64 ordenados.
+
+    Cada gravação (commit) acrescenta um segmento ordenado em _keys/, e os
+    segmentos são fundidos quando passam de MAX_SEGMENTS. O índice ocupa
+    8 bytes por chave e é lido uma vez por execução; cada consulta custa
+    O(lote · log n) com np.searchsorted, sem ler os arquivos de dados.
+    Com hashes de 64 bits a chance de colisão é desprezível (cerca de
+    1 em 3 mil com 100 milhões de chaves); uma colisão descartaria um
+    cliente novo como se já existisse.
+
+    claim é seguro entre threads: chaves reivindicadas por um arquivo ficam
+    pendentes e já contam para os arquivos seguintes da mesma execução.
+    """
+
+    def __init__(self, s3_client, bucket_name, prefix):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self._segment_keys = sorted(
+            obj['Key'] for obj in list_objects(s3_client, bucket_name, prefix + KEY_INDEX_DIR)
+            if obj['Key'].endswith('.npy')
+        )
+        self._segments = [read_hashes(s3_client, bucket_name, key) for key in self._segment_keys]
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(segment) for segment in self._segments) + len(self._pending)
+
+    def _known(self, hashes):
+        known = np.zeros(len(hashes), dtype=bool)
+        for segment in self._segments:
+            positions = np.searchsorted(segment, hashes)
+            found = positions < len(segment)
+            found[found] = segment[positions[found]] == hashes[found]
+            known |= found
+        return known
+
+    def contains(self, keys):
+        """Máscara das chaves já presentes no índice (nulos nunca estão)"""
+        hashes, present = key_hashes(keys)
+        result = np.zeros(len(present), dtype=bool)
+        with self._lock:
+            known = self._known(hashes)
+            known |= np.fromiter((value in self._pending for value in hashes), dtype=bool, count=len(hashes))
+        result[present] = known
+        return result
+
+    def claim(self, keys):
+        """
+        Reivindica as chaves de um lote e devolve a máscara das linhas novas.
+
+        Uma linha é nova se a chave não está no índice, não foi reivindicada
+        antes nesta execução e é a primeira ocorrência no lote. Linhas sem
+        chave são mantidas e não entram no índice. As chaves novas ficam
+        pendentes até commit (ou são devolvidas com release se a gravação
+        do lote falhar).
+        """
+        hashes, present = key_hashes(keys)
+        is_new = np.zeros(len(hashes), dtype=bool)
+        is_new[np.unique(hashes, return_index=True)[1]] = True
+        with self._lock:
+            is_new &= ~self._known(hashes)
+            for position in np.flatnonzero(is_new):
+                value = hashes[position]
+                if value in self._pending:
+                    is_new[position] = False
+                else:
+                    self._pending.add(value)
+        result = np.ones(len(present), dtype=bool)
+        result[present] = is_new
+        return result
+
+    def release(self, keys):
+        """Devolve chaves reivindicadas por um lote cuja gravação falhou"""
+        hashes, _ = key_hashes(keys)
+        with self._lock:
+            self._pending.difference_update(hashes.tolist())
+
+    def add(self, keys):
+        """Acrescenta chaves ao índice sem consultar (ex.: reconstrução a partir dos arquivos)"""
+        hashes, _ = key_hashes(keys)
+        with self._lock:
+            self._pending.update(hashes.tolist())
+
+    def commit(self):
+        """Grava as chaves pendentes como um novo segmento (fundindo os segmentos se preciso)"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            added = np.array(sorted(self._pending), dtype=np.uint64)
+            key = f"{self.prefix}{KEY_INDEX_DIR}segment_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}.npy"
+            write_hashes(self.s3_client, self.bucket_name, key, added)
+            self._segments.append(added)
+            self._segment_keys.append(key)
+            self._pending = set()
+            if len(self._segments) > MAX_SEGMENTS:
+                self._merge_segments()
+        logger.info(f"Índice de chaves de {self.bucket_name}/{self.prefix}: {len(added)} chave(s) nova(s)")
+        return len(added)
+
+    def _merge_segments(self):
+        merged = np.unique(np.concatenate(self._segments))
+        key = f"{self.prefix}{KEY_INDEX_DIR}segment_{int(time.time() * 1000)}_{uuid.uuid4().hex[:8]}.npy"
+        write_hashes(self.s3_client, self.bucket_name, key, merged)
+        delete_objects(self.s3_client, self.bucket_name, self._segment_keys)
+        self._segments, self._segment_keys = [merged], [key]
+
+
+def rebuild_key_index(s3_client, bucket_name, prefix, column):
+    """
+    Recria o índice a partir da coluna de chave dos arquivos do catálogo.
+
+    Usado para começar a deduplicar um dataset que já tem dados (ou depois
+    de apagar _keys/). A coluna da chave é lida como texto, como na promoção.
+    """
+    delete_objects(s3_client, bucket_name, [
+        obj['Key'] for obj in list_objects(s3_client, bucket_name, prefix + KEY_INDEX_DIR)
+    ])
+    index = KeyIndex(s3_client, bucket_name, prefix)
+    consolidate_catalog(s3_client, bucket_name, prefix)
+    rules = [{'check': 'unique', 'column': column}]
+    for entry in load_catalog(s3_client, bucket_name, prefix)['files'].values():
+        index.add(read_table(s3_client, bucket_name, entry, rules).column(column).to_pylist())
+    index.commit()
+    return index
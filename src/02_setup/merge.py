@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Merge (upsert) de lotes de registros alterados em um dataset das zonas
+Localiza pela chave os arquivos que contêm os registros e reescreve só esses arquivos
+"""
+
+import contextvars
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import metrics
+from catalog import consolidate_catalog, flatten_table, load_catalog, replace_files, to_table
+from compression import compressed_file_path, split_compression
+from key_index import key_hashes, read_hashes, write_hashes
+from storage import delete_objects, list_objects, read_json_object, write_json_object
+from validation import read_table, write_table_file
+
+logger = logging.getLogger(__name__)
+
+# Hashes ordenados das chaves de cada arquivo do dataset (um .npy por arquivo)
+LOCATOR_DIR = '_key_locator/'
+
+# Registro de cada merge: arquivos substituídos e arquivos gerados
+MERGE_DIR = '_merge/'
+
+# Chave e versão dos registros da silver (o registro mais recente vence)
+SILVER_KEY = 'cliente_id'
+SILVER_VERSION = 'metadados.data_ultima_atualizacao'
+
+def locator_path(prefix, file_path):
+    """Caminho dos hashes das chaves de um arquivo do dataset"""
+    return f"{prefix}{LOCATOR_DIR}{hashlib.sha1(file_path.encode('utf-8')).hexdigest()}.npy"
+
+
+def _sorted_hashes(column):
+    hashes, _ = key_hashes(column.to_pandas())
+    return np.unique(hashes)
+
+
+def load_locator(s3_client, bucket_name, prefix, entries, key=SILVER_KEY):
+    """
+    Hashes ordenados das chaves de cada arquivo do catálogo (chave do arquivo -> array).
+
+    Arquivos ainda sem localizador (gravados antes do primeiro merge ou por
+    outro job, como a compactação) são lidos uma vez e passam a ter o seu;
+    localizadores de arquivos que saíram do catálogo são removidos.
+    """
+    existing = {obj['Key'] for obj in list_objects(s3_client, bucket_name, prefix + LOCATOR_DIR)}
+    locator = {}
+    for entry in entries:
+        path = locator_path(prefix, entry['key'])
+        if path in existing:
+            locator[entry['key']] = read_hashes(s3_client, bucket_name, path)
+        else:
+            rules = [{'check': 'unique', 'column': key}]
+            table = read_table(s3_client, bucket_name, entry, rules)
+            locator[entry['key']] = _sorted_hashes(table.column(key))
+            write_hashes(s3_client, bucket_name, path, locator[entry['key']])
+    orphans = existing - {locator_path(prefix, file_key) for file_key in locator}
+    delete_objects(s3_client, bucket_name, sorted(orphans))
+    return locator
+
+
+def _contains(sorted_hashes, hashes):
+    positions = np.searchsorted(sorted_hashes, hashes)
+    found = positions < len(sorted_hashes)
+    found[found] = sorted_hashes[positions[found]] == hashes[found]
+    return found
+
+
+def _versions(table, version):
+    """Versão de cada linha como datetime64 (NaT quando ausente)"""
+    column = flatten_table(table.select([version.split('.')[0]])).column(version)
+    if not pa.types.is_timestamp(column.type):
+        column = pc.cast(column, pa.timestamp('s'))
+    return column.to_numpy().astype('datetime64[s]')
+
+
+def latest_versions(changes, key=SILVER_KEY, version=SILVER_VERSION):
+    """Mantém só a versão mais recente de cada chave do lote (e descarta linhas sem chave)"""
+    changes = changes.filter(pc.is_valid(changes.column(key)))
+    hashes, _ = key_hashes(changes.column(key).to_pandas())
+    versions = _versions(changes, version)
+    # Ordena por chave e versão (NaT, o menor int64, primeiro) e fica com a última linha de cada chave
+    order = np.lexsort((versions.astype(np.int64), hashes))
+    last = np.append(hashes[order][1:] != hashes[order][:-1], True)
+    return changes.take(np.sort(order[last]))
+
+
+def merged_file_path(file_path, timestamp):
+    """Caminho do arquivo reescrito pelo merge, no mesmo diretório e formato do original"""
+    root, compression = split_compression(file_path)
+    root, ext = os.path.splitext(root)
+    # Reescritas sucessivas não acumulam sufixos
+    root = root.split('_merge-')[0]
+    return compressed_file_path(f"{root}_merge-{timestamp}{ext}", compression)
+
+
+def merge_file(s3_client, bucket_name, entry, changes, change_hashes, file_path, key=SILVER_KEY,
+               version=SILVER_VERSION, schema=None):
+    """
+    Reescreve um arquivo aplicando as alterações das suas chaves.
+
+    changes já tem uma linha por chave e change_hashes são os hashes das
+    chaves, ordenados (changes na mesma ordem). Uma linha do arquivo é
+    substituída quando a alteração tem versão mais recente; versões iguais
+    ou mais antigas são ignoradas, então reaplicar um lote não muda nada.
+    A ordem das linhas do arquivo é preservada; com schema o arquivo novo
+    usa os tipos e a ordem dos campos dele. Devolve (entrada do catálogo
+    ou None se nada mudou, linhas atualizadas, alterações ignoradas).
+    """
+    table = read_table(s3_client, bucket_name, entry, [{'check': 'unique', 'column': key}])
+    row_hashes, present = key_hashes(table.column(key).to_pandas())
+    rows = np.flatnonzero(present)
+    matched = _contains(change_hashes, row_hashes)
+    rows, row_hashes = rows[matched], row_hashes[matched]
+    change_rows = np.searchsorted(change_hashes, row_hashes)
+
+    row_versions = _versions(table, version)[rows]
+    change_versions = _versions(changes, version)[change_rows]
+    newer = ~np.isnat(change_versions) & (np.isnat(row_versions) | (change_versions > row_versions))
+    updated, stale = int(newer.sum()), int((~newer).sum())
+    if not updated:
+        return None, 0, stale
+
+    combined = pa.concat_tables([table, changes.take(change_rows[newer])], promote_options='permissive')
+    indices = np.arange(table.num_rows)
+    indices[rows[newer]] = table.num_rows + np.arange(updated)
+    merged = combined.take(indices)
+    if schema is not None:
+        merged = merged.cast(schema)
+    return write_table_file(s3_client, bucket_name, file_path, merged), updated, stale
+
+
+def _apply_merge(s3_client, bucket_name, prefix, log_path, log):
+    """Troca os arquivos no catálogo, remove os substituídos e marca o merge como concluído"""
+    replace_files(s3_client, bucket_name, prefix, log['replaced'], log['outputs'])
+    delete_objects(s3_client, bucket_name, log['replaced'] + [locator_path(prefix, key) for key in log['replaced']])
+    log['status'] = 'done'
+    log['finished_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    write_json_object(s3_client, bucket_name, log_path, log)
+
+
+def recover_pending(s3_client, bucket_name, prefix):
+    """Conclui merges interrompidos depois de os arquivos novos terem sido gravados"""
+    for obj in list_objects(s3_client, bucket_name, prefix + MERGE_DIR):
+        log = read_json_object(s3_client, bucket_name, obj['Key'])
+        if log and log.get('status') == 'pending':
+            logger.info(f"Concluindo merge interrompido {bucket_name}/{obj['Key']}")
+            _apply_merge(s3_client, bucket_name, prefix, obj['Key'], log)
+
+
+def merge_dataset(s3_client, bucket_name, prefix, changes, insert_path, key=SILVER_KEY, version=SILVER_VERSION,
+                  schema=None, workers=2):
+    """
+    Aplica um lote de registros alterados a um dataset, por chave (upsert).
+
+    Só os arquivos que contêm alguma chave do lote são lidos e reescritos
+    (localizados pelos hashes em _key_locator/, sem abrir os demais); as
+    chaves que não existem no dataset são gravadas em insert_path. Como na
+    compactação, os arquivos novos são gravados primeiro, o merge é
+    registrado em _merge/ e o catálogo troca os arquivos em uma única
+    gravação antes de os antigos serem removidos. schema fixa os tipos e a
+    ordem dos campos dos arquivos gravados (a leitura do JSON não preserva
+    a ordem dos campos aninhados). Retorna um resumo.
+    """
+    recover_pending(s3_client, bucket_name, prefix)
+    consolidate_catalog(s3_client, bucket_name, prefix)
+    catalog = load_catalog(s3_client, bucket_name, prefix)
+    with metrics.timed('locate'):
+        locator = load_locator(s3_client, bucket_name, prefix, catalog['files'].values(), key)
+
+    changes = latest_versions(to_table(changes), key, version)
+    hashes, _ = key_hashes(changes.column(key).to_pandas())
+    order = np.argsort(hashes)
+    changes, hashes = changes.take(order), hashes[order]
+
+    located = np.zeros(len(hashes), dtype=bool)
+    affected = []
+    for file_key, file_hashes in locator.items():
+        found = _contains(file_hashes, hashes)
+        if found.any():
+            located |= found
+            affected.append(catalog['files'][file_key])
+
+    summary = {
+        'bucket': bucket_name,
+        'prefix': prefix,
+        'changes': len(hashes),
+        'files': len(catalog['files']),
+        'files_rewritten': 0,
+        'updated': 0,
+        'stale': 0,
+        'inserted': int((~located).sum()),
+    }
+    timestamp = int(time.time() * 1000)
+    if insert_path in catalog['files']:
+        # Não sobrescreve um arquivo do dataset (ex.: mesmo --run-id de uma execução anterior)
+        insert_path = merged_file_path(insert_path, timestamp)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, merge_file, s3_client, bucket_name, entry,
+                            changes, hashes, merged_file_path(entry['key'], timestamp), key, version, schema)
+            for entry in affected
+        ]
+
+    replaced, outputs = [], []
+    for entry, future in zip(affected, futures):
+        output, updated, stale = future.result()
+        summary['updated'] += updated
+        summary['stale'] += stale
+        if output is not None:
+            replaced.append(entry['key'])
+            outputs.append(output)
+            write_hashes(s3_client, bucket_name, locator_path(prefix, output['key']), locator[entry['key']])
+
+    if summary['inserted']:
+        inserts = changes.filter(pa.array(~located))
+        if schema is not None:
+            inserts = inserts.cast(schema)
+        outputs.append(write_table_file(s3_client, bucket_name, insert_path, inserts))
+        write_hashes(s3_client, bucket_name, locator_path(prefix, insert_path), hashes[~located])
+
+    summary['files_rewritten'] = len(replaced)
+    if outputs:
+        log_path = f"{prefix}{MERGE_DIR}merge_{timestamp}.json"
+        log = {
+            'status': 'pending',
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'replaced': replaced,
+            'outputs': outputs,
+        }
+        write_json_object(s3_client, bucket_name, log_path, log)
+        _apply_merge(s3_client, bucket_name, prefix, log_path, log)
+    metrics.increment('rows_merged', summary['updated'] + summary['inserted'])
+    return summary
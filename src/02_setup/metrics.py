@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Métricas das etapas do pipeline
+Tempos, contadores (registros, bytes, tentativas) e pico de memória por etapa, com perfil
+opcional (cProfile/tracemalloc) e exportação em JSON lines e no formato textfile do Prometheus
+"""
+
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # indisponível no Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Diretório de exportação e perfis ativados (podem ser sobrescritos pela linha de comando)
+DEFAULT_METRICS_DIR = os.environ.get('DATAGEN_METRICS_DIR')
+DEFAULT_PROFILE = [name for name in os.environ.get('DATAGEN_PROFILE', '').split(',') if name]
+
+PROFILERS = ('cprofile', 'tracemalloc')
+
+# Arquivos gerados no diretório de métricas
+JSONL_FILE = 'metrics.jsonl'
+PROMETHEUS_FILE = 'datagen.prom'
+PROFILES_DIR = 'profiles'
+# Últimas métricas de cada etapa, para o datagen.prom não perder as etapas que não rodaram agora
+LAST_STAGES_FILE = 'last_stages.json'
+
+# Etapa à qual as métricas registradas pela thread atual pertencem
+_stage = contextvars.ContextVar('metrics_stage', default='default')
+
+_lock = threading.Lock()
+_counters = {}
+_timers = {}
+_gauges = {}
+
+# Etapas em execução com tracemalloc ativo (o rastreamento é do processo, então é desligado pela última)
+_tracing_stages = 0
+_started_tracing = False
+
+
+def _reset_after_fork():
+    """Um processo filho começa sem as métricas do pai (e com um lock livre)"""
+    global _lock
+    _lock = threading.Lock()
+    _counters.clear()
+    _timers.clear()
+    _gauges.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def current_stage():
+    """Nome da etapa em execução na thread atual"""
+    return _stage.get()
+
+
+def increment(name, value=1):
+    """Soma value ao contador name da etapa atual (ex.: rows_generated, bytes_uploaded)"""
+    key = (_stage.get(), name)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_max(name, value):
+    """Guarda o maior valor observado para name na etapa atual (ex.: pico de memória)"""
+    key = (_stage.get(), name)
+    with _lock:
+        _gauges[key] = max(_gauges.get(key, value), value)
+
+
+def observe(phase, seconds):
+    """Registra uma execução de phase com a duração em segundos"""
+    key = (_stage.get(), phase)
+    with _lock:
+        timer = _timers.setdefault(key, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+        timer['count'] += 1
+        timer['seconds'] += seconds
+        timer['max_seconds'] = max(timer['max_seconds'], seconds)
+
+
+@contextmanager
+def timed(phase):
+    """Mede o tempo de parede do bloco como uma execução de phase (generate, serialize, upload...)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(phase, time.perf_counter() - start)
+
+
+def timed_iter(phase, iterable):
+    """
+    Repassa os itens de iterable medindo só o tempo gasto para produzi-los.
+
+    Usado nos geradores de blocos serializados: o tempo do consumidor (ex.:
+    a escrita no upload) fica de fora, e o total entra como uma execução de phase.
+    """
+    seconds = 0.0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                seconds += time.perf_counter() - start
+            yield item
+    finally:
+        observe(phase, seconds)
+
+
+def peak_rss_bytes():
+    """Pico de memória residente do processo até agora (None se indisponível)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB e macOS em bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _collect():
+    stages = {}
+    for (stage, name), value in _counters.items():
+        stages.setdefault(stage, _empty_stage())['counters'][name] = value
+    for (stage, phase), timer in _timers.items():
+        stages.setdefault(stage, _empty_stage())['timers'][phase] = dict(timer)
+    for (stage, name), value in _gauges.items():
+        stages.setdefault(stage, _empty_stage())['gauges'][name] = value
+    return stages
+
+
+def _empty_stage():
+    return {'counters': {}, 'timers': {}, 'gauges': {}}
+
+
+def snapshot():
+    """Cópia das métricas registradas, agrupadas por etapa"""
+    with _lock:
+        return _collect()
+
+
+def drain():
+    """Devolve as métricas registradas e as descarta (usado pelos processos workers)"""
+    with _lock:
+        stages = _collect()
+        _counters.clear()
+        _timers.clear()
+        _gauges.clear()
+    return stages
+
+
+def merge(stages):
+    """Soma ao registro do processo as métricas de um snapshot (ex.: vindas de um worker)"""
+    with _lock:
+        for stage, metrics in stages.items():
+            for name, value in metrics['counters'].items():
+                _counters[(stage, name)] = _counters.get((stage, name), 0) + value
+            for phase, timer in metrics['timers'].items():
+                current = _timers.setdefault((stage, phase), {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+                current['count'] += timer['count']
+                current['seconds'] += timer['seconds']
+                current['max_seconds'] = max(current['max_seconds'], timer['max_seconds'])
+            for name, value in metrics['gauges'].items():
+                _gauges[(stage, name)] = max(_gauges.get((stage, name), value), value)
+
+
+def run_in_worker(stage, fn, *args):
+    """
+    Executa fn(*args) em um processo worker e devolve (resultado, métricas).
+
+    O worker começa com o registro vazio e o esvazia ao devolver as
+    métricas, então o processo pai pode somá-las com merge sem contar nada
+    duas vezes, mesmo com workers reaproveitados entre shards.
+    """
+    token = _stage.set(stage)
+    try:
+        result = fn(*args)
+        set_max('worker_peak_rss_bytes', peak_rss_bytes() or 0)
+    finally:
+        _stage.reset(token)
+    return result, drain()
+
+
+def _start_tracing():
+    global _tracing_stages, _started_tracing
+    with _lock:
+        if _tracing_stages == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_stages += 1
+
+
+def _stop_tracing():
+    """Desliga o tracemalloc quando nenhuma etapa em execução o usa (se foi ligado por elas)"""
+    global _tracing_stages, _started_tracing
+    with _lock:
+        _tracing_stages -= 1
+        if _tracing_stages == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+@contextmanager
+def stage(name, profile=(), profile_dir=None):
+    """
+    Executa o bloco como a etapa name: as métricas registradas nele (e nas
+    threads iniciadas com contextvars.copy_context) ficam nessa etapa.
+
+    Registra o tempo de parede da etapa e o pico de memória do processo ao
+    final. Com profile=['cprofile'] grava o perfil da thread da etapa em
+    profile_dir/{name}.prof; com profile=['tracemalloc'] registra o pico de
+    memória alocada pelo Python durante a etapa. O tracemalloc e o RSS medem
+    o processo inteiro: com etapas em paralelo, o pico de cada uma inclui as
+    alocações das outras desde que o rastreamento começou (use uma etapa
+    por vez para isolar os valores).
+    """
+    token = _stage.set(name)
+    profiler = cProfile.Profile() if 'cprofile' in profile else None
+    trace = 'tracemalloc' in profile
+    if trace:
+        _start_tracing()
+    if profiler is not None:
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('stage', time.perf_counter() - start)
+        if profiler is not None:
+            profiler.disable()
+            if profile_dir:
+                os.makedirs(profile_dir, exist_ok=True)
+                profile_path = os.path.join(profile_dir, f"{name}.prof")
+                profiler.dump_stats(profile_path)
+                logger.info(f"Perfil da etapa {name} salvo em {profile_path}")
+        if trace:
+            set_max('tracemalloc_peak_bytes', tracemalloc.get_traced_memory()[1])
+            _stop_tracing()
+        if peak_rss_bytes() is not None:
+            set_max('peak_rss_bytes', peak_rss_bytes())
+        _stage.reset(token)
+
+
+def throughput(metrics):
+    """Registros e bytes por segundo de uma etapa, pelo tempo de parede da etapa"""
+    seconds = metrics['timers'].get('stage', {}).get('seconds')
+    if not seconds:
+        return {}
+    counters = metrics['counters']
+    return {
+        'rows_per_second': counters.get('rows_written', counters.get('rows_generated', 0)) / seconds,
+        'bytes_per_second': counters.get('bytes_uploaded', 0) / seconds,
+    }
+
+
+def export_jsonl(path, stages, run_info=None):
+    """Acrescenta uma linha JSON por etapa ao arquivo path"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    timestamp = time.strftime('%Y-%m-%dT%H:%M:%S')
+    with open(path, 'a', encoding='utf-8') as f:
+        for name, metrics in stages.items():
+            line = dict(run_info or {}, timestamp=timestamp, stage=name, throughput=throughput(metrics), **metrics)
+            f.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+
+def _prometheus_name(name):
+    return 'datagen_' + ''.join(char if char.isalnum() else '_' for char in name)
+
+
+def export_prometheus(path, stages, status=None):
+    """
+    Grava as métricas no formato textfile do Prometheus (node_exporter).
+
+    O arquivo é substituído por inteiro a cada execução (escrito em um
+    temporário e renomeado), então o coletor nunca lê um arquivo pela metade.
+    status (etapa -> 'ok'/'failed'/'skipped') vira datagen_stage_success.
+    """
+    samples = {}
+
+    def add(metric, labels, value, help_text):
+        label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+        samples.setdefault(metric, (help_text, []))[1].append(f"{metric}{{{label_text}}} {value}")
+
+    for name, metrics in sorted(stages.items()):
+        for phase, timer in sorted(metrics['timers'].items()):
+            labels = {'stage': name, 'phase': phase}
+            add('datagen_phase_seconds', labels, timer['seconds'], 'Tempo somado das execuções da fase')
+            add('datagen_phase_calls', labels, timer['count'], 'Execuções da fase')
+            add('datagen_phase_max_seconds', labels, timer['max_seconds'], 'Execução mais lenta da fase')
+        for counter, value in sorted(metrics['counters'].items()):
+            add(_prometheus_name(counter), {'stage': name}, value, f'Contador {counter} da última execução')
+        for gauge, value in sorted(metrics['gauges'].items()):
+            add(_prometheus_name(gauge), {'stage': name}, value, f'Máximo de {gauge} na última execução')
+        for metric, value in sorted(throughput(metrics).items()):
+            add(_prometheus_name(metric), {'stage': name}, value, f'Vazão ({metric}) da última execução')
+    for name, stage_status in sorted((status or {}).items()):
+        add('datagen_stage_success', {'stage': name}, int(stage_status == 'ok'), 'Etapa concluída com sucesso')
+    add('datagen_last_run_timestamp_seconds', {}, int(time.time()), 'Fim da última execução')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for metric, (help_text, lines) in samples.items():
+            f.write(f"# HELP {metric} {help_text}\n# TYPE {metric} gauge\n")
+            f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+
+def _update_last_stages(path, stages, status):
+    """Acrescenta as etapas desta execução às últimas métricas de cada etapa guardadas em path"""
+    last = {'stages': {}, 'status': {}}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            last = json.load(f)
+    last['stages'].update(stages)
+    last['status'].update(status or {})
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(last, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return last
+
+
+def export(metrics_dir, run_info=None, status=None):
+    """
+    Exporta as métricas do processo para metrics.jsonl e datagen.prom em metrics_dir.
+
+    O metrics.jsonl recebe só as etapas desta execução; o datagen.prom tem a
+    última execução de cada etapa, seja do pipeline ou de um script rodado
+    sozinho.
+    """
+    stages = snapshot()
+    os.makedirs(metrics_dir, exist_ok=True)
+    export_jsonl(os.path.join(metrics_dir, JSONL_FILE), stages, run_info)
+    last = _update_last_stages(os.path.join(metrics_dir, LAST_STAGES_FILE), stages, status)
+    export_prometheus(os.path.join(metrics_dir, PROMETHEUS_FILE), last['stages'], last['status'])
+    logger.info(f"Métricas exportadas em {metrics_dir}")
+    return stages
+
+
+def add_metrics_arguments(parser):
+    """Adiciona as opções --metrics-dir e --profile ao parser de um script"""
+    parser.add_argument('--metrics-dir', default=DEFAULT_METRICS_DIR,
+                        help='Diretório onde exportar as métricas da execução (metrics.jsonl e datagen.prom) '
+                             '(padrão: $DATAGEN_METRICS_DIR, sem exportação se vazio)')
+    parser.add_argument('--profile', nargs='+', choices=PROFILERS, default=DEFAULT_PROFILE,
+                        help='Perfis coletados por etapa, gravados em {metrics-dir}/profiles/{execução}/ '
+                             '(padrão: $DATAGEN_PROFILE; requer --metrics-dir)')
+
+
+def script_stage(name):
+    """
+    Decorador do run() dos scripts numerados: rodado sozinho, o script
+    executa como a etapa name, com os perfis de args.profile, e exporta
+    as métricas em args.metrics_dir.
+
+    Dentro do pipeline (já em uma etapa) o run() roda como está, e a etapa e
+    a exportação ficam com o pipeline.
+    """
+    def decorator(run):
+        @functools.wraps(run)
+        def wrapper(args):
+            metrics_dir = getattr(args, 'metrics_dir', None)
+            if current_stage() != 'default' or not metrics_dir:
+                return run(args)
+            run_id = time.strftime('%Y%m%dT%H%M%S')
+            profile = getattr(args, 'profile', None) or ()
+            profile_dir = os.path.join(metrics_dir, PROFILES_DIR, run_id) if profile else None
+            success = False
+            try:
+                with stage(name, profile=profile, profile_dir=profile_dir):
+                    success = run(args)
+            finally:
+                export(metrics_dir, run_info={'run_id': run_id, 'script': name},
+                       status={name: 'ok' if success is not False else 'failed'})
+            return success
+        return wrapper
+    return decorator
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Layout particionado no estilo Hive (chave=valor/) para os datasets das zonas
+Cada execução grava um arquivo por partição, permitindo partition pruning no Spark
+"""
+
+import os
+from datetime import date
+from functools import partial
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from storage import DEFAULT_BULK_WORKERS, MultipartUploadWriter, bulk_upload, content_type_for, get_s3_client
+
+# Valor usado pelo Hive/Spark para partições nulas
+HIVE_DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+# Caracteres escapados nos valores de partição (mesmo conjunto do Hive)
+_ESCAPED_CHARS = set('"#%\'*/:=?\\\x7f{[]^')
+
+
+def add_partition_arguments(parser, choices):
+    """Adiciona a opção --partition-by com as colunas de partição aceitas pelo dataset"""
+    parser.add_argument('--partition-by', choices=choices, default=None,
+                        help='Grava um arquivo por valor da coluna em diretórios chave=valor/')
+
+
+def partition_name(partition_by):
+    """Nome da chave de partição (último nível de colunas aninhadas como endereco.estado)"""
+    return partition_by.split('.')[-1]
+
+
+def escape_partition_value(value):
+    """Formata e escapa um valor de partição como o Hive/Spark fazem"""
+    if value is None or value == '' or (isinstance(value, float) and np.isnan(value)):
+        return HIVE_DEFAULT_PARTITION
+    if isinstance(value, date):
+        value = value.isoformat()
+    return ''.join(
+        f'%{ord(char):02X}' if char in _ESCAPED_CHARS or ord(char) < 0x20 else char
+        for char in str(value)
+    )
+
+
+def partition_file_path(file_path, partition_by, value):
+    """Insere o diretório chave=valor/ antes do nome do arquivo"""
+    directory, file_name = os.path.split(file_path)
+    partition_dir = f"{partition_name(partition_by)}={escape_partition_value(value)}"
+    return '/'.join(part for part in (directory, partition_dir, file_name) if part)
+
+
+def parse_partition_values(file_path):
+    """Extrai os pares chave=valor dos diretórios de um caminho particionado"""
+    values = {}
+    for part in file_path.split('/')[:-1]:
+        if '=' in part:
+            key, value = part.split('=', 1)
+            values[key] = None if value == HIVE_DEFAULT_PARTITION else unquote(value)
+    return values
+
+
+def split_partitions(data, partition_by):
+    """
+    Divide os dados pelos valores da coluna de partição.
+
+    Aceita tabelas Arrow, DataFrames e listas de registros (dicts, com
+    colunas aninhadas indicadas por ponto). Colunas de primeiro nível são
+    removidas dos dados, já que o valor fica no caminho da partição.
+    Retorna pares (valor, dados da partição) ordenados pelo valor.
+    """
+    if isinstance(data, pa.Table):
+        return _split_table(data, partition_by)
+    if isinstance(data, pd.DataFrame):
+        return [
+            (value, group.drop(columns=[partition_by]))
+            for value, group in data.groupby(partition_by, sort=True, dropna=False)
+        ]
+    return _split_records(data, partition_by)
+
+
+def _split_table(table, partition_by):
+    column = table.column(partition_by)
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    encoded = pc.dictionary_encode(column.combine_chunks(), null_encoding='encode')
+    codes = encoded.indices.to_numpy(zero_copy_only=False)
+    values = encoded.dictionary.to_pylist()
+
+    rest = table.select([name for name in table.column_names if name != partition_by])
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+    boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries, [len(order)]])
+
+    partitions = [
+        (values[sorted_codes[start]], rest.take(order[start:end]))
+        for start, end in zip(starts, ends)
+        if end > start
+    ]
+    return sorted(partitions, key=lambda item: (item[0] is None, str(item[0])))
+
+
+def _split_records(records, partition_by):
+    path = partition_by.split('.')
+    groups = {}
+    for record in records:
+        value = record
+        for name in path:
+            value = value.get(name) if isinstance(value, dict) else None
+        if len(path) == 1:
+            record = {key: field for key, field in record.items() if key != partition_by}
+        groups.setdefault(value, []).append(record)
+    return sorted(groups.items(), key=lambda item: (item[0] is None, str(item[0])))
+
+
+def save_partitioned(write_fn, data, bucket_name, file_path, partition_by=None, max_workers=DEFAULT_BULK_WORKERS):
+    """
+    Grava os dados com write_fn(dados, arquivo), um objeto por partição (ou um só sem partition_by).
+
+    As partições são enviadas em paralelo com bulk_upload e os arquivos
+    gravados são registrados no catálogo do dataset. Retorna o relatório por
+    objeto do upload em lote.
+    """
+    # Importado aqui porque o catálogo usa as funções de caminho deste módulo
+    from catalog import file_entry, record_files
+
+    if partition_by:
+        partitions = [
+            (partition_file_path(file_path, partition_by, value), partition)
+            for value, partition in split_partitions(data, partition_by)
+        ]
+    else:
+        partitions = [(file_path, data)]
+    items = ((bucket_name, path, partial(write_fn, partition)) for path, partition in partitions)
+    s3_client = get_s3_client()
+    results = bulk_upload(s3_client, items, max_workers=max_workers)
+
+    record_files(s3_client, bucket_name, [
+        file_entry(path, partition, result['bytes'])
+        for (path, partition), result in zip(partitions, results)
+        if result['status'] == 'ok'
+    ])
+    return results
+
+
+def save_streamed(write_fn, batches, bucket_name, file_path):
+    """
+    Grava lotes com write_fn(lotes, arquivo) em um único objeto, consumindo um lote por vez.
+
+    Ao contrário de save_partitioned, os dados não precisam caber em memória:
+    cada lote é serializado e enviado em partes antes do próximo ser gerado.
+    Por isso não há particionamento nem novas tentativas (os lotes só podem
+    ser lidos uma vez). O arquivo é registrado no catálogo do dataset.
+    Retorna os bytes gravados.
+    """
+    from catalog import FileStats, record_files
+
+    s3_client = get_s3_client()
+    stats = FileStats()
+    with MultipartUploadWriter(s3_client, bucket_name, file_path, content_type=content_type_for(file_path)) as writer:
+        write_fn(stats.track(batches), writer)
+    record_files(s3_client, bucket_name, [stats.entry(file_path, writer.bytes_written)])
+    return writer.bytes_written
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Pipeline de setup do Data Lake em um único processo
+Executa os scripts como módulos, respeitando as dependências entre eles e rodando em
+paralelo os que são independentes, com o cliente S3 e os pools de valores compartilhados
+"""
+
+import argparse
+import contextvars
+import logging
+import os
+import shlex
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+from scripts import load_script
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Etapas do pipeline: script e etapas das quais depende
+STAGES = {
+    'buckets': {'script': '01_create_buckets.py', 'depends_on': []},
+    'landing_csv': {'script': '02_landing_csv.py', 'depends_on': ['buckets']},
+    'landing_json': {'script': '03_landing_json.py', 'depends_on': ['buckets']},
+    'landing_parquet': {'script': '04_landing_parquet.py', 'depends_on': ['buckets']},
+    'bronze': {'script': '03_bronze_zone.py', 'depends_on': ['buckets']},
+    'silver': {'script': '04_silver_zone.py', 'depends_on': ['buckets']},
+    'gold': {'script': '05_gold_zone.py', 'depends_on': ['buckets']},
+    # A promoção lê a landing do Protheus e grava no mesmo catálogo da bronze
+    'promote_bronze': {'script': '06_promote_bronze.py', 'depends_on': ['landing_csv', 'bronze']},
+    # Validação dos arquivos novos de todas as zonas (a landing do Protheus é validada na promoção)
+    'validate': {'script': '08_validate_zone.py',
+                 'depends_on': ['landing_json', 'landing_parquet', 'silver', 'gold', 'promote_bronze']},
+    # Cópias em Parquet dos datasets JSON (só os arquivos ainda não convertidos)
+    'convert_parquet': {'script': '09_convert_parquet.py', 'depends_on': ['landing_json', 'silver']},
+    # Rollups da gold (só os arquivos novos são agregados)
+    'gold_rollups': {'script': '10_gold_rollups.py', 'depends_on': ['gold']},
+}
+
+# Etapas que aceitam as opções comuns de geração (--rows, --seed, --workers, --as-of)
+GENERATION_STAGES = ['landing_csv', 'landing_json', 'landing_parquet', 'bronze', 'silver', 'gold']
+
+DEFAULT_MAX_PARALLEL = 4
+
+
+def _run_script(name, argv, profile, profile_dir):
+    with metrics.stage(name, profile=profile, profile_dir=profile_dir):
+        module = load_script(STAGES[name]['script'])
+        return module.run(module.parse_args(argv))
+
+
+def run_stage(name, argv, profile=(), profile_dir=None):
+    """
+    Importa o script da etapa, lê os argumentos e executa; devolve (sucesso, segundos).
+
+    A etapa roda em uma cópia do contexto: o que ela define em variáveis de
+    contexto (como o --upload-mode) não passa para as etapas seguintes da
+    mesma thread.
+    """
+    start = time.perf_counter()
+    success = contextvars.copy_context().run(_run_script, name, argv, profile, profile_dir)
+    return success is not False, time.perf_counter() - start
+
+
+def run_pipeline(stage_argv, max_parallel=DEFAULT_MAX_PARALLEL, profile=(), profile_dir=None):
+    """
+    Executa as etapas de stage_argv (nome -> argumentos) na ordem das dependências.
+
+    Uma etapa começa assim que todas as suas dependências selecionadas
+    terminam com sucesso; dependências fora da seleção são consideradas já
+    executadas. Se uma etapa falha, as que dependem dela são puladas.
+    As métricas de cada etapa ficam no módulo metrics (profile ativa o
+    cProfile/tracemalloc por etapa). Retorna o relatório por etapa com status
+    e tempo de parede.
+    """
+    pending = [name for name in STAGES if name in stage_argv]
+    report = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+        while pending or running:
+            for name in list(pending):
+                depends_on = [dep for dep in STAGES[name]['depends_on'] if dep in stage_argv]
+                if any(report.get(dep, {}).get('status') in ('failed', 'skipped') for dep in depends_on):
+                    pending.remove(name)
+                    report[name] = {'status': 'skipped', 'seconds': 0.0}
+                    logger.warning(f"Etapa {name} pulada: uma dependência falhou")
+                elif all(report.get(dep, {}).get('status') == 'ok' for dep in depends_on):
+                    pending.remove(name)
+                    logger.info(f"Iniciando etapa {name}")
+                    future = executor.submit(run_stage, name, stage_argv[name], profile, profile_dir)
+                    running[future] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    success, seconds = future.result()
+                    report[name] = {'status': 'ok' if success else 'failed', 'seconds': seconds}
+                except (Exception, SystemExit) as e:
+                    logger.error(f"Erro na etapa {name}: {e}")
+                    report[name] = {'status': 'failed', 'seconds': 0.0}
+                logger.info(f"Etapa {name} finalizada ({report[name]['status']}) em {report[name]['seconds']:.1f}s")
+    return report
+
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='Etapas executadas (padrão: todas)')
+    parser.add_argument('--skip', nargs='+', choices=list(STAGES), default=[],
+                        help='Etapas que não devem ser executadas')
+    parser.add_argument('--max-parallel', type=int, default=DEFAULT_MAX_PARALLEL,
+                        help=f'Etapas executadas ao mesmo tempo (padrão: {DEFAULT_MAX_PARALLEL})')
+    parser.add_argument('--rows', type=int, default=None,
+                        help='Número de registros de cada etapa de geração')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed base das etapas de geração')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processos usados por cada etapa de geração')
+    parser.add_argument('--as-of', default=None,
+                        help='Data de referência YYYY-MM-DD das etapas de geração')
+    parser.add_argument('--run-id', default=None,
+                        help='Identificador da execução (padrão: data e hora); cada etapa de geração usa '
+                             '{run-id}_{etapa} no nome dos arquivos, então repetir o --run-id regrava as mesmas chaves')
+    parser.add_argument('--stage-args', action='append', default=[], metavar='ETAPA="ARGS"',
+                        help='Argumentos extras de uma etapa, ex.: --stage-args gold="--partition-by regiao"')
+    # --profile com etapas em paralelo mistura o tracemalloc delas (use --max-parallel 1)
+    metrics.add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.profile and not args.metrics_dir:
+        parser.error("--profile requer --metrics-dir (ou DATAGEN_METRICS_DIR)")
+
+    # Argumentos de linha de comando de cada etapa
+    common_argv = []
+    for option in ('rows', 'seed', 'workers', 'as_of'):
+        value = getattr(args, option)
+        if value is not None:
+            common_argv += [f"--{option.replace('_', '-')}", str(value)]
+    # Etapas que rodam ao mesmo tempo não compartilham o timestamp do nome dos arquivos
+    run_id = args.run_id or time.strftime('%Y%m%dT%H%M%S')
+    stage_argv = {
+        name: common_argv + ['--run-id', f"{run_id}_{name}"] if name in GENERATION_STAGES else []
+        for name in args.stages if name not in args.skip
+    }
+    for item in args.stage_args:
+        name, _, extra = item.partition('=')
+        if name not in stage_argv:
+            parser.error(f"--stage-args: etapa {name} não está entre as executadas")
+        stage_argv[name] += shlex.split(extra)
+
+    profile_dir = os.path.join(args.metrics_dir, metrics.PROFILES_DIR, run_id) if args.profile else None
+
+    logger.info(f"Iniciando pipeline com as etapas: {', '.join(stage_argv)}")
+    start = time.perf_counter()
+    report = run_pipeline(stage_argv, max_parallel=args.max_parallel, profile=args.profile, profile_dir=profile_dir)
+    elapsed = time.perf_counter() - start
+
+    # Resumo por etapa
+    stage_metrics = metrics.snapshot()
+    for name, result in report.items():
+        counters = stage_metrics.get(name, {}).get('counters', {})
+        logger.info(f"{name:<16} {result['status']:<8} {result['seconds']:>8.1f}s "
+                    f"{counters.get('rows_written', 0):>12} registros {counters.get('bytes_uploaded', 0) / 1e6:>10.1f} MB "
+                    f"{counters.get('upload_retries', 0) + counters.get('request_retries', 0):>4} retentativas")
+    if args.metrics_dir:
+        status = {name: result['status'] for name, result in report.items()}
+        metrics.export(args.metrics_dir, run_info={'run_id': run_id, 'seconds': elapsed}, status=status)
+    failed = [name for name, result in report.items() if result['status'] != 'ok']
+    if failed:
+        logger.error(f"Pipeline concluído com erro em {elapsed:.1f}s! Etapas com problema: {', '.join(failed)}")
+    else:
+        logger.info(f"Pipeline concluído com sucesso em {elapsed:.1f}s!")
+    return not failed
+
+if __name__ == "__main__":
+    main()
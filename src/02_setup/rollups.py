@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Rollups pré-agregados da gold, mantidos de forma incremental
+Cada arquivo novo da gold vira um agregado parcial somado ao rollup, sem reler o histórico
+"""
+
+import contextvars
+import hashlib
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import metrics
+from catalog import DATASETS, consolidate_catalog, load_catalog
+from serializers import write_parquet
+from storage import delete_objects, get_s3_client, list_objects, read_json_object, write_json_object
+from validation import read_table
+
+logger = logging.getLogger(__name__)
+
+# Rollup, agregados parciais por arquivo e estado, dentro do prefixo do dataset (ignorados pelo Spark)
+ROLLUP_DIR = '_rollups/'
+PARTIALS_DIR = ROLLUP_DIR + 'partials/'
+ROLLUP_STATE = ROLLUP_DIR + '_rollup.json'
+
+# Dimensões e medidas dos rollups da gold
+GOLD_DIMENSIONS = ['regiao', 'segmento_cliente', 'faixa_salarial', 'categoria_risco', 'setor']
+GOLD_MEASURES = ['total_compras_ano', 'valor_vida_cliente']
+
+# Coluna com o número de linhas (clientes) de cada grupo
+COUNT_COLUMN = 'clientes'
+
+# Rollups já lidos pelo lookup (caminho do rollup -> tabela); o caminho muda a cada atualização
+_rollup_cache = {}
+
+
+def sum_column(measure):
+    """Nome da coluna com a soma de uma medida no rollup"""
+    return f"soma_{measure}"
+
+
+def mean_column(measure):
+    """Nome da coluna com a média de uma medida no resultado do lookup"""
+    return f"media_{measure}"
+
+
+def rollup_schema(dimensions=GOLD_DIMENSIONS, measures=GOLD_MEASURES):
+    """Schema do rollup: dimensões como texto, contagem e soma de cada medida"""
+    return pa.schema(
+        [(dimension, pa.string()) for dimension in dimensions]
+        + [(COUNT_COLUMN, pa.int64())]
+        + [(sum_column(measure), pa.float64()) for measure in measures]
+    )
+
+
+def partial_path(prefix, file_path):
+    """Caminho do agregado parcial de um arquivo do dataset"""
+    return f"{prefix}{PARTIALS_DIR}{hashlib.sha1(file_path.encode('utf-8')).hexdigest()}.parquet"
+
+
+def read_columns(s3_client, bucket_name, entry, columns):
+    """
+    Lê só as colunas pedidas de um arquivo do catálogo.
+
+    Em Parquet só as páginas dessas colunas são decodificadas; colunas de
+    partição (chave=valor/) não estão no arquivo e vêm do caminho.
+    """
+    file_columns = [column for column in columns if column not in entry['partition']]
+    if entry['format'] == 'parquet':
+        body = s3_client.get_object(Bucket=bucket_name, Key=entry['key'])['Body'].read()
+        table = pq.read_table(pa.BufferReader(body), columns=file_columns)
+    else:
+        table = read_table(s3_client, bucket_name, entry).select(file_columns)
+    for column in columns:
+        if column in entry['partition']:
+            table = table.append_column(column, pa.array([entry['partition'][column]] * table.num_rows, pa.string()))
+    return table.select(columns)
+
+
+def partial_aggregate(table, dimensions=GOLD_DIMENSIONS, measures=GOLD_MEASURES):
+    """Agrega uma tabela pelas dimensões: contagem e soma das medidas de cada grupo"""
+    columns = {dimension: table.column(dimension).cast(pa.string()) for dimension in dimensions}
+    columns.update({measure: table.column(measure).cast(pa.float64()) for measure in measures})
+    table = pa.table(columns)
+    # min_count=0: grupo só com medidas nulas soma 0, como as somas que o combinam depois
+    grouped = table.group_by(dimensions, use_threads=False).aggregate(
+        [([], 'count_all')] + [(measure, 'sum', pc.ScalarAggregateOptions(min_count=0)) for measure in measures]
+    )
+    return grouped.select(dimensions + ['count_all'] + [f"{measure}_sum" for measure in measures]) \
+        .rename_columns(rollup_schema(dimensions, measures).names)
+
+
+def combine_aggregates(tables, dimensions=GOLD_DIMENSIONS, measures=GOLD_MEASURES):
+    """
+    Soma agregados com as mesmas dimensões em um só (um grupo por combinação).
+
+    Agregados negativos (de arquivos que saíram do dataset) subtraem as
+    suas linhas; grupos que ficam sem nenhuma linha são removidos.
+    """
+    schema = rollup_schema(dimensions, measures)
+    combined = pa.concat_tables([table.cast(schema) for table in tables] or [schema.empty_table()])
+    value_columns = schema.names[len(dimensions):]
+    grouped = combined.group_by(dimensions, use_threads=False).aggregate(
+        [(column, 'sum', pc.ScalarAggregateOptions(min_count=0)) for column in value_columns]
+    )
+    grouped = grouped.select(dimensions + [f"{column}_sum" for column in value_columns]).rename_columns(schema.names)
+    grouped = grouped.filter(pc.greater(grouped.column(COUNT_COLUMN), 0))
+    return grouped.sort_by([(dimension, 'ascending') for dimension in dimensions])
+
+
+def negate_aggregate(table):
+    """Agregado com contagens e somas negadas, para retirar as linhas de um arquivo do rollup"""
+    return pa.table([
+        pc.negate(column) if pa.types.is_integer(column.type) or pa.types.is_floating(column.type) else column
+        for column in table.columns
+    ], names=table.column_names)
+
+
+def _read_parquet_object(s3_client, bucket_name, key):
+    body = s3_client.get_object(Bucket=bucket_name, Key=key)['Body'].read()
+    return pq.read_table(pa.BufferReader(body))
+
+
+def _write_parquet_object(s3_client, bucket_name, key, table):
+    buffer = io.BytesIO()
+    write_parquet(table, buffer)
+    s3_client.put_object(Bucket=bucket_name, Key=key, Body=buffer.getvalue(),
+                         ContentType='application/vnd.apache.parquet')
+
+
+def aggregate_file(s3_client, bucket_name, prefix, entry, dimensions=GOLD_DIMENSIONS, measures=GOLD_MEASURES):
+    """Calcula e grava o agregado parcial de um arquivo do dataset; devolve a tabela"""
+    with metrics.timed('aggregate'):
+        table = read_columns(s3_client, bucket_name, entry, dimensions + measures)
+        partial = partial_aggregate(table, dimensions, measures)
+    _write_parquet_object(s3_client, bucket_name, partial_path(prefix, entry['key']), partial)
+    metrics.increment('rows_aggregated', table.num_rows)
+    return partial
+
+
+def update_rollups(s3_client, bucket_name, prefix, dimensions=GOLD_DIMENSIONS, measures=GOLD_MEASURES,
+                   rebuild=False, workers=4):
+    """
+    Atualiza o rollup de um dataset com os arquivos que entraram e saíram do catálogo.
+
+    Só os arquivos novos são lidos (apenas as colunas das dimensões e
+    medidas); o agregado parcial de cada um fica em _rollups/partials/ e é
+    somado ao rollup atual. Arquivos que saíram do catálogo (substituídos
+    pela compactação, por exemplo) têm o parcial subtraído. O rollup novo é
+    gravado com outro nome e o _rollup.json passa a apontar para ele em uma
+    única gravação, então o lookup nunca vê um rollup pela metade. Com
+    rebuild (ou se as dimensões e medidas mudarem) o rollup é recalculado
+    a partir de todos os arquivos. Retorna um resumo.
+    """
+    state_path = prefix + ROLLUP_STATE
+    state = read_json_object(s3_client, bucket_name, state_path, default=None)
+    if rebuild or state is None or state['dimensions'] != dimensions or state['measures'] != measures:
+        state = {'dimensions': dimensions, 'measures': measures, 'rollup': None, 'files': {}}
+
+    consolidate_catalog(s3_client, bucket_name, prefix)
+    catalog = load_catalog(s3_client, bucket_name, prefix)
+    added = [entry for key, entry in sorted(catalog['files'].items()) if key not in state['files']]
+    removed = [key for key in state['files'] if key not in catalog['files']]
+    summary = {
+        'bucket': bucket_name,
+        'prefix': prefix,
+        'files_added': len(added),
+        'files_removed': len(removed),
+        'rows_added': sum(entry['rows'] for entry in added),
+        'groups': state.get('groups', 0),
+        'rows': state.get('rows', 0),
+    }
+    if not added and not removed and state['rollup'] is not None:
+        return summary
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, aggregate_file, s3_client, bucket_name, prefix,
+                            entry, dimensions, measures)
+            for entry in added
+        ]
+        partials = [future.result() for future in futures]
+    removed_partials = [
+        negate_aggregate(_read_parquet_object(s3_client, bucket_name, state['files'][key]['partial']))
+        for key in removed
+    ]
+
+    current = []
+    if state['rollup'] is not None:
+        current = [_read_parquet_object(s3_client, bucket_name, state['rollup'])]
+    rollup = combine_aggregates(current + partials + removed_partials, dimensions, measures)
+    rollup_path = f"{prefix}{ROLLUP_DIR}rollup_{int(time.time() * 1000)}.parquet"
+    _write_parquet_object(s3_client, bucket_name, rollup_path, rollup)
+
+    for key in removed:
+        state['files'].pop(key)
+    for entry in added:
+        state['files'][entry['key']] = {'partial': partial_path(prefix, entry['key']), 'rows': entry['rows']}
+    state['rollup'] = rollup_path
+    state['groups'] = rollup.num_rows
+    state['rows'] = int(pc.sum(rollup.column(COUNT_COLUMN)).as_py() or 0)
+    state['updated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    write_json_object(s3_client, bucket_name, state_path, state)
+
+    # Rollups anteriores e parciais de arquivos removidos (inclusive de execuções interrompidas)
+    referenced = {rollup_path, state_path} | {file['partial'] for file in state['files'].values()}
+    delete_objects(s3_client, bucket_name, sorted(
+        obj['Key'] for obj in list_objects(s3_client, bucket_name, prefix + ROLLUP_DIR)
+        if obj['Key'] not in referenced
+    ))
+    summary['groups'], summary['rows'] = state['groups'], state['rows']
+    return summary
+
+
+def load_rollup(s3_client, bucket_name, prefix):
+    """
+    Rollup atual de um dataset (tabela vazia se ainda não foi calculado).
+
+    Lê o _rollup.json e só baixa o rollup quando ele mudou desde a última
+    leitura, então consultas seguidas custam uma leitura pequena.
+    """
+    state = read_json_object(s3_client, bucket_name, prefix + ROLLUP_STATE, default=None)
+    if state is None or state['rollup'] is None:
+        return rollup_schema().empty_table()
+    if state['rollup'] not in _rollup_cache:
+        _rollup_cache.clear()
+        _rollup_cache[state['rollup']] = _read_parquet_object(s3_client, bucket_name, state['rollup'])
+    return _rollup_cache[state['rollup']]
+
+
+def query_rollup(rollup, group_by=(), filters=None):
+    """
+    Responde a um group-by a partir do rollup, sem ler os dados da gold.
+
+    group_by é qualquer subconjunto das dimensões do rollup (vazio soma
+    tudo) e filters uma lista de tuplas (coluna, operador, valor) nas
+    dimensões, como em catalog.find_files, por exemplo
+    [('regiao', '=', 'SUL'), ('setor', 'in', ['Tecnologia', 'Saúde'])].
+    Devolve uma linha por grupo com a contagem, a soma e a média de cada
+    medida, ordenada pelas colunas de group_by.
+    """
+    group_by = list(group_by)
+    unknown = [column for column in group_by if column not in rollup.column_names]
+    if unknown:
+        raise ValueError(f"Dimensões fora do rollup: {', '.join(unknown)}")
+    if filters:
+        rollup = rollup.filter(pq.filters_to_expression(filters))
+    value_columns = [column for column in rollup.column_names if column == COUNT_COLUMN or column.startswith('soma_')]
+    result = rollup.group_by(group_by, use_threads=False).aggregate(
+        [(column, 'sum', pc.ScalarAggregateOptions(min_count=0)) for column in value_columns]
+    )
+    result = result.select(group_by + [f"{column}_sum" for column in value_columns]) \
+        .rename_columns(group_by + value_columns)
+    counts = pc.cast(result.column(COUNT_COLUMN), pa.float64())
+    for column in value_columns[1:]:
+        result = result.append_column(mean_column(column[len('soma_'):]), pc.divide(result.column(column), counts))
+    return result.sort_by([(column, 'ascending') for column in group_by]) if group_by else result
+
+
+def lookup(group_by=(), filters=None, name='gold', s3_client=None):
+    """Group-by de um dataset de catalog.DATASETS respondido pelo rollup (ex.: lookup(['regiao']))"""
+    bucket_name, prefix = DATASETS[name]
+    return query_rollup(load_rollup(s3_client or get_s3_client(), bucket_name, prefix), group_by, filters)
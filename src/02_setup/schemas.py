@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Registro dos schemas de todos os datasets gravados pelos scripts
+Os mesmos schemas servem para gerar os dados (Arrow) e para lê-los no Spark sem inferência
+"""
+
+import pyarrow as pa
+
+# Landing do Protheus (CSV): datas YYYY-MM-DD; CEP e telefone como texto para não perder zeros e formatação
+LANDING_CSV_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('nome', pa.string()),
+    ('email', pa.string()),
+    ('telefone', pa.string()),
+    ('endereco', pa.string()),
+    ('cidade', pa.string()),
+    ('estado', pa.string()),
+    ('cep', pa.string()),
+    ('data_nascimento', pa.date32()),
+    ('data_cadastro', pa.date32()),
+    ('salario', pa.float64()),
+    ('status', pa.string()),
+    ('empresa', pa.string())
+])
+
+# Landing do SAP (JSON): objetos aninhados como structs, na ordem dos campos do JSON
+LANDING_JSON_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('nome', pa.string()),
+    ('email', pa.string()),
+    ('telefone', pa.string()),
+    ('endereco', pa.struct([
+        ('rua', pa.string()),
+        ('cidade', pa.string()),
+        ('estado', pa.string()),
+        ('cep', pa.string()),
+        ('pais', pa.string())
+    ])),
+    ('data_nascimento', pa.date32()),
+    ('data_cadastro', pa.date32()),
+    ('salario', pa.float64()),
+    ('status', pa.string()),
+    ('empresa', pa.struct([
+        ('nome', pa.string()),
+        ('cnpj', pa.string()),
+        ('setor', pa.string())
+    ])),
+    ('preferencias', pa.struct([
+        ('comunicacao', pa.string()),
+        ('idioma', pa.string()),
+        ('newsletter', pa.bool_())
+    ]))
+])
+
+# Landing do Cloud X (Parquet): enums com dictionary encoding, datas como date32
+LANDING_PARQUET_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('nome', pa.string()),
+    ('email', pa.string()),
+    ('telefone', pa.string()),
+    ('endereco', pa.string()),
+    ('cidade', pa.string()),
+    ('estado', pa.dictionary(pa.int8(), pa.string())),
+    ('cep', pa.string()),
+    ('data_nascimento', pa.date32()),
+    ('data_cadastro', pa.date32()),
+    ('salario', pa.float64()),
+    ('status', pa.dictionary(pa.int8(), pa.string())),
+    ('empresa', pa.string()),
+    ('score_credito', pa.int16()),
+    ('limite_credito', pa.float64()),
+    ('ultima_compra', pa.date32()),
+    ('total_compras', pa.float64()),
+    ('categoria', pa.dictionary(pa.int8(), pa.string())),
+    ('canal_preferido', pa.dictionary(pa.int8(), pa.string()))
+])
+
+# Bronze (CSV gerado pelo 03_bronze_zone.py ou promovido da landing)
+BRONZE_SCHEMA = pa.schema([
+    ('cliente_id', pa.string()),
+    ('nome_completo', pa.string()),
+    ('email', pa.string()),
+    ('telefone', pa.string()),
+    ('endereco_completo', pa.string()),
+    ('cidade', pa.string()),
+    ('estado', pa.string()),
+    ('cep', pa.string()),
+    ('data_nascimento', pa.date32()),
+    ('data_cadastro', pa.date32()),
+    ('salario_mensal', pa.float64()),
+    ('status_cliente', pa.string()),
+    ('empresa', pa.string()),
+    ('cargo', pa.string()),
+    ('data_atualizacao', pa.timestamp('s'))
+])
+
+# Silver (JSON com objetos aninhados)
+SILVER_SCHEMA = pa.schema([
+    ('cliente_id', pa.string()),
+    ('dados_pessoais', pa.struct([
+        ('nome_completo', pa.string()),
+        ('email_principal', pa.string()),
+        ('telefone_principal', pa.string()),
+        ('data_nascimento', pa.date32()),
+        ('genero', pa.string()),
+        ('estado_civil', pa.string())
+    ])),
+    ('endereco', pa.struct([
+        ('logradouro', pa.string()),
+        ('bairro', pa.string()),
+        ('cidade', pa.string()),
+        ('estado', pa.string()),
+        ('cep', pa.string()),
+        ('pais', pa.string()),
+        ('tipo_endereco', pa.string())
+    ])),
+    ('dados_profissionais', pa.struct([
+        ('empresa', pa.string()),
+        ('cargo', pa.string()),
+        ('salario_bruto', pa.float64()),
+        ('data_admissao', pa.date32()),
+        ('setor', pa.string())
+    ])),
+    ('preferencias_cliente', pa.struct([
+        ('canal_preferido', pa.string()),
+        ('idioma', pa.string()),
+        ('recebe_promocoes', pa.bool_()),
+        ('tipo_produto_interesse', pa.string())
+    ])),
+    ('metadados', pa.struct([
+        ('data_cadastro', pa.date32()),
+        ('data_ultima_atualizacao', pa.timestamp('s')),
+        ('origem_dados', pa.string()),
+        ('versao_dados', pa.string()),
+        ('status_processamento', pa.string())
+    ]))
+])
+
+# Gold (Parquet): o schema do arquivo é o físico, então data_ultima_atualizacao continua texto
+GOLD_SCHEMA = pa.schema([
+    ('cliente_id', pa.string()),
+    ('nome_completo', pa.string()),
+    ('email', pa.string()),
+    ('telefone', pa.string()),
+    ('idade', pa.int16()),
+    ('faixa_etaria', pa.dictionary(pa.int8(), pa.string())),
+    ('cidade', pa.string()),
+    ('estado', pa.dictionary(pa.int8(), pa.string())),
+    ('regiao', pa.dictionary(pa.int8(), pa.string())),
+    ('salario_bruto', pa.float64()),
+    ('faixa_salarial', pa.dictionary(pa.int8(), pa.string())),
+    ('empresa', pa.string()),
+    ('cargo', pa.string()),
+    ('setor', pa.dictionary(pa.int8(), pa.string())),
+    ('score_credito', pa.int16()),
+    ('categoria_risco', pa.dictionary(pa.int8(), pa.string())),
+    ('limite_credito', pa.float64()),
+    ('total_compras_ano', pa.float64()),
+    ('ticket_medio', pa.float64()),
+    ('frequencia_compras', pa.int16()),
+    ('ultima_compra', pa.date32()),
+    ('status_cliente', pa.dictionary(pa.int8(), pa.string())),
+    ('segmento_cliente', pa.dictionary(pa.int8(), pa.string())),
+    ('canal_preferido', pa.dictionary(pa.int8(), pa.string())),
+    ('propensao_compra', pa.float64()),
+    ('valor_vida_cliente', pa.float64()),
+    ('data_cadastro', pa.date32()),
+    ('dias_desde_cadastro', pa.int16()),
+    ('data_ultima_atualizacao', pa.string()),
+    ('origem_dados', pa.dictionary(pa.int8(), pa.string())),
+    ('versao_dados', pa.dictionary(pa.int8(), pa.string()))
+])
+
+# Schema de cada dataset (mesmas chaves de catalog.DATASETS)
+DATASET_SCHEMAS = {
+    'landing_csv': LANDING_CSV_SCHEMA,
+    'landing_json': LANDING_JSON_SCHEMA,
+    'landing_parquet': LANDING_PARQUET_SCHEMA,
+    'bronze': BRONZE_SCHEMA,
+    'silver': SILVER_SCHEMA,
+    'gold': GOLD_SCHEMA,
+    # Cópias em Parquet: mesmo schema, com datas e timestamps tipados de fato
+    'landing_json_parquet': LANDING_JSON_SCHEMA,
+    'silver_parquet': SILVER_SCHEMA,
+}
+
+# Tipos do Spark SQL (DDL) equivalentes aos tipos Arrow
+SPARK_TYPES = {
+    'string': 'STRING',
+    'large_string': 'STRING',
+    'bool': 'BOOLEAN',
+    'int8': 'TINYINT',
+    'int16': 'SMALLINT',
+    'int32': 'INT',
+    'int64': 'BIGINT',
+    'float': 'FLOAT',
+    'double': 'DOUBLE',
+    'date32[day]': 'DATE',
+}
+
+
+def text_schema(schema):
+    """
+    Mesmo schema com datas e timestamps como texto.
+
+    É o layout serializado nos CSV e JSON (datas YYYY-MM-DD, timestamps
+    YYYY-MM-DD HH:MM:SS), usado para montar os lotes Arrow desses arquivos.
+    """
+    return pa.schema([pa.field(field.name, _text_type(field.type)) for field in schema])
+
+
+def _text_type(data_type):
+    if pa.types.is_struct(data_type):
+        return pa.struct([pa.field(field.name, _text_type(field.type)) for field in data_type])
+    if pa.types.is_temporal(data_type):
+        return pa.string()
+    return data_type
+
+
+def spark_type(data_type):
+    """Tipo Spark SQL (DDL) de um tipo Arrow; dictionary vira o tipo dos valores"""
+    if pa.types.is_dictionary(data_type):
+        return spark_type(data_type.value_type)
+    if pa.types.is_struct(data_type):
+        return f"STRUCT<{', '.join(f'`{field.name}`: {spark_type(field.type)}' for field in data_type)}>"
+    if pa.types.is_timestamp(data_type):
+        return 'TIMESTAMP'
+    if str(data_type) not in SPARK_TYPES:
+        raise ValueError(f"Tipo sem equivalente no Spark: {data_type}")
+    return SPARK_TYPES[str(data_type)]
+
+
+def spark_ddl(schema):
+    """Schema no formato DDL aceito por spark.read.schema() (ex.: `id` STRING, `salario` DOUBLE)"""
+    return ', '.join(f"`{field.name}` {spark_type(field.type)}" for field in schema)
+
+
+def dataset_schema(name):
+    """Schema Arrow registrado para um dataset de catalog.DATASETS"""
+    if name not in DATASET_SCHEMAS:
+        raise ValueError(f"Dataset sem schema registrado: {name} (use {', '.join(DATASET_SCHEMAS)})")
+    return DATASET_SCHEMAS[name]
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Carrega os scripts numerados (01_create_buckets.py, 02_landing_csv.py, ...) como módulos
+Os nomes começam com dígitos, então são importados como setup_<nome do arquivo>
+"""
+
+import importlib
+import importlib.abc
+import importlib.util
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+SETUP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Prefixo dos módulos dos scripts (setup_02_landing_csv -> 02_landing_csv.py)
+SCRIPT_MODULE_PREFIX = 'setup_'
+
+# Os processos workers nascem de um processo limpo: com fork eles herdariam os locks das outras
+# threads do processo (logging, boto3, pools de valores) no estado em que estavam e poderiam travar
+WORKER_START_METHOD = os.environ.get(
+    'DATAGEN_START_METHOD',
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+
+class ScriptFinder(importlib.abc.MetaPathFinder):
+    """Resolve os módulos setup_* para os scripts numerados da pasta de setup"""
+
+    def find_spec(self, fullname, path=None, target=None):
+        if not fullname.startswith(SCRIPT_MODULE_PREFIX):
+            return None
+        file_path = os.path.join(SETUP_DIR, fullname[len(SCRIPT_MODULE_PREFIX):] + '.py')
+        if not os.path.exists(file_path):
+            return None
+        return importlib.util.spec_from_file_location(fullname, file_path)
+
+
+def install_script_finder():
+    """
+    Registra o ScriptFinder no processo (uma única vez).
+
+    Os workers spawn/forkserver não herdam os módulos do processo pai; com o
+    finder eles reimportam pelo nome os scripts cujas funções recebem (pickle).
+    """
+    if not any(isinstance(finder, ScriptFinder) for finder in sys.meta_path):
+        sys.meta_path.append(ScriptFinder())
+
+
+install_script_finder()
+
+
+def load_script(file_name):
+    """Importa um script da pasta de setup (uma única vez por processo)"""
+    return importlib.import_module(SCRIPT_MODULE_PREFIX + os.path.splitext(file_name)[0])
+
+
+def worker_pool(max_workers):
+    """Pool de processos para as funções dos scripts e módulos de setup (WORKER_START_METHOD)"""
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(WORKER_START_METHOD),
+                               initializer=install_script_finder)
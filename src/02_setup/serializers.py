@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Serializadores em blocos para CSV, JSON e Parquet
+Cada função produz o arquivo aos pedaços, para ser enviado em streaming
+"""
+
+import json
+import textwrap
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Quantidade de linhas serializadas por bloco
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Opções padrão do writer Parquet
+PARQUET_CODECS = ['zstd', 'snappy', 'gzip', 'lz4', 'brotli', 'none']
+DEFAULT_PARQUET_COMPRESSION = 'zstd'
+DEFAULT_ROW_GROUP_SIZE = 500_000
+
+# Linhas NDJSON por bloco (blocos pequenos deixam o rollover por tamanho mais preciso)
+DEFAULT_NDJSON_CHUNK_LINES = 1000
+
+
+def iter_csv_chunks(df, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Gera o CSV de um DataFrame em blocos de bytes (cabeçalho só no primeiro)"""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, header=(start == 0), encoding='utf-8').encode('utf-8')
+
+
+def iter_json_array_chunks(records, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Gera um array JSON indentado em blocos de bytes (mesma saída de json.dumps(indent=2))"""
+    if not records:
+        yield b'[]'
+        return
+
+    yield b'[\n'
+    for start in range(0, len(records), chunk_rows):
+        chunk = records[start:start + chunk_rows]
+        body = ',\n'.join(
+            textwrap.indent(json.dumps(record, indent=2, ensure_ascii=False), '  ')
+            for record in chunk
+        )
+        separator = ',\n' if start + chunk_rows < len(records) else '\n'
+        yield (body + separator).encode('utf-8')
+    yield b']'
+
+
+def iter_ndjson_chunks(batches, chunk_lines=DEFAULT_NDJSON_CHUNK_LINES):
+    """Gera JSON delimitado por linhas (um registro por linha) a partir de lotes de registros"""
+    for records in batches:
+        for start in range(0, len(records), chunk_lines):
+            lines = [json.dumps(record, ensure_ascii=False) for record in records[start:start + chunk_lines]]
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def batch_to_records(batch):
+    """
+    Converte um RecordBatch Arrow em lista de dicts (structs viram dicts aninhados).
+
+    Mesmo resultado de batch.to_pylist(), mas convertendo coluna a coluna,
+    o que é bem mais rápido com structs.
+    """
+    return _arrays_to_records(batch.schema.names, batch.columns)
+
+
+def _arrays_to_records(names, arrays):
+    values = []
+    for array in arrays:
+        if pa.types.is_struct(array.type):
+            records = _arrays_to_records([field.name for field in array.type], array.flatten())
+            if array.null_count:
+                records = [record if valid else None for record, valid in zip(records, array.is_valid().to_pylist())]
+            values.append(records)
+        elif array.null_count == 0 and _converts_via_numpy(array.type):
+            values.append(array.to_numpy(zero_copy_only=False).tolist())
+        else:
+            values.append(array.to_pylist())
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def _converts_via_numpy(data_type):
+    """Tipos em que to_numpy().tolist() (bem mais rápido) dá os mesmos valores de to_pylist()"""
+    return (pa.types.is_string(data_type) or pa.types.is_boolean(data_type)
+            or pa.types.is_integer(data_type) or pa.types.is_floating(data_type))
+
+
+def iter_csv_batches(batches):
+    """Gera o CSV de RecordBatches Arrow em blocos de bytes, um lote por vez (cabeçalho só no primeiro)"""
+    header = True
+    for batch in batches:
+        yield batch.to_pandas().to_csv(index=False, header=header, encoding='utf-8').encode('utf-8')
+        header = False
+
+
+def iter_json_array_batches(batches, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Gera um array JSON indentado a partir de RecordBatches Arrow (structs viram objetos)"""
+    first = True
+    for batch in batches:
+        for start in range(0, batch.num_rows, chunk_rows):
+            records = batch_to_records(batch.slice(start, chunk_rows))
+            body = ',\n'.join(
+                textwrap.indent(json.dumps(record, indent=2, ensure_ascii=False), '  ')
+                for record in records
+            )
+            yield ((b'[\n' if first else b',\n') + body.encode('utf-8'))
+            first = False
+    yield b'[]' if first else b'\n]'
+
+
+def write_csv(df, fileobj):
+    """Escreve um DataFrame como CSV em um arquivo, bloco a bloco"""
+    for chunk in iter_csv_chunks(df):
+        fileobj.write(chunk)
+
+
+def write_json_array(records, fileobj):
+    """Escreve os registros como um array JSON indentado em um arquivo, bloco a bloco"""
+    for chunk in iter_json_array_chunks(records):
+        fileobj.write(chunk)
+
+
+def write_csv_batches(batches, fileobj):
+    """Escreve RecordBatches Arrow como CSV em um arquivo, lote a lote"""
+    for chunk in iter_csv_batches(batches):
+        fileobj.write(chunk)
+
+
+def write_json_array_batches(batches, fileobj):
+    """Escreve RecordBatches Arrow como um array JSON indentado em um arquivo, lote a lote"""
+    for chunk in iter_json_array_batches(batches):
+        fileobj.write(chunk)
+
+
+def write_ndjson_batches(batches, fileobj):
+    """Escreve RecordBatches Arrow como NDJSON (um registro por linha) em um arquivo, lote a lote"""
+    for chunk in iter_ndjson_chunks(batch_to_records(batch) for batch in batches):
+        fileobj.write(chunk)
+
+
+def sort_table(table, sort_by):
+    """Ordena a tabela por uma coluna (colunas dictionary são ordenadas pelo valor)"""
+    column = table.column(sort_by)
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    return table.take(pc.sort_indices(column))
+
+
+def add_parquet_arguments(parser):
+    """Adiciona as opções do writer Parquet ao parser de linha de comando"""
+    parser.add_argument('--compression', choices=PARQUET_CODECS, default=DEFAULT_PARQUET_COMPRESSION,
+                        help=f'Codec de compressão do Parquet (padrão: {DEFAULT_PARQUET_COMPRESSION})')
+    parser.add_argument('--compression-level', type=int, default=None,
+                        help='Nível de compressão do codec (padrão: o do codec)')
+    parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f'Linhas por row group (padrão: {DEFAULT_ROW_GROUP_SIZE})')
+    parser.add_argument('--sort-by', default=None,
+                        help='Coluna usada para ordenar os dados antes da escrita')
+    parser.add_argument('--page-index', action='store_true',
+                        help='Grava o page index (estatísticas por página) para pushdown mais fino')
+
+
+def parquet_options(args):
+    """Converte os argumentos de linha de comando em opções para write_parquet"""
+    return {
+        'compression': args.compression,
+        'compression_level': args.compression_level,
+        'row_group_size': args.row_group_size,
+        'sort_by': args.sort_by,
+        'write_page_index': args.page_index,
+    }
+
+
+def write_parquet(table, fileobj, compression=DEFAULT_PARQUET_COMPRESSION, compression_level=None,
+                  row_group_size=DEFAULT_ROW_GROUP_SIZE, sort_by=None, write_statistics=True,
+                  write_page_index=False):
+    """
+    Escreve uma tabela Arrow em Parquet com as opções de layout informadas.
+
+    Colunas dictionary são gravadas com dictionary encoding e as estatísticas
+    (min/max por row group e, opcionalmente, por página) permitem que o Spark
+    descarte row groups inteiros. Ordenar por uma coluna de filtro frequente
+    deixa esses intervalos disjuntos e o pushdown muito mais efetivo.
+    """
+    sorting_columns = None
+    if sort_by:
+        table = sort_table(table, sort_by)
+        sorting_columns = [pq.SortingColumn(table.schema.get_field_index(sort_by))]
+
+    with pq.ParquetWriter(
+        fileobj,
+        table.schema,
+        compression=None if compression == 'none' else compression,
+        compression_level=compression_level,
+        use_dictionary=True,
+        write_statistics=write_statistics,
+        write_page_index=write_page_index,
+        sorting_columns=sorting_columns
+    ) as writer:
+        writer.write_table(table, row_group_size=row_group_size)
+
+
+def write_parquet_batches(batches, fileobj, compression=DEFAULT_PARQUET_COMPRESSION, compression_level=None,
+                          row_group_size=DEFAULT_ROW_GROUP_SIZE, sort_by=None, write_statistics=True,
+                          write_page_index=False, schema=None):
+    """
+    Escreve RecordBatches Arrow em Parquet, um lote por vez (schema do primeiro lote).
+
+    Cada lote é gravado como um ou mais row groups de até row_group_size
+    linhas, então os row groups não passam do tamanho do lote. Ordenar
+    exigiria o dataset inteiro em memória, por isso sort_by não é aceito.
+    Sem nenhum lote o arquivo é gravado vazio com schema (um Parquet
+    válido, sem row groups); sem lotes e sem schema a escrita falha, em
+    vez de deixar um objeto de 0 bytes.
+    """
+    if sort_by:
+        raise ValueError("sort_by não é suportado na escrita em lotes")
+
+    def open_writer(file_schema):
+        return pq.ParquetWriter(
+            fileobj,
+            file_schema,
+            compression=None if compression == 'none' else compression,
+            compression_level=compression_level,
+            use_dictionary=True,
+            write_statistics=write_statistics,
+            write_page_index=write_page_index
+        )
+
+    writer = None
+    try:
+        for batch in batches:
+            if writer is None:
+                writer = open_writer(batch.schema)
+            writer.write_batch(batch, row_group_size=row_group_size)
+        if writer is None:
+            if schema is None:
+                raise ValueError("Nenhum lote para gravar em Parquet e nenhum schema informado")
+            writer = open_writer(schema)
+    finally:
+        if writer is not None:
+            writer.close()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Geração em shards com múltiplos processos
+Divide um dataset em shards com seeds determinísticas derivadas de uma seed base
+"""
+
+import argparse
+import inspect
+import logging
+import os
+import random
+import time
+
+import numpy as np
+
+import metrics
+from catalog import consolidate_catalog, dataset_prefix
+from scripts import worker_pool
+from storage import UPLOAD_MODES, get_s3_client, set_upload_mode, upload_mode, using_upload_mode
+
+logger = logging.getLogger(__name__)
+
+# Quantidade padrão de linhas por shard (um objeto no bucket por shard)
+DEFAULT_ROWS_PER_SHARD = 1_000_000
+
+# Data de referência usada quando há seed e nenhuma --as-of foi informada,
+# para que a mesma seed gere sempre os mesmos bytes
+DEFAULT_SEEDED_REFERENCE_DATE = '2025-01-01'
+
+
+def build_generation_parser(description):
+    """Cria o parser com os argumentos de linha de comando comuns aos scripts de geração"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--rows', type=int, default=None,
+                        help='Número de registros (padrão: sorteado no intervalo do script)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processos usados para gerar os shards (padrão: 1)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed base; a mesma seed gera sempre a mesma saída')
+    parser.add_argument('--rows-per-shard', type=int, default=DEFAULT_ROWS_PER_SHARD,
+                        help=f'Registros por shard/objeto (padrão: {DEFAULT_ROWS_PER_SHARD})')
+    parser.add_argument('--batch-rows', type=int, default=None,
+                        help='Gera e grava cada shard em lotes Arrow de N registros, com memória limitada '
+                             'a um lote (sem --partition-by)')
+    parser.add_argument('--as-of', default=None,
+                        help='Data de referência YYYY-MM-DD para datas e timestamps gerados '
+                             f'(padrão: hoje, ou {DEFAULT_SEEDED_REFERENCE_DATE} quando há --seed)')
+    parser.add_argument('--run-id', default=None,
+                        help='Identificador usado no nome dos arquivos no lugar do timestamp; repetir o mesmo '
+                             '--run-id com a mesma --seed regrava as mesmas chaves')
+    parser.add_argument('--upload-mode', choices=UPLOAD_MODES, default=None,
+                        help='overwrite (sempre envia), skip-unchanged (pula o conteúdo já gravado na chave) '
+                             'ou resume (também retoma uploads interrompidos) (padrão: MINIO_UPLOAD_MODE ou overwrite)')
+    metrics.add_metrics_arguments(parser)
+    return parser
+
+
+def parse_generation_args(description, parser=None, argv=None):
+    """Lê os argumentos de geração (parser pode trazer opções extras do script)"""
+    parser = parser or build_generation_parser(description)
+    args = parser.parse_args(argv)
+    if args.as_of is None and args.seed is not None:
+        args.as_of = DEFAULT_SEEDED_REFERENCE_DATE
+    if args.batch_rows is not None and getattr(args, 'partition_by', None):
+        parser.error("--batch-rows não pode ser usado com --partition-by (cada partição precisa dos dados inteiros)")
+    if args.batch_rows is not None and getattr(args, 'sort_by', None):
+        parser.error("--batch-rows não pode ser usado com --sort-by (ordenar exige os dados inteiros)")
+    if args.upload_mode is not None:
+        set_upload_mode(args.upload_mode)
+    return args
+
+
+def run_timestamp(args):
+    """Sufixo dos nomes de arquivo da execução: --run-id ou o timestamp atual"""
+    return args.run_id or int(time.time())
+
+
+def resolve_num_records(args, low, high):
+    """Número de registros pedido, ou sorteado entre low e high (reprodutível com --seed)"""
+    if args.rows is not None:
+        return args.rows
+    return random.Random(args.seed).randint(low, high)
+
+
+def derive_seeds(seed, num_shards):
+    """Deriva uma seed independente e determinística para cada shard"""
+    children = np.random.SeedSequence(seed).spawn(num_shards)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+
+def split_rows(num_records, rows_per_shard):
+    """Divide o total de registros em shards de tamanho quase igual"""
+    num_shards = max(1, -(-num_records // rows_per_shard))
+    base, remainder = divmod(num_records, num_shards)
+    return [base + (1 if i < remainder else 0) for i in range(num_shards)]
+
+
+def shard_file_path(file_path, shard_index):
+    """Insere o sufixo do shard no nome do arquivo (ex.: _part-00007.parquet)"""
+    root, ext = os.path.splitext(file_path)
+    return f"{root}_part-{shard_index:05d}{ext}"
+
+
+def _count_batches(batches):
+    """Repassa lotes gerados sob demanda, contando o tempo de geração e os registros de cada um"""
+    for batch in metrics.timed_iter('generate', batches):
+        metrics.increment('rows_generated', len(batch))
+        yield batch
+
+
+def _generate_and_save(generate_fn, save_fn, num_records, seed, reference_date, bucket_name, file_path,
+                       mode=None):
+    """Gera e salva um shard (executado dentro do processo worker, com o modo de upload mode da etapa)"""
+    if inspect.isgeneratorfunction(getattr(generate_fn, 'func', generate_fn)):
+        # Lotes gerados à medida que save_fn os consome
+        data = _count_batches(generate_fn(num_records, seed=seed, reference_date=reference_date))
+    else:
+        with metrics.timed('generate'):
+            data = generate_fn(num_records, seed=seed, reference_date=reference_date)
+        metrics.increment('rows_generated', len(data))
+    with metrics.timed('save'), using_upload_mode(mode):
+        return save_fn(data, bucket_name, file_path)
+
+
+def run_sharded(generate_fn, save_fn, num_records, bucket_name, file_path,
+                workers=1, seed=None, rows_per_shard=DEFAULT_ROWS_PER_SHARD, reference_date=None):
+    """
+    Gera o dataset em shards e grava um objeto por shard.
+
+    Os shards dependem só do total de registros e de rows_per_shard (não do
+    número de workers), então a mesma seed produz a mesma saída com qualquer
+    quantidade de processos. Com um único shard o arquivo mantém o nome original.
+    Ao final, os arquivos registrados pelos shards são consolidados no catálogo
+    do dataset. As métricas dos workers são somadas às da etapa atual.
+    """
+    shard_rows = split_rows(num_records, rows_per_shard)
+    seeds = derive_seeds(seed, len(shard_rows))
+    if len(shard_rows) == 1:
+        paths = [file_path]
+    else:
+        paths = [shard_file_path(file_path, i) for i in range(len(shard_rows))]
+    logger.info(f"Gerando {num_records} registros em {len(shard_rows)} shard(s) com {workers} worker(s)")
+
+    tasks = [
+        (generate_fn, save_fn, rows, shard_seed, reference_date, bucket_name, path, upload_mode())
+        for rows, shard_seed, path in zip(shard_rows, seeds, paths)
+    ]
+    if workers <= 1 or len(tasks) == 1:
+        results = [_generate_and_save(*task) for task in tasks]
+    else:
+        with worker_pool(workers) as executor:
+            futures = [
+                executor.submit(metrics.run_in_worker, metrics.current_stage(), _generate_and_save, *task)
+                for task in tasks
+            ]
+            results = []
+            for future in futures:
+                result, worker_metrics = future.result()
+                metrics.merge(worker_metrics)
+                results.append(result)
+
+    try:
+        consolidate_catalog(get_s3_client(), bucket_name, dataset_prefix(file_path))
+    except Exception as e:
+        logger.error(f"Erro ao atualizar o catálogo de {bucket_name}/{dataset_prefix(file_path)}: {e}")
+    return all(results)
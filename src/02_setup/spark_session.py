@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Sessão Spark configurada para ler e gravar as zonas no MinIO via s3a
+Lê cada dataset pelos arquivos do catálogo com o schema registrado, sem inferência
+"""
+
+import os
+
+try:
+    import pyspark
+    from pyspark.sql import SparkSession
+except ImportError:  # pyspark é opcional (vem na imagem jupyter/pyspark-notebook)
+    pyspark = None
+    SparkSession = None
+
+from catalog import DATASETS, load_catalog
+from schemas import dataset_schema, spark_ddl
+from storage import (DEFAULT_MAX_CONCURRENCY, DEFAULT_PART_SIZE, MINIO_ACCESS_KEY, MINIO_ENDPOINT,
+                     MINIO_SECRET_KEY, MINIO_SECURE, get_s3_client)
+
+# local[*] usa todos os núcleos da máquina; aponte para um cluster com SPARK_MASTER
+SPARK_MASTER = os.environ.get('SPARK_MASTER', 'local[*]')
+
+# hadoop-aws precisa ser da mesma versão do Hadoop embutido no Spark (3.3.4 no Spark 3.4/3.5)
+SPARK_HADOOP_AWS_VERSION = os.environ.get('SPARK_HADOOP_AWS_VERSION', '3.3.4')
+SPARK_SCALA_VERSION = os.environ.get('SPARK_SCALA_VERSION', '2.12')
+
+# Conexões e threads do s3a (o padrão do Hadoop, 96 conexões, limita leituras com muitas tasks)
+SPARK_S3A_MAX_CONNECTIONS = int(os.environ.get('SPARK_S3A_MAX_CONNECTIONS', 200))
+SPARK_S3A_MAX_THREADS = int(os.environ.get('SPARK_S3A_MAX_THREADS', 64))
+
+# Opções de leitura por formato (datas e timestamps no formato gravado pelos scripts)
+READ_OPTIONS = {
+    'csv': {'header': 'true', 'multiLine': 'true', 'escape': '"',
+            'dateFormat': 'yyyy-MM-dd', 'timestampFormat': 'yyyy-MM-dd HH:mm:ss'},
+    # Arrays JSON indentados precisam de multiLine; NDJSON é lido linha a linha (divisível entre tasks)
+    'json': {'multiLine': 'true', 'dateFormat': 'yyyy-MM-dd', 'timestampFormat': 'yyyy-MM-dd HH:mm:ss'},
+    'ndjson': {'dateFormat': 'yyyy-MM-dd', 'timestampFormat': 'yyyy-MM-dd HH:mm:ss'},
+    'parquet': {},
+}
+
+# Formato do Spark para cada formato do catálogo
+SPARK_FORMATS = {
+    'csv': 'csv',
+    'json': 'json',
+    'ndjson': 'json',
+    'parquet': 'parquet',
+}
+
+
+def spark_packages():
+    """Conectores baixados pelo Spark: s3a (hadoop-aws) e os committers de nuvem (spark-hadoop-cloud)"""
+    packages = [f'org.apache.hadoop:hadoop-aws:{SPARK_HADOOP_AWS_VERSION}']
+    if pyspark is not None:
+        packages.append(f'org.apache.spark:spark-hadoop-cloud_{SPARK_SCALA_VERSION}:{pyspark.__version__}')
+    return packages
+
+
+def spark_configs():
+    """
+    Configurações do Spark para o MinIO (mesmo endpoint e credenciais do storage.py).
+
+    - path style e credenciais fixas, como exige o MinIO
+    - pool de conexões e threads do s3a maiores que o padrão
+    - fast upload: gravações enviadas em partes de DEFAULT_PART_SIZE
+      direto da memória, sem arquivo temporário em disco
+    - committer magic: as tasks gravam direto no destino como multipart
+      uploads pendentes, concluídos só no commit do job (sem o rename do
+      FileOutputCommitter, que no S3 é uma cópia de cada arquivo)
+    """
+    scheme = 'https' if MINIO_SECURE else 'http'
+    return {
+        'spark.jars.packages': ','.join(spark_packages()),
+        'spark.hadoop.fs.s3a.impl': 'org.apache.hadoop.fs.s3a.S3AFileSystem',
+        'spark.hadoop.fs.s3a.endpoint': f'{scheme}://{MINIO_ENDPOINT}',
+        'spark.hadoop.fs.s3a.access.key': MINIO_ACCESS_KEY,
+        'spark.hadoop.fs.s3a.secret.key': MINIO_SECRET_KEY,
+        'spark.hadoop.fs.s3a.aws.credentials.provider': 'org.apache.hadoop.fs.s3a.SimpleAWSCredentialsProvider',
+        'spark.hadoop.fs.s3a.path.style.access': 'true',
+        'spark.hadoop.fs.s3a.connection.ssl.enabled': str(MINIO_SECURE).lower(),
+        'spark.hadoop.fs.s3a.connection.maximum': str(SPARK_S3A_MAX_CONNECTIONS),
+        'spark.hadoop.fs.s3a.threads.max': str(SPARK_S3A_MAX_THREADS),
+        'spark.hadoop.fs.s3a.fast.upload': 'true',
+        'spark.hadoop.fs.s3a.fast.upload.buffer': 'bytebuffer',
+        'spark.hadoop.fs.s3a.fast.upload.active.blocks': str(DEFAULT_MAX_CONCURRENCY),
+        'spark.hadoop.fs.s3a.multipart.size': str(DEFAULT_PART_SIZE),
+        'spark.hadoop.fs.s3a.committer.name': 'magic',
+        'spark.hadoop.fs.s3a.committer.magic.enabled': 'true',
+        'spark.sql.sources.commitProtocolClass': 'org.apache.spark.internal.io.cloud.PathOutputCommitProtocol',
+        'spark.sql.parquet.output.committer.class':
+            'org.apache.spark.internal.io.cloud.BindingParquetOutputCommitter',
+    }
+
+
+def create_spark_session(app_name='spark-module1', master=None, configs=None):
+    """
+    Cria (ou reaproveita) a sessão Spark configurada para o MinIO.
+
+    master padrão é SPARK_MASTER (local[*]), então a mesma sessão roda no
+    notebook ou em testes contra qualquer S3 local apontado por MINIO_ENDPOINT.
+    configs sobrescreve ou acrescenta configurações.
+    """
+    if SparkSession is None:
+        raise ImportError("A sessão Spark requer o pacote pyspark (incluso na imagem jupyter/pyspark-notebook "
+                          "ou instalado com uv sync --extra spark)")
+    builder = SparkSession.builder.appName(app_name).master(master or SPARK_MASTER)
+    for key, value in dict(spark_configs(), **(configs or {})).items():
+        builder = builder.config(key, value)
+    return builder.getOrCreate()
+
+
+def s3a_path(bucket_name, file_path=''):
+    """URL s3a de um objeto ou prefixo"""
+    return f"s3a://{bucket_name}/{file_path}"
+
+
+def read_dataset(spark, name, files=None, s3_client=None):
+    """
+    Lê um dataset de catalog.DATASETS como DataFrame, com o schema registrado.
+
+    Os arquivos vêm do catálogo (ou de files, entradas do catálogo já
+    filtradas, por exemplo por catalog.find_files), então o Spark não lista
+    o bucket nem infere o schema. Arquivos de formatos diferentes (array
+    JSON e NDJSON) são lidos com as opções de cada um e unidos; colunas de
+    partição (chave=valor/) usam o tipo do schema.
+    """
+    bucket_name, prefix = DATASETS[name]
+    if files is None:
+        files = load_catalog(s3_client or get_s3_client(), bucket_name, prefix)['files'].values()
+    ddl = spark_ddl(dataset_schema(name))
+
+    by_format = {}
+    for entry in files:
+        by_format.setdefault(entry['format'], []).append(s3a_path(bucket_name, entry['key']))
+    frames = [
+        spark.read.format(SPARK_FORMATS[file_format]).schema(ddl).options(**READ_OPTIONS[file_format])
+        .option('basePath', s3a_path(bucket_name, prefix)).load(paths)
+        for file_format, paths in sorted(by_format.items())
+    ]
+    if not frames:
+        return spark.createDataFrame([], ddl)
+    result = frames[0]
+    for frame in frames[1:]:
+        result = result.unionByName(frame)
+    return result
@@ -0,0 +1,750 @@
+#!/usr/bin/env python3
+"""
+Camada de acesso ao MinIO compartilhada pelos scripts
+Cliente S3 único por processo e upload em streaming via multipart upload
+"""
+
+import contextvars
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+import metrics
+import upload_index
+from compression import compressed_file_path, content_encoding_for, open_compressed, split_compression
+
+logger = logging.getLogger(__name__)
+
+# Configuração do MinIO (pode ser sobrescrita por variáveis de ambiente)
+MINIO_ENDPOINT = os.environ.get('MINIO_ENDPOINT', 'localhost:9000')
+MINIO_ACCESS_KEY = os.environ.get('MINIO_ACCESS_KEY', 'minioadmin')
+MINIO_SECRET_KEY = os.environ.get('MINIO_SECRET_KEY', 'minioadmin')
+MINIO_REGION = os.environ.get('MINIO_REGION', 'us-east-1')  # MinIO precisa de uma região
+MINIO_SECURE = os.environ.get('MINIO_SECURE', 'false').lower() in ('1', 'true', 'yes')
+
+# Configuração do pool de conexões e das tentativas
+MINIO_MAX_POOL_CONNECTIONS = int(os.environ.get('MINIO_MAX_POOL_CONNECTIONS', 50))
+MINIO_CONNECT_TIMEOUT = float(os.environ.get('MINIO_CONNECT_TIMEOUT', 5))
+MINIO_READ_TIMEOUT = float(os.environ.get('MINIO_READ_TIMEOUT', 60))
+MINIO_MAX_ATTEMPTS = int(os.environ.get('MINIO_MAX_ATTEMPTS', 5))
+MINIO_RETRY_MODE = os.environ.get('MINIO_RETRY_MODE', 'adaptive')
+
+# O S3/MinIO exige partes de no mínimo 5 MiB (exceto a última)
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Configuração do upload (pode ser sobrescrita por variáveis de ambiente)
+DEFAULT_PART_SIZE = int(os.environ.get('MINIO_UPLOAD_PART_SIZE', 8 * 1024 * 1024))
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get('MINIO_UPLOAD_MAX_CONCURRENCY', 4))
+
+# Configuração do upload de muitos objetos (pode ser sobrescrita por variáveis de ambiente)
+DEFAULT_BULK_WORKERS = int(os.environ.get('MINIO_BULK_UPLOAD_WORKERS', 16))
+DEFAULT_BULK_MAX_ATTEMPTS = int(os.environ.get('MINIO_BULK_UPLOAD_MAX_ATTEMPTS', 3))
+BULK_RETRY_BASE_DELAY = 0.5
+
+# Tentativas de uma atualização condicional de um objeto JSON (catálogos) quando outro processo grava antes
+JSON_UPDATE_MAX_ATTEMPTS = 20
+JSON_UPDATE_BASE_DELAY = 0.05
+
+# Modos de upload: sempre reenviar, pular o conteúdo inalterado ou também retomar uploads interrompidos
+UPLOAD_MODES = ('overwrite', 'skip-unchanged', 'resume')
+UPLOAD_MODE_VARIABLE = 'MINIO_UPLOAD_MODE'
+
+# Modo de upload da etapa atual (--upload-mode); sem valor vale a variável MINIO_UPLOAD_MODE
+_upload_mode = contextvars.ContextVar('upload_mode', default=None)
+
+# Content-Type pela extensão do arquivo
+CONTENT_TYPES = {
+    '.csv': 'text/csv',
+    '.json': 'application/json',
+    '.ndjson': 'application/x-ndjson',
+    '.parquet': 'application/vnd.apache.parquet',
+}
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def create_s3_client():
+    """Cria um cliente S3 para o MinIO com pool de conexões ajustado"""
+    scheme = 'https' if MINIO_SECURE else 'http'
+    config = Config(
+        max_pool_connections=max(MINIO_MAX_POOL_CONNECTIONS, DEFAULT_MAX_CONCURRENCY),
+        tcp_keepalive=True,
+        connect_timeout=MINIO_CONNECT_TIMEOUT,
+        read_timeout=MINIO_READ_TIMEOUT,
+        retries={'total_max_attempts': MINIO_MAX_ATTEMPTS, 'mode': MINIO_RETRY_MODE}
+    )
+    return boto3.session.Session().client(
+        's3',
+        endpoint_url=f'{scheme}://{MINIO_ENDPOINT}',
+        aws_access_key_id=MINIO_ACCESS_KEY,
+        aws_secret_access_key=MINIO_SECRET_KEY,
+        region_name=MINIO_REGION,
+        config=config
+    )
+
+
+def get_s3_client():
+    """
+    Retorna o cliente S3 compartilhado do processo.
+
+    O cliente é criado na primeira chamada e reaproveitado por todas as
+    chamadas e threads seguintes (clientes boto3 são thread-safe), mantendo
+    as conexões abertas no pool. Após um fork um novo cliente é criado,
+    já que conexões não podem ser compartilhadas entre processos.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = create_s3_client()
+                _client_pid = os.getpid()
+    return _client
+
+
+def upload_mode():
+    """Modo de upload do contexto atual (--upload-mode da etapa, ou MINIO_UPLOAD_MODE, padrão: overwrite)"""
+    return _upload_mode.get() or os.environ.get(UPLOAD_MODE_VARIABLE) or 'overwrite'
+
+
+def set_upload_mode(mode):
+    """
+    Define o modo de upload do contexto atual, sem alterar o ambiente do processo.
+
+    No pipeline cada etapa roda em um contexto próprio, então o modo de uma
+    etapa não vale para as outras; os processos workers recebem o modo
+    explicitamente (using_upload_mode).
+    """
+    if mode not in UPLOAD_MODES:
+        raise ValueError(f"Modo de upload desconhecido: {mode} (use {', '.join(UPLOAD_MODES)})")
+    _upload_mode.set(mode)
+
+
+@contextmanager
+def using_upload_mode(mode):
+    """Usa o modo de upload mode dentro do bloco (None mantém o modo atual)"""
+    if mode is not None and mode not in UPLOAD_MODES:
+        raise ValueError(f"Modo de upload desconhecido: {mode} (use {', '.join(UPLOAD_MODES)})")
+    token = _upload_mode.set(mode or _upload_mode.get())
+    try:
+        yield
+    finally:
+        _upload_mode.reset(token)
+
+
+class MultipartUploadWriter(io.RawIOBase):
+    """
+    Arquivo somente escrita que envia o conteúdo para o MinIO em partes.
+
+    Os bytes são acumulados até completar uma parte, que é enviada em uma
+    thread separada enquanto a serialização continua. No máximo
+    max_concurrency partes ficam em voo; ao atingir o limite, write() bloqueia,
+    então a memória fica limitada a algumas partes. Arquivos menores que uma
+    parte são enviados com um único put_object. O Content-Encoding é deduzido
+    da extensão de compressão do arquivo (.gz, .zst).
+
+    mode (padrão: upload_mode()) controla o reenvio de conteúdo já existente:
+    - overwrite: sempre envia tudo;
+    - skip-unchanged: compara o MD5 de cada parte com o índice local do
+      último envio da mesma chave (ou com o ETag/x-amz-meta-content-sha256
+      do objeto, se ele for menor que uma parte). Partes iguais não são
+      enviadas: se o objeto inteiro for igual nada é gravado (skipped), senão
+      elas são copiadas no próprio servidor (upload_part_copy);
+    - resume: além disso, retoma o multipart upload interrompido da chave,
+      reaproveitando as partes já enviadas com o mesmo MD5. Em caso de erro o
+      upload é mantido (não cancelado) para a próxima tentativa.
+    Nos dois últimos modos a saída precisa ser determinística (mesma seed e
+    --as-of) para que as partes coincidam.
+
+    O tempo de cada requisição entra na fase upload das métricas da etapa,
+    junto com os bytes, os objetos concluídos e as retentativas do botocore.
+    """
+
+    def __init__(self, s3_client, bucket_name, file_path, content_type='application/octet-stream',
+                 part_size=DEFAULT_PART_SIZE, max_concurrency=DEFAULT_MAX_CONCURRENCY, mode=None):
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size deve ser de no mínimo {MIN_PART_SIZE} bytes")
+        mode = mode or upload_mode()
+        if mode not in UPLOAD_MODES:
+            raise ValueError(f"Modo de upload desconhecido: {mode} (use {', '.join(UPLOAD_MODES)})")
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.file_path = file_path
+        self.content_type = content_type
+        self.content_encoding = content_encoding_for(file_path)
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+        self.mode = mode
+        self.bytes_written = 0
+        self.skipped = False
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._futures = []
+        self._executor = None
+        self._error = None
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._part_count = 0
+        # Hashes do conteúdo (só nos modos que comparam com envios anteriores)
+        self._sha256 = hashlib.sha256() if mode != 'overwrite' else None
+        self._part_md5s = []
+        self._previous = None
+        self._deferred = []
+        self._resumed = {}
+        self._bytes_reused = 0
+        if mode != 'overwrite':
+            self._load_previous()
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytes_written
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("Escrita em um upload já finalizado")
+        if self._error is not None:
+            raise self._error
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._submit_part(part)
+        return len(data)
+
+    def _load_previous(self):
+        """Carrega o último envio conhecido da chave e, no modo resume, o upload em andamento"""
+        entry = upload_index.load_entry(self.bucket_name, self.file_path) or {}
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=self.file_path)
+        except ClientError:
+            head = None
+        if head is not None:
+            etag = head['ETag'].strip('"')
+            if entry.get('etag') == etag and entry.get('part_size') == self.part_size:
+                self._previous = entry
+            elif '-' not in etag:
+                # Objeto enviado com um único put_object: o ETag é o MD5 do conteúdo
+                self._previous = {'etag': etag, 'size': head['ContentLength'], 'parts': [etag],
+                                  'sha256': head.get('Metadata', {}).get('content-sha256')}
+
+        if self.mode == 'resume' and entry.get('upload_id') and entry.get('part_size') == self.part_size:
+            try:
+                paginator = self.s3_client.get_paginator('list_parts')
+                pages = paginator.paginate(Bucket=self.bucket_name, Key=self.file_path,
+                                           UploadId=entry['upload_id'])
+                self._resumed = {
+                    part['PartNumber']: part['ETag'].strip('"')
+                    for page in pages for part in page.get('Parts', [])
+                }
+            except ClientError:
+                # Upload já concluído, cancelado ou expirado
+                self._save_entry(upload_id=None)
+                return
+            self._upload_id = entry['upload_id']
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+            logger.info(f"Retomando upload de {self.bucket_name}/{self.file_path} "
+                        f"({len(self._resumed)} parte(s) já enviada(s))")
+
+    def _save_entry(self, **fields):
+        entry = upload_index.load_entry(self.bucket_name, self.file_path) or {}
+        entry.update(fields, part_size=self.part_size)
+        upload_index.save_entry(self.bucket_name, self.file_path, entry)
+
+    def _submit_part(self, part):
+        """Envia uma parte em background, respeitando o limite de partes em voo"""
+        self._part_count += 1
+        part_number = self._part_count
+        if self._sha256 is not None:
+            md5 = hashlib.md5(part).hexdigest()
+            self._sha256.update(part)
+            self._part_md5s.append(md5)
+            if self._resumed.get(part_number) == md5:
+                # Parte já enviada antes da interrupção
+                done = Future()
+                done.set_result({'PartNumber': part_number, 'ETag': f'"{md5}"'})
+                self._futures.append(done)
+                self._bytes_reused += len(part)
+                metrics.increment('parts_resumed')
+                return
+            if self._matches_previous(part_number, md5):
+                # Igual à parte do último envio: copiada no servidor, e só depois que o objeto mudar
+                self._deferred.append((part_number, len(part)))
+                if self._upload_id is not None:
+                    self._start_upload()
+                return
+
+        self._start_upload()
+        self._slots.acquire()
+        # As partes são enviadas no contexto da etapa que as escreveu (métricas)
+        future = self._executor.submit(contextvars.copy_context().run, self._upload_part, part_number, part)
+        future.add_done_callback(self._part_done)
+        self._futures.append(future)
+
+    def _matches_previous(self, part_number, md5):
+        parts = (self._previous or {}).get('parts') or []
+        return part_number <= len(parts) and parts[part_number - 1] == md5
+
+    def _start_upload(self):
+        """Cria o multipart upload (se preciso) e copia no servidor as partes iguais adiadas"""
+        if self._upload_id is None:
+            response = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.file_path,
+                **self._object_metadata()
+            )
+            self._upload_id = response['UploadId']
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+            if self.mode == 'resume':
+                self._save_entry(upload_id=self._upload_id)
+
+        for part_number, size in self._deferred:
+            self._slots.acquire()
+            future = self._executor.submit(contextvars.copy_context().run, self._copy_part, part_number, size)
+            future.add_done_callback(self._part_done)
+            self._futures.append(future)
+            self._bytes_reused += size
+        self._deferred = []
+
+    def _object_metadata(self):
+        metadata = {'ContentType': self.content_type}
+        if self.content_encoding:
+            metadata['ContentEncoding'] = self.content_encoding
+        return metadata
+
+    def _part_done(self, future):
+        self._slots.release()
+        if not future.cancelled() and future.exception() is not None:
+            self._error = future.exception()
+
+    def _upload_part(self, part_number, part):
+        with metrics.timed('upload'):
+            response = self.s3_client.upload_part(
+                Bucket=self.bucket_name,
+                Key=self.file_path,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                Body=part
+            )
+        _count_request_retries(response)
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    def _copy_part(self, part_number, size):
+        """Copia uma parte do objeto atual (ainda não substituído) sem reenviar os bytes"""
+        start = (part_number - 1) * self.part_size
+        with metrics.timed('upload'):
+            response = self.s3_client.upload_part_copy(
+                Bucket=self.bucket_name,
+                Key=self.file_path,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                CopySource={'Bucket': self.bucket_name, 'Key': self.file_path},
+                CopySourceRange=f"bytes={start}-{start + size - 1}",
+                CopySourceIfMatch=self._previous['etag']
+            )
+        _count_request_retries(response)
+        metrics.increment('parts_copied')
+        return {'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']}
+
+    def _is_unchanged(self):
+        """O conteúdo escrito é igual ao do último envio (todas as partes adiadas)?"""
+        if self._previous is None or self._upload_id is not None:
+            return False
+        return (len(self._deferred) == self._part_count == len(self._previous['parts'])
+                and self._previous.get('size', self.bytes_written) == self.bytes_written)
+
+    def close(self):
+        """Envia o restante do buffer e conclui o upload"""
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None and not self._deferred:
+                self._put_whole_object()
+            else:
+                if self._buffer or self._part_count == 0:
+                    self._submit_part(bytes(self._buffer))
+                if self._is_unchanged():
+                    self._skip()
+                else:
+                    self._start_upload()
+                    parts = [future.result() for future in self._futures]
+                    with metrics.timed('upload'):
+                        response = self.s3_client.complete_multipart_upload(
+                            Bucket=self.bucket_name,
+                            Key=self.file_path,
+                            UploadId=self._upload_id,
+                            MultipartUpload={'Parts': sorted(parts, key=lambda part: part['PartNumber'])}
+                        )
+                    self._finish(response)
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._buffer = bytearray()
+            self._shutdown()
+            super().close()
+
+    def _put_whole_object(self):
+        """Objeto menor que uma parte: um único put_object (ou nada, se não mudou)"""
+        body = bytes(self._buffer)
+        metadata = self._object_metadata()
+        if self._sha256 is not None:
+            self._sha256.update(body)
+            self._part_md5s.append(hashlib.md5(body).hexdigest())
+            previous = self._previous or {}
+            if previous.get('etag') == self._part_md5s[0] or previous.get('sha256') == self._sha256.hexdigest():
+                self._skip()
+                return
+            metadata['Metadata'] = {'content-sha256': self._sha256.hexdigest()}
+        with metrics.timed('upload'):
+            response = self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=self.file_path,
+                Body=body,
+                **metadata
+            )
+        self._finish(response)
+
+    def _skip(self):
+        self.skipped = True
+        metrics.increment('objects_skipped')
+        metrics.increment('bytes_skipped', self.bytes_written)
+        logger.info(f"{self.bucket_name}/{self.file_path} não mudou desde o último envio, upload ignorado")
+
+    def _finish(self, response):
+        _count_request_retries(response)
+        metrics.increment('objects_uploaded')
+        metrics.increment('bytes_uploaded', self.bytes_written - self._bytes_reused)
+        if self._bytes_reused:
+            metrics.increment('bytes_reused', self._bytes_reused)
+        if self._sha256 is not None:
+            self._save_entry(etag=response['ETag'].strip('"'), sha256=self._sha256.hexdigest(),
+                             size=self.bytes_written, parts=self._part_md5s, upload_id=None)
+
+    def abort(self):
+        """
+        Cancela o multipart upload, descartando as partes já enviadas.
+
+        No modo resume o upload é mantido para ser retomado pela próxima
+        tentativa (use discard=True para descartá-lo mesmo assim).
+        """
+        self._abort(discard=self.mode != 'resume')
+
+    def discard(self):
+        """Cancela o multipart upload em qualquer modo"""
+        self._abort(discard=True)
+
+    def _abort(self, discard):
+        if self._upload_id is not None:
+            for future in self._futures:
+                future.cancel()
+            self._shutdown()
+            if discard:
+                try:
+                    self.s3_client.abort_multipart_upload(
+                        Bucket=self.bucket_name,
+                        Key=self.file_path,
+                        UploadId=self._upload_id
+                    )
+                except Exception as e:
+                    logger.error(f"Erro ao cancelar upload de {self.bucket_name}/{self.file_path}: {e}")
+                if self.mode == 'resume':
+                    self._save_entry(upload_id=None)
+            else:
+                logger.warning(f"Upload de {self.bucket_name}/{self.file_path} interrompido; "
+                               "as partes enviadas serão reaproveitadas na próxima tentativa")
+            self._upload_id = None
+        self._shutdown()
+        if not self.closed:
+            self._buffer = bytearray()
+            super().close()
+
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def _count_request_retries(response):
+    """Soma as retentativas feitas pelo botocore em uma requisição às métricas da etapa"""
+    retries = response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+    if retries:
+        metrics.increment('request_retries', retries)
+
+
+def upload_stream(s3_client, bucket_name, file_path, chunks, content_type='application/octet-stream',
+                  part_size=DEFAULT_PART_SIZE, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """Envia um iterável de blocos de bytes para o MinIO sem montar o arquivo inteiro"""
+    with MultipartUploadWriter(s3_client, bucket_name, file_path, content_type=content_type,
+                               part_size=part_size, max_concurrency=max_concurrency) as writer:
+        for chunk in metrics.timed_iter('serialize', chunks):
+            writer.write(chunk)
+    return writer.bytes_written
+
+
+def rollover_file_path(file_path, index):
+    """Insere o sufixo do bloco no nome do arquivo (ex.: _chunk-00001.ndjson)"""
+    root, ext = os.path.splitext(file_path)
+    return f"{root}_chunk-{index:05d}{ext}"
+
+
+def upload_rolling(s3_client, bucket_name, file_path, chunks, max_object_size=None,
+                   content_type='application/octet-stream', part_size=DEFAULT_PART_SIZE,
+                   max_concurrency=DEFAULT_MAX_CONCURRENCY, on_object=None,
+                   compression=None, compression_level=None):
+    """
+    Envia blocos de bytes abrindo um novo objeto a cada max_object_size bytes.
+
+    A troca de objeto só acontece entre blocos, então cada bloco precisa
+    terminar em um limite de registro (ex.: fim de linha no NDJSON). Sem
+    max_object_size tudo vai para um único objeto com o nome original.
+    Com compression cada objeto é um fluxo gzip/zstd independente (com a
+    extensão do codec), então os objetos podem ser lidos em paralelo, e o
+    limite de tamanho vale para os bytes comprimidos.
+    on_object(chave, bytes) é chamado ao concluir cada objeto, antes de o
+    próximo bloco ser lido. Retorna a lista de chaves gravadas.
+    """
+    if max_object_size is None and compression is None:
+        bytes_written = upload_stream(s3_client, bucket_name, file_path, chunks, content_type=content_type,
+                                      part_size=part_size, max_concurrency=max_concurrency)
+        if on_object is not None:
+            on_object(file_path, bytes_written)
+        return [file_path]
+
+    file_paths = []
+    writer = target = None
+
+    def finish_object():
+        if target is not writer:
+            target.close()
+        writer.close()
+        if on_object is not None:
+            on_object(writer.file_path, writer.bytes_written)
+
+    try:
+        for chunk in metrics.timed_iter('serialize', chunks):
+            if writer is None:
+                path = file_path if max_object_size is None else rollover_file_path(file_path, len(file_paths))
+                file_paths.append(compressed_file_path(path, compression))
+                writer = MultipartUploadWriter(s3_client, bucket_name, file_paths[-1], content_type=content_type,
+                                               part_size=part_size, max_concurrency=max_concurrency)
+                target = open_compressed(writer, compression, compression_level) if compression else writer
+            target.write(chunk)
+            if max_object_size is not None and writer.bytes_written >= max_object_size:
+                finish_object()
+                writer = target = None
+        if writer is not None:
+            finish_object()
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
+    return file_paths
+
+
+def content_type_for(file_path):
+    """Content-Type do objeto pela extensão do arquivo (ignorando a de compressão)"""
+    return CONTENT_TYPES.get(os.path.splitext(split_compression(file_path)[0])[1], 'application/octet-stream')
+
+
+def _upload_body(s3_client, bucket_name, file_path, body, content_type, part_size, max_concurrency):
+    """Envia um corpo de qualquer tipo aceito por bulk_upload e devolve (bytes, se foi ignorado)"""
+    if isinstance(body, (bytes, bytearray, memoryview)) and upload_mode() != 'overwrite':
+        # Nos modos que comparam conteúdo o corpo passa pelo writer, que calcula os hashes
+        body = [bytes(body)]
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        metadata = {'ContentType': content_type}
+        if content_encoding_for(file_path):
+            metadata['ContentEncoding'] = content_encoding_for(file_path)
+        with metrics.timed('upload'):
+            response = s3_client.put_object(Bucket=bucket_name, Key=file_path, Body=bytes(body), **metadata)
+        _count_request_retries(response)
+        metrics.increment('objects_uploaded')
+        metrics.increment('bytes_uploaded', len(body))
+        return len(body), False
+
+    if hasattr(body, 'read'):
+        fileobj = body
+        if fileobj.seekable():
+            fileobj.seek(0)
+        body = iter(lambda: fileobj.read(part_size), b'')
+
+    with MultipartUploadWriter(s3_client, bucket_name, file_path, content_type=content_type,
+                               part_size=part_size, max_concurrency=max_concurrency) as writer:
+        if callable(body):
+            with metrics.timed('serialize'):
+                body(writer)
+        else:
+            for chunk in metrics.timed_iter('serialize', body):
+                writer.write(chunk)
+    return writer.bytes_written, writer.skipped
+
+
+def _is_retryable(body):
+    """Iteradores e arquivos não posicionáveis são consumidos na primeira tentativa"""
+    if isinstance(body, (bytes, bytearray, memoryview)) or callable(body):
+        return True
+    if hasattr(body, 'read'):
+        return body.seekable()
+    return isinstance(body, (list, tuple))
+
+
+def _upload_with_retries(s3_client, item, max_attempts, part_size, max_concurrency):
+    """Envia um objeto, tentando de novo com backoff exponencial, e devolve o status"""
+    bucket_name, file_path, body = item[:3]
+    content_type = item[3] if len(item) > 3 else content_type_for(file_path)
+    attempts = max_attempts if _is_retryable(body) else 1
+
+    start = time.perf_counter()
+    for attempt in range(1, attempts + 1):
+        try:
+            bytes_written, skipped = _upload_body(
+                s3_client, bucket_name, file_path, body, content_type, part_size, max_concurrency
+            )
+            return {'bucket': bucket_name, 'key': file_path, 'status': 'ok', 'bytes': bytes_written,
+                    'skipped': skipped, 'attempts': attempt, 'seconds': time.perf_counter() - start,
+                    'error': None}
+        except Exception as e:
+            if attempt == attempts:
+                logger.error(f"Erro ao enviar {bucket_name}/{file_path} após {attempt} tentativa(s): {e}")
+                metrics.increment('upload_failures')
+                return {'bucket': bucket_name, 'key': file_path, 'status': 'failed', 'bytes': 0, 'skipped': False,
+                        'attempts': attempt, 'seconds': time.perf_counter() - start, 'error': str(e)}
+            delay = BULK_RETRY_BASE_DELAY * 2 ** (attempt - 1)
+            metrics.increment('upload_retries')
+            logger.warning(f"Falha ao enviar {bucket_name}/{file_path} ({e}), nova tentativa em {delay:.1f}s")
+            time.sleep(delay * random.uniform(0.5, 1.5))
+
+
+def bulk_upload(s3_client, items, max_workers=DEFAULT_BULK_WORKERS, max_pending=None,
+                max_attempts=DEFAULT_BULK_MAX_ATTEMPTS, part_size=DEFAULT_PART_SIZE, max_concurrency=1):
+    """
+    Envia muitos objetos em paralelo com um pool de threads limitado.
+
+    items é um iterável de tuplas (bucket, chave, corpo) ou
+    (bucket, chave, corpo, content_type); sem content_type ele é deduzido
+    pela extensão. O corpo pode ser bytes, um arquivo aberto para leitura,
+    um iterável de blocos de bytes ou uma função que recebe o arquivo de
+    destino e escreve nele (ex.: partial(write_parquet, tabela)).
+
+    O iterável é consumido aos poucos: no máximo max_pending objetos (padrão:
+    2 * max_workers) ficam na fila ou em envio, então um gerador de itens não
+    é materializado de uma vez. Cada objeto é tentado até max_attempts vezes
+    (corpos de uso único, como geradores, só uma vez). Cada objeto usa até
+    max_concurrency threads para as partes, já que o paralelismo vem dos
+    vários objetos.
+
+    Retorna um relatório por objeto, na ordem de items, com status ('ok' ou
+    'failed'), bytes, skipped (conteúdo igual ao já gravado, veja
+    MultipartUploadWriter), tentativas, duração e erro. No modo resume a
+    nova tentativa de um objeto retoma o multipart upload da anterior.
+    """
+    max_pending = max_pending or 2 * max_workers
+    slots = threading.BoundedSemaphore(max_pending)
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for item in items:
+            slots.acquire()
+            future = executor.submit(contextvars.copy_context().run, _upload_with_retries,
+                                     s3_client, item, max_attempts, part_size, max_concurrency)
+            future.add_done_callback(lambda _: slots.release())
+            futures.append(future)
+        results = [future.result() for future in futures]
+
+    failed = sum(result['status'] != 'ok' for result in results)
+    skipped = sum(result['skipped'] for result in results)
+    logger.info(f"Upload em lote: {len(results) - failed - skipped} objeto(s) enviado(s), "
+                f"{skipped} inalterado(s), {failed} com erro")
+    return results
+
+
+def list_objects(s3_client, bucket_name, prefix=''):
+    """Lista todos os objetos sob um prefixo (paginando o ListObjectsV2)"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        yield from page.get('Contents', [])
+
+
+def delete_objects(s3_client, bucket_name, keys):
+    """Remove vários objetos, em lotes de até 1000 chaves (limite do DeleteObjects)"""
+    keys = list(keys)
+    for start in range(0, len(keys), 1000):
+        s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={'Objects': [{'Key': key} for key in keys[start:start + 1000]], 'Quiet': True}
+        )
+
+
+def read_json_object(s3_client, bucket_name, file_path, default=None):
+    """Lê um objeto JSON do MinIO (ou devolve default se ele não existir)"""
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=file_path)
+    except s3_client.exceptions.NoSuchKey:
+        return default
+    return json.loads(response['Body'].read())
+
+
+def update_json_object(s3_client, bucket_name, file_path, update_fn, default=None,
+                       max_attempts=JSON_UPDATE_MAX_ATTEMPTS):
+    """
+    Lê um objeto JSON, aplica update_fn e o regrava só se ninguém o gravou no meio.
+
+    A gravação tem a ETag lida como precondição (If-Match, ou If-None-Match
+    quando o objeto ainda não existe). Se outro processo gravou antes, o
+    objeto é lido de novo e update_fn é reaplicada ao conteúdo novo, então
+    nenhuma das alterações se perde. update_fn recebe o conteúdo (ou uma
+    cópia de default) e devolve o que deve ser gravado, que é retornado.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            response = s3_client.get_object(Bucket=bucket_name, Key=file_path)
+            data, precondition = json.loads(response['Body'].read()), {'IfMatch': response['ETag']}
+        except s3_client.exceptions.NoSuchKey:
+            data, precondition = json.loads(json.dumps(default)), {'IfNoneMatch': '*'}
+        data = update_fn(data)
+        try:
+            s3_client.put_object(
+                Bucket=bucket_name,
+                Key=file_path,
+                Body=json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8'),
+                ContentType='application/json',
+                **precondition
+            )
+            return data
+        except ClientError as e:
+            # 412: outro processo gravou o objeto; 409: gravação concorrente ainda em andamento
+            if e.response['Error']['Code'] not in ('PreconditionFailed', 'ConditionalRequestConflict'):
+                raise
+        metrics.increment('conditional_write_retries')
+        time.sleep(JSON_UPDATE_BASE_DELAY * 2 ** min(attempt - 1, 5) * random.uniform(0.5, 1.5))
+    raise RuntimeError(f"{bucket_name}/{file_path} alterado por outro processo em {max_attempts} tentativas seguidas")
+
+
+def write_json_object(s3_client, bucket_name, file_path, data):
+    """Grava um objeto JSON pequeno (manifestos, índices) com um único put_object"""
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=file_path,
+        Body=json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8'),
+        ContentType='application/json'
+    )
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Índice local dos objetos enviados ao MinIO
+Guarda o hash do conteúdo e das partes de cada objeto (e o multipart upload em andamento),
+permitindo pular envios idênticos e retomar uploads interrompidos
+"""
+
+import hashlib
+import json
+import os
+import uuid
+
+# Diretório do índice (um arquivo JSON por objeto, então processos paralelos não disputam o mesmo arquivo)
+UPLOAD_INDEX_DIR = os.environ.get(
+    'DATAGEN_UPLOAD_INDEX', os.path.join(os.path.expanduser('~'), '.cache', 'spark-module1', 'uploads')
+)
+
+
+def index_file_path(bucket_name, file_path):
+    """Caminho da entrada de um objeto no índice"""
+    digest = hashlib.sha1(f"{bucket_name}/{file_path}".encode('utf-8')).hexdigest()
+    return os.path.join(UPLOAD_INDEX_DIR, bucket_name, digest[:2], f"{digest}.json")
+
+
+def load_entry(bucket_name, file_path):
+    """
+    Entrada do objeto no índice, ou None.
+
+    Campos: etag, sha256, size, part_size, parts (MD5 de cada parte) do
+    último envio concluído e upload_id do multipart upload em andamento.
+    """
+    try:
+        with open(index_file_path(bucket_name, file_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_entry(bucket_name, file_path, entry):
+    """Grava a entrada de forma atômica; falhas de disco não interrompem o upload"""
+    path = index_file_path(bucket_name, file_path)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(entry, bucket=bucket_name, key=file_path), f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Validação da qualidade dos dados entre as zonas
+Regras declarativas por dataset (regex, faixas, domínios, unicidade, nulos) avaliadas com
+pyarrow.compute/NumPy sobre colunas inteiras; as linhas rejeitadas vão para a quarentena
+e saem dos arquivos do dataset
+"""
+
+import contextvars
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.json as pajson
+import pyarrow.parquet as pq
+
+import metrics
+from catalog import FORMATS, consolidate_catalog, file_entry, flatten_table, load_catalog, replace_files, to_table
+from compaction import is_compacted
+from compression import compressed_file_path, open_compressed, open_decompressed, split_compression
+from serializers import (batch_to_records, iter_ndjson_chunks, write_csv_batches, write_json_array_batches,
+                         write_ndjson_batches, write_parquet)
+from storage import (MultipartUploadWriter, content_type_for, delete_objects, list_objects, read_json_object,
+                     upload_stream, write_json_object)
+
+logger = logging.getLogger(__name__)
+
+# Linhas rejeitadas (com os motivos) e relatório da validação de cada dataset (ignorados pelo Spark)
+QUARANTINE_DIR = '_quarantine/'
+VALIDATION_MANIFEST = '_validation.json'
+REASONS_COLUMN = '_motivos'
+
+# Registro de cada limpeza (arquivos com linhas rejeitadas substituídos e arquivos gerados sem elas)
+CLEANUP_DIR = '_cleanup/'
+
+WRITE_FUNCTIONS = {
+    'csv': lambda table, out: write_csv_batches(table.to_batches(), out),
+    'json': lambda table, out: write_json_array_batches(table.to_batches(), out),
+    'ndjson': lambda table, out: write_ndjson_batches(table.to_batches(), out),
+    'parquet': write_parquet,
+}
+
+# Bytes de arquivos lidos ao mesmo tempo na validação de um dataset (um arquivo maior roda sozinho)
+DEFAULT_MAX_BYTES_IN_FLIGHT = 256 * 1024 * 1024
+
+# Registros decodificados por vez de um array JSON antes de virarem colunas Arrow
+JSON_BATCH_RECORDS = 50_000
+
+EMAIL_PATTERN = r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$'
+CEP_PATTERN = r'^\d{5}-?\d{3}$'
+UUID_PATTERN = r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
+
+# Faixas aceitas (score no padrão dos birôs brasileiros, de 0 a 1000)
+MAX_SALARY = 1_000_000
+SCORE_RANGE = (0, 1000)
+
+# Regras por dataset (nomes de catalog.DATASETS). Checagens por linha:
+# not_null, unique (repetições dentro do arquivo), regex, range (min/max inclusivos), in e cnpj
+# (formato e dígitos verificadores); null_ratio vale para o arquivo inteiro (max: fração aceita).
+# Valores nulos só são rejeitados por not_null/null_ratio.
+DATASET_RULES = {
+    'landing_csv': [
+        {'check': 'not_null', 'column': 'id'},
+        {'check': 'unique', 'column': 'id'},
+        {'check': 'regex', 'column': 'id', 'pattern': UUID_PATTERN},
+        {'check': 'regex', 'column': 'email', 'pattern': EMAIL_PATTERN},
+        {'check': 'regex', 'column': 'cep', 'pattern': CEP_PATTERN},
+        {'check': 'range', 'column': 'salario', 'min': 0, 'max': MAX_SALARY},
+        {'check': 'in', 'column': 'status', 'values': ['ATIVO', 'INATIVO', 'PENDENTE']},
+        {'check': 'null_ratio', 'column': 'nome', 'max': 0.01},
+    ],
+    'landing_json': [
+        {'check': 'not_null', 'column': 'id'},
+        {'check': 'unique', 'column': 'id'},
+        {'check': 'regex', 'column': 'email', 'pattern': EMAIL_PATTERN},
+        {'check': 'regex', 'column': 'endereco.cep', 'pattern': CEP_PATTERN},
+        {'check': 'cnpj', 'column': 'empresa.cnpj'},
+        {'check': 'range', 'column': 'salario', 'min': 0, 'max': MAX_SALARY},
+        {'check': 'in', 'column': 'status', 'values': ['ATIVO', 'INATIVO', 'PENDENTE']},
+        {'check': 'null_ratio', 'column': 'nome', 'max': 0.01},
+    ],
+    'landing_parquet': [
+        {'check': 'not_null', 'column': 'id'},
+        {'check': 'unique', 'column': 'id'},
+        {'check': 'regex', 'column': 'email', 'pattern': EMAIL_PATTERN},
+        {'check': 'regex', 'column': 'cep', 'pattern': CEP_PATTERN},
+        {'check': 'range', 'column': 'salario', 'min': 0, 'max': MAX_SALARY},
+        {'check': 'range', 'column': 'score_credito', 'min': SCORE_RANGE[0], 'max': SCORE_RANGE[1]},
+        {'check': 'range', 'column': 'limite_credito', 'min': 0},
+        {'check': 'null_ratio', 'column': 'nome', 'max': 0.01},
+    ],
+    'bronze': [
+        {'check': 'not_null', 'column': 'cliente_id'},
+        {'check': 'unique', 'column': 'cliente_id'},
+        {'check': 'regex', 'column': 'email', 'pattern': EMAIL_PATTERN},
+        {'check': 'regex', 'column': 'cep', 'pattern': CEP_PATTERN},
+        {'check': 'range', 'column': 'salario_mensal', 'min': 0, 'max': MAX_SALARY},
+        {'check': 'in', 'column': 'status_cliente', 'values': ['ATIVO', 'INATIVO', 'PENDENTE', 'SUSPENSO']},
+        {'check': 'null_ratio', 'column': 'nome_completo', 'max': 0.01},
+    ],
+    'silver': [
+        {'check': 'not_null', 'column': 'cliente_id'},
+        {'check': 'unique', 'column': 'cliente_id'},
+        {'check': 'regex', 'column': 'dados_pessoais.email_principal', 'pattern': EMAIL_PATTERN},
+        {'check': 'regex', 'column': 'endereco.cep', 'pattern': CEP_PATTERN},
+        {'check': 'range', 'column': 'dados_profissionais.salario_bruto', 'min': 0, 'max': MAX_SALARY},
+        {'check': 'not_null', 'column': 'metadados.data_cadastro'},
+        {'check': 'null_ratio', 'column': 'dados_pessoais.nome_completo', 'max': 0.01},
+    ],
+    'gold': [
+        {'check': 'not_null', 'column': 'cliente_id'},
+        {'check': 'unique', 'column': 'cliente_id'},
+        {'check': 'regex', 'column': 'email', 'pattern': EMAIL_PATTERN},
+        {'check': 'range', 'column': 'idade', 'min': 18, 'max': 120},
+        {'check': 'range', 'column': 'salario_bruto', 'min': 0, 'max': MAX_SALARY},
+        {'check': 'range', 'column': 'score_credito', 'min': SCORE_RANGE[0], 'max': SCORE_RANGE[1]},
+        {'check': 'range', 'column': 'propensao_compra', 'min': 0, 'max': 1},
+        {'check': 'in', 'column': 'categoria_risco', 'values': ['BAIXO', 'MEDIO', 'ALTO']},
+        {'check': 'null_ratio', 'column': 'nome_completo', 'max': 0.01},
+    ],
+}
+
+# CNPJ formatado ou só com os dígitos; posições dos dígitos no formatado e pesos dos verificadores
+CNPJ_PATTERN = r'^(\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}|\d{14})$'
+_CNPJ_DIGIT_POSITIONS = [0, 1, 3, 4, 5, 7, 8, 9, 11, 12, 13, 14, 16, 17]
+_CNPJ_WEIGHTS_1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+_CNPJ_WEIGHTS_2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+
+def rule_name(rule):
+    """Nome da regra nos relatórios e nos motivos de rejeição (ex.: regex:email)"""
+    return f"{rule['check']}:{rule['column']}"
+
+
+def text_columns(rules):
+    """Colunas que precisam ser lidas como texto (ex.: CEP, que no CSV pareceria um número)"""
+    return sorted({rule['column'] for rule in rules if rule['check'] in ('regex', 'cnpj', 'in', 'unique')})
+
+
+def _decoded(column):
+    column = column.combine_chunks() if isinstance(column, pa.ChunkedArray) else column
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    return column
+
+
+def _is_valid(passed):
+    """Máscara NumPy das linhas aprovadas (comparações com nulo contam como aprovadas)"""
+    return pc.fill_null(passed, True).to_numpy(zero_copy_only=False)
+
+
+def _check_not_null(column, rule):
+    return column.is_valid().to_numpy(zero_copy_only=False)
+
+
+def _check_unique(column, rule):
+    # Só a primeira ocorrência de cada valor é aceita
+    encoded = pc.dictionary_encode(column)
+    if len(encoded.dictionary) == len(column) - column.null_count:
+        return np.ones(len(column), dtype=bool)
+    codes = encoded.indices.to_numpy(zero_copy_only=False)
+    valid = np.zeros(len(column), dtype=bool)
+    valid[np.unique(codes, return_index=True)[1]] = True
+    valid[~column.is_valid().to_numpy(zero_copy_only=False)] = True
+    return valid
+
+
+def _check_regex(column, rule):
+    if not pa.types.is_string(column.type):
+        column = column.cast(pa.string())
+    return _is_valid(pc.match_substring_regex(column, rule['pattern']))
+
+
+def _check_range(column, rule):
+    passed = pa.array(np.ones(len(column), dtype=bool))
+    if 'min' in rule:
+        passed = pc.and_(passed, pc.greater_equal(column, rule['min']))
+    if 'max' in rule:
+        passed = pc.and_(passed, pc.less_equal(column, rule['max']))
+    return _is_valid(passed)
+
+
+def _check_in(column, rule):
+    values = pa.array(rule['values'], type=column.type)
+    return _is_valid(pc.or_kleene(pc.is_in(column, value_set=values), column.is_null()))
+
+
+def _char_matrix(strings, width):
+    """Matriz (linhas x width) com os bytes de strings que têm exatamente width bytes"""
+    offsets = np.frombuffer(strings.buffers()[1], dtype=np.int32)[strings.offset:strings.offset + len(strings) + 1]
+    data = np.frombuffer(strings.buffers()[2], dtype=np.uint8)[offsets[0]:offsets[-1]]
+    return data.reshape(-1, width)
+
+
+def _check_cnpj(column, rule):
+    """Formato XX.XXX.XXX/XXXX-XX (ou só os dígitos) e dígitos verificadores, sem laço por linha"""
+    valid = _is_valid(pc.match_substring_regex(column, CNPJ_PATTERN))
+    valid &= column.is_valid().to_numpy(zero_copy_only=False)
+    lengths = pc.utf8_length(column).to_numpy(zero_copy_only=False)
+    for width, positions in ((18, _CNPJ_DIGIT_POSITIONS), (14, slice(None))):
+        rows = np.flatnonzero(valid & (lengths == width))
+        if len(rows) == 0:
+            continue
+        digits = _char_matrix(column.take(pa.array(rows)), width)[:, positions].astype(np.int64) - ord('0')
+        first = digits[:, :12] @ _CNPJ_WEIGHTS_1 % 11
+        first = np.where(first < 2, 0, 11 - first)
+        second = np.column_stack([digits[:, :12], first]) @ _CNPJ_WEIGHTS_2 % 11
+        second = np.where(second < 2, 0, 11 - second)
+        # Sequências repetidas (00.000.000/0000-00) passam no cálculo mas não são CNPJs
+        repeated = (digits == digits[:, :1]).all(axis=1)
+        valid[rows] = (digits[:, 12] == first) & (digits[:, 13] == second) & ~repeated
+    # Nulos só são rejeitados por not_null
+    valid[~column.is_valid().to_numpy(zero_copy_only=False)] = True
+    return valid
+
+
+# Checagens por linha: devolvem a máscara das linhas aprovadas
+ROW_CHECKS = {
+    'not_null': _check_not_null,
+    'unique': _check_unique,
+    'regex': _check_regex,
+    'range': _check_range,
+    'in': _check_in,
+    'cnpj': _check_cnpj,
+}
+
+
+def _check_null_ratio(column, rule):
+    return column.null_count <= rule['max'] * len(column)
+
+
+# Checagens do arquivo inteiro: se falharem, todas as linhas são rejeitadas
+TABLE_CHECKS = {
+    'null_ratio': _check_null_ratio,
+}
+
+
+def check_table(data, rules):
+    """
+    Avalia as regras sobre uma tabela Arrow, RecordBatch ou DataFrame.
+
+    Structs são expandidos, então as regras usam nomes pontuados
+    (endereco.cep). Regras de colunas ausentes (ex.: a coluna de partição,
+    que fica só no caminho) são ignoradas e listadas no relatório.
+    Retorna (máscara NumPy das linhas válidas, motivos por linha — lista
+    separada por vírgulas, vazia nas válidas —, relatório).
+    """
+    table = flatten_table(to_table(data))
+    num_rows = table.num_rows
+    valid = np.ones(num_rows, dtype=bool)
+    reasons = np.full(num_rows, '', dtype=object)
+    report = {'rows': num_rows, 'rejected': 0, 'violations': {}, 'failed_checks': [], 'skipped_checks': []}
+
+    with metrics.timed('validate'):
+        for rule in rules:
+            name = rule_name(rule)
+            if rule['column'] not in table.column_names:
+                report['skipped_checks'].append(name)
+                continue
+            column = _decoded(table.column(rule['column']))
+            if pa.types.is_null(column.type) and rule['check'] in ROW_CHECKS and rule['check'] != 'not_null':
+                # Coluna só com nulos no arquivo (tipo null): nulos só são rejeitados por not_null
+                continue
+            if rule['check'] in TABLE_CHECKS:
+                if TABLE_CHECKS[rule['check']](column, rule):
+                    continue
+                report['failed_checks'].append(name)
+                failed = np.ones(num_rows, dtype=bool)
+            elif rule['check'] in ROW_CHECKS:
+                failed = ~ROW_CHECKS[rule['check']](column, rule)
+            else:
+                raise ValueError(f"Checagem desconhecida: {rule['check']}")
+            count = int(failed.sum())
+            if count:
+                report['violations'][name] = count
+                reasons[failed & ~valid] += ','
+                reasons[failed] += name
+                valid &= ~failed
+
+    report['rejected'] = int(num_rows - valid.sum())
+    metrics.increment('rows_validated', num_rows)
+    metrics.increment('rows_rejected', report['rejected'])
+    return valid, reasons, report
+
+
+def quarantine_file_path(prefix, file_path):
+    """Caminho da quarentena de um arquivo do dataset (NDJSON, com as mesmas partições)"""
+    relative_path = os.path.splitext(split_compression(file_path)[0][len(prefix):])[0]
+    return f"{prefix}{QUARANTINE_DIR}{relative_path}.ndjson"
+
+
+def _jsonable(table):
+    """Datas e enums viram texto para que as linhas possam ser gravadas em JSON"""
+    for index, field in enumerate(table.schema):
+        if pa.types.is_temporal(field.type) or pa.types.is_dictionary(field.type):
+            table = table.set_column(index, field.name, table.column(index).cast(pa.string()))
+    return table
+
+
+def quarantine_rows(s3_client, bucket_name, file_path, data, valid, reasons):
+    """Grava as linhas rejeitadas em NDJSON, com a coluna _motivos; devolve os bytes gravados"""
+    rejected = np.flatnonzero(~valid)
+    table = _jsonable(to_table(data).take(pa.array(rejected)))
+    table = table.append_column(REASONS_COLUMN, pa.array(reasons[rejected], type=pa.string()))
+    chunks = iter_ndjson_chunks(batch_to_records(batch) for batch in table.to_batches())
+    return upload_stream(s3_client, bucket_name, file_path, chunks, content_type='application/x-ndjson')
+
+
+def _read_json_array(text):
+    """Decodifica um array JSON em lotes de registros, sem manter o array inteiro como objetos Python"""
+    decoder = json.JSONDecoder()
+    whitespace = ' \t\r\n,'
+    position = text.index('[') + 1
+    tables, records = [], []
+    while True:
+        while position < len(text) and text[position] in whitespace:
+            position += 1
+        if position >= len(text) or text[position] == ']':
+            break
+        record, position = decoder.raw_decode(text, position)
+        records.append(record)
+        if len(records) == JSON_BATCH_RECORDS:
+            tables.append(pa.Table.from_pylist(records))
+            records = []
+    if records or not tables:
+        tables.append(pa.Table.from_pylist(records))
+    return pa.concat_tables(tables, promote_options='default')
+
+
+def read_table(s3_client, bucket_name, entry, rules=(), as_text=False):
+    """
+    Lê um arquivo do catálogo como tabela Arrow (colunas de texto das regras lidas como texto).
+
+    Com as_text o arquivo é lido sem inferência de tipos (todas as colunas
+    de um CSV como texto, datas de um NDJSON como texto), para que as
+    linhas possam ser regravadas sem mudar os valores (zeros à esquerda,
+    casas decimais, formato das datas).
+    """
+    raw = s3_client.get_object(Bucket=bucket_name, Key=entry['key'])['Body'].read()
+    data = open_decompressed(io.BytesIO(raw), entry.get('compression')).read()
+    if entry['format'] == 'csv':
+        # Endereços do Faker têm quebras de linha dentro das aspas
+        parse_options = pacsv.ParseOptions(newlines_in_values=True)
+        column_names = text_columns(rules)
+        if as_text:
+            column_names = pacsv.open_csv(io.BytesIO(data), parse_options=parse_options).schema.names
+        column_types = {column: pa.string() for column in column_names}
+        return pacsv.read_csv(io.BytesIO(data), parse_options=parse_options,
+                              convert_options=pacsv.ConvertOptions(column_types=column_types))
+    if entry['format'] == 'ndjson':
+        if as_text:
+            lines = data.decode('utf-8').splitlines()
+            return pa.Table.from_pylist([json.loads(line) for line in lines if line.strip()])
+        return pajson.read_json(io.BytesIO(data))
+    if entry['format'] == 'json':
+        return _read_json_array(data.decode('utf-8'))
+    if entry['format'] == 'parquet':
+        return pq.read_table(io.BytesIO(data))
+    raise ValueError(f"Formato não suportado na validação: {entry['format']}")
+
+
+def write_table_file(s3_client, bucket_name, file_path, table):
+    """Grava uma tabela no formato (e compressão) indicado pela extensão e devolve a entrada do catálogo"""
+    root, compression = split_compression(file_path)
+    write_fn = WRITE_FUNCTIONS[FORMATS[os.path.splitext(root)[1]]]
+    with MultipartUploadWriter(s3_client, bucket_name, file_path, content_type=content_type_for(file_path)) as writer:
+        if compression:
+            with open_compressed(writer, compression) as out:
+                write_fn(table, out)
+        else:
+            write_fn(table, writer)
+    return file_entry(file_path, table, writer.bytes_written)
+
+
+def cleaned_file_path(file_path, timestamp):
+    """Caminho do arquivo regravado sem as linhas rejeitadas, no mesmo diretório e formato do original"""
+    root, compression = split_compression(file_path)
+    root, ext = os.path.splitext(root)
+    # Limpezas sucessivas não acumulam sufixos
+    root = root.split('_valid-')[0]
+    return compressed_file_path(f"{root}_valid-{timestamp}{ext}", compression)
+
+
+def validate_file(s3_client, bucket_name, prefix, entry, rules, output_path=None):
+    """
+    Valida um arquivo do dataset e grava as linhas rejeitadas na quarentena.
+
+    Com output_path e alguma linha rejeitada, as linhas válidas são gravadas
+    em output_path (nada é gravado se todas foram rejeitadas). Devolve
+    (relatório, entrada do catálogo do arquivo limpo ou None).
+    """
+    table = read_table(s3_client, bucket_name, entry, rules)
+    valid, reasons, report = check_table(table, rules)
+    report['quarantine_key'] = None
+    output = None
+    if report['rejected']:
+        if entry['format'] in ('csv', 'ndjson'):
+            # Quarentena e arquivo limpo com os valores como estão no arquivo
+            table = read_table(s3_client, bucket_name, entry, as_text=True)
+        report['quarantine_key'] = quarantine_file_path(prefix, entry['key'])
+        quarantine_rows(s3_client, bucket_name, report['quarantine_key'], table, valid, reasons)
+        if output_path is not None and valid.any():
+            output = write_table_file(s3_client, bucket_name, output_path, table.filter(pa.array(valid)))
+    report['validated_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return report, output
+
+
+def _apply_cleanup(s3_client, bucket_name, prefix, log_path, log):
+    """Troca os arquivos no catálogo, remove os substituídos e marca a limpeza como concluída"""
+    replace_files(s3_client, bucket_name, prefix, log['replaced'], log['outputs'])
+    delete_objects(s3_client, bucket_name, log['replaced'])
+    log['status'] = 'done'
+    log['finished_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    write_json_object(s3_client, bucket_name, log_path, log)
+
+
+def recover_pending(s3_client, bucket_name, prefix):
+    """Conclui limpezas interrompidas depois de os arquivos novos terem sido gravados"""
+    for obj in list_objects(s3_client, bucket_name, prefix + CLEANUP_DIR):
+        log = read_json_object(s3_client, bucket_name, obj['Key'])
+        if log and log.get('status') == 'pending':
+            logger.info(f"Concluindo limpeza interrompida {bucket_name}/{obj['Key']}")
+            _apply_cleanup(s3_client, bucket_name, prefix, obj['Key'], log)
+
+
+def validate_dataset(s3_client, bucket_name, prefix, rules, workers=4, revalidate=False, report_only=False,
+                     max_bytes_in_flight=DEFAULT_MAX_BYTES_IN_FLIGHT):
+    """
+    Valida os arquivos do catálogo de um dataset ainda não validados, em paralelo.
+
+    Os relatórios por arquivo ficam em _validation.json (só os arquivos que
+    continuam no catálogo), então cada execução só lê os arquivos novos; com
+    revalidate todos são lidos de novo. Arquivos da compactação são
+    ignorados, já que as linhas deles vieram de arquivos já validados.
+    Arquivos são lidos em paralelo até somarem max_bytes_in_flight bytes.
+
+    As linhas rejeitadas vão para a quarentena e, sem report_only, saem do
+    dataset: como na compactação, os arquivos sem elas são gravados
+    primeiro, a limpeza é registrada em _cleanup/ e o catálogo troca os
+    arquivos em uma única gravação antes de os antigos serem removidos.
+    Retorna um resumo com arquivos, linhas, rejeitadas, arquivos limpos e falhas.
+    """
+    recover_pending(s3_client, bucket_name, prefix)
+    manifest_path = prefix + VALIDATION_MANIFEST
+    manifest = read_json_object(s3_client, bucket_name, manifest_path, default={'files': {}})
+    consolidate_catalog(s3_client, bucket_name, prefix)
+    catalog = load_catalog(s3_client, bucket_name, prefix)
+    pending = [
+        entry for key, entry in sorted(catalog['files'].items())
+        if not is_compacted(key) and (revalidate or key not in manifest['files'])
+    ]
+
+    summary = {'bucket': bucket_name, 'prefix': prefix, 'files': len(pending), 'rows': 0, 'rejected': 0,
+               'cleaned': 0, 'failed': 0, 'violations': {}}
+    timestamp = int(time.time() * 1000)
+    # Limite de bytes lidos ao mesmo tempo: arquivos grandes ocupam memória várias vezes o seu tamanho
+    budget = threading.Condition()
+    free = [max_bytes_in_flight]
+
+    def validate_within_budget(entry):
+        size = min(entry['bytes'], max_bytes_in_flight)
+        with budget:
+            budget.wait_for(lambda: free[0] >= size)
+            free[0] -= size
+        output_path = None if report_only else cleaned_file_path(entry['key'], timestamp)
+        try:
+            return validate_file(s3_client, bucket_name, prefix, entry, rules, output_path)
+        finally:
+            with budget:
+                free[0] += size
+                budget.notify_all()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, validate_within_budget, entry)
+            for entry in pending
+        ]
+    replaced, outputs = [], []
+    for entry, future in zip(pending, futures):
+        try:
+            report, output = future.result()
+        except Exception as e:
+            logger.error(f"Erro ao validar {bucket_name}/{entry['key']}: {e}")
+            summary['failed'] += 1
+            continue
+        manifest['files'][entry['key']] = report
+        if report['rejected'] and not report_only:
+            replaced.append(entry['key'])
+            if output is not None:
+                outputs.append(output)
+                # O arquivo limpo já está validado
+                manifest['files'][output['key']] = dict(report, cleaned_from=entry['key'])
+        summary['rows'] += report['rows']
+        summary['rejected'] += report['rejected']
+        for name, count in report['violations'].items():
+            summary['violations'][name] = summary['violations'].get(name, 0) + count
+        if report['rejected']:
+            logger.warning(f"{bucket_name}/{entry['key']}: {report['rejected']} de {report['rows']} linha(s) "
+                           f"rejeitada(s) -> {report['quarantine_key']}")
+
+    if replaced:
+        log_path = f"{prefix}{CLEANUP_DIR}cleanup_{timestamp}.json"
+        log = {
+            'status': 'pending',
+            'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'replaced': replaced,
+            'outputs': outputs,
+        }
+        write_json_object(s3_client, bucket_name, log_path, log)
+        _apply_cleanup(s3_client, bucket_name, prefix, log_path, log)
+        summary['cleaned'] = len(replaced)
+
+    keys = (set(catalog['files']) - set(replaced)) | {output['key'] for output in outputs}
+    manifest['files'] = {key: report for key, report in manifest['files'].items() if key in keys}
+    write_json_object(s3_client, bucket_name, manifest_path, manifest)
+    return summary
@@ -0,0 +1,80 @@
+"""
+Fixtures dos testes: S3 local (moto em processo) e módulos de src/02_setup no sys.path
+"""
+
+import logging
+import os
+import socket
+import sys
+import uuid
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETUP_DIR = os.path.join(ROOT_DIR, 'src', '02_setup')
+sys.path.insert(0, SETUP_DIR)
+
+logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+# O storage lê a configuração do MinIO ao ser importado, então o endpoint é definido antes
+MOTO_PORT = free_port()
+os.environ['MINIO_ENDPOINT'] = f"127.0.0.1:{MOTO_PORT}"
+os.environ['MINIO_SECURE'] = 'false'
+os.environ['MINIO_MAX_ATTEMPTS'] = '1'
+os.environ.pop('MINIO_UPLOAD_MODE', None)
+
+
+@pytest.fixture(scope='session')
+def s3_server():
+    """Servidor moto compartilhado pelos testes da sessão"""
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=MOTO_PORT)
+    server.start()
+    yield
+    server.stop()
+
+
+@pytest.fixture
+def s3(s3_server):
+    from storage import get_s3_client
+
+    return get_s3_client()
+
+
+@pytest.fixture
+def bucket(s3):
+    """Bucket novo por teste, para que os testes não vejam os objetos uns dos outros"""
+    name = f"test-{uuid.uuid4().hex[:12]}"
+    s3.create_bucket(Bucket=name)
+    return name
+
+
+@pytest.fixture(autouse=True)
+def upload_index_dir(tmp_path, monkeypatch):
+    """Índice local de uploads isolado por teste"""
+    import upload_index
+
+    monkeypatch.setattr(upload_index, 'UPLOAD_INDEX_DIR', str(tmp_path / 'uploads'))
+    return upload_index.UPLOAD_INDEX_DIR
+
+
+@pytest.fixture
+def counters():
+    """Devolve uma função com os contadores de métricas registrados desde o início do teste"""
+    import metrics
+
+    metrics.drain()
+
+    def collect():
+        return metrics.drain().get(metrics.current_stage(), {}).get('counters', {})
+
+    yield collect
+    metrics.drain()
@@ -0,0 +1,52 @@
+"""
+plan_bins: agrupamento dos arquivos pequenos do catálogo em lotes de compactação
+"""
+
+from datetime import datetime
+
+from compaction import plan_bins
+
+MB = 1024 * 1024
+
+
+def entry(key, size, file_format='parquet', compression=None, fingerprint='a', created_at='2024-01-01 10:00:00'):
+    return {'key': key, 'bytes': size, 'format': file_format, 'compression': compression,
+            'schema_fingerprint': fingerprint, 'created_at': created_at}
+
+
+def keys(bins):
+    return [[file['key'] for file in files] for files in bins]
+
+
+def test_bins_respect_target_size():
+    entries = [entry(f"p/part_{index}.parquet", 40 * MB) for index in range(5)]
+
+    bins = plan_bins(entries, target_size=100 * MB, small_file_size=64 * MB)
+
+    assert keys(bins) == [['p/part_0.parquet', 'p/part_1.parquet'], ['p/part_2.parquet', 'p/part_3.parquet']]
+
+
+def test_files_are_grouped_by_partition_format_and_schema():
+    entries = [
+        entry('regiao=Sul/a.parquet', MB), entry('regiao=Sul/b.parquet', MB),
+        entry('regiao=Norte/c.parquet', MB), entry('regiao=Norte/d.parquet', MB, fingerprint='b'),
+        entry('regiao=Sul/e.ndjson.gz', MB, file_format='ndjson', compression='gzip'),
+        entry('regiao=Sul/f.ndjson', MB, file_format='ndjson'),
+    ]
+
+    assert keys(plan_bins(entries)) == [['regiao=Sul/a.parquet', 'regiao=Sul/b.parquet']]
+
+
+def test_large_recent_binary_and_ineligible_files_are_left_out():
+    entries = [
+        entry('p/a.parquet', MB), entry('p/b.parquet', MB),
+        entry('p/big.parquet', 64 * MB),
+        entry('p/new.parquet', MB, created_at='2024-01-02 00:00:00'),
+        entry('p/doc.pdf', MB, file_format='binary'),
+        entry('p/late.parquet', MB),
+    ]
+
+    bins = plan_bins(entries, small_file_size=64 * MB, created_before=datetime(2024, 1, 1, 12),
+                     eligible=lambda key: key != 'p/late.parquet')
+
+    assert keys(bins) == [['p/a.parquet', 'p/b.parquet']]
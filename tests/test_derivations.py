@@ -0,0 +1,85 @@
+"""
+derive_table: colunas derivadas das regras sobre tabelas e lotes Arrow
+"""
+
+from datetime import date
+
+import pyarrow as pa
+
+from derivations import GOLD_RULES, SILVER_RULES, derive_table
+from schemas import GOLD_SCHEMA
+
+REFERENCE_DATE = date(2024, 1, 31)
+
+
+def gold_source():
+    return pa.table({
+        'idade': pa.array([25, 30, 49, 50, None], type=pa.int16()),
+        'salario_bruto': [4999.99, 5000.0, 9999.0, 10000.0, None],
+        'score_credito': pa.array([599, 600, 700, 701, None], type=pa.int16()),
+        'data_cadastro': pa.array([date(2024, 1, 1), date(2024, 1, 31), date(2023, 1, 31), None, None]),
+    })
+
+
+def test_bucket_and_days_since_rules():
+    table = derive_table(gold_source(), GOLD_RULES, reference_date=REFERENCE_DATE)
+
+    assert table.column('faixa_etaria').to_pylist() == ['JOVEM', 'ADULTO', 'ADULTO', 'SENIOR', None]
+    assert table.column('faixa_salarial').to_pylist() == ['BAIXA', 'MEDIA', 'MEDIA', 'ALTA', None]
+    # Com right, o limite fica na faixa de baixo (score 700 ainda é risco MEDIO)
+    assert table.column('categoria_risco').to_pylist() == ['ALTO', 'ALTO', 'MEDIO', 'BAIXO', None]
+    assert table.column('dias_desde_cadastro').to_pylist() == [30, 0, 365, None, None]
+
+
+def test_schema_types_are_applied():
+    table = derive_table(gold_source(), GOLD_RULES, reference_date=REFERENCE_DATE, schema=GOLD_SCHEMA)
+
+    for column in GOLD_RULES:
+        assert table.schema.field(column).type == GOLD_SCHEMA.field(column).type
+
+
+def test_existing_columns_are_replaced_in_place():
+    source = gold_source().append_column('faixa_etaria', pa.array(['X'] * 5)).append_column('extra', pa.array([1] * 5))
+
+    table = derive_table(source, GOLD_RULES, reference_date=REFERENCE_DATE)
+
+    assert table.column_names == ['idade', 'salario_bruto', 'score_credito', 'data_cadastro', 'faixa_etaria',
+                                  'extra', 'faixa_salarial', 'categoria_risco', 'dias_desde_cadastro']
+    assert table.column('faixa_etaria').to_pylist()[0] == 'JOVEM'
+
+
+def test_record_batch_in_record_batch_out():
+    batch = gold_source().to_batches()[0]
+
+    derived = derive_table(batch, GOLD_RULES, reference_date=REFERENCE_DATE)
+
+    assert isinstance(derived, pa.RecordBatch)
+    assert derived.num_rows == 5
+
+
+def test_empty_batch_and_table():
+    empty = gold_source().schema.empty_table()
+
+    batch = derive_table(pa.RecordBatch.from_pylist([], schema=empty.schema), GOLD_RULES, schema=GOLD_SCHEMA)
+    table = derive_table(empty, GOLD_RULES, schema=GOLD_SCHEMA)
+
+    assert isinstance(batch, pa.RecordBatch)
+    assert batch.num_rows == 0
+    assert batch.schema == table.schema
+    assert table.schema.field('dias_desde_cadastro').type == pa.int16()
+
+
+def test_silver_rules_read_nested_fields():
+    table = pa.table({
+        'id': ['a', 'b'],
+        'dados_profissionais': pa.array([{'salario_bruto': 12000.0}, {'salario_bruto': 3000.0}]),
+        # Datas como texto, como nos JSON do SAP
+        'metadados': pa.array([{'data_cadastro': '2024-01-21'}, {'data_cadastro': None}]),
+    })
+
+    derived = derive_table(table, SILVER_RULES, reference_date=REFERENCE_DATE, schema=GOLD_SCHEMA)
+
+    # Os structs continuam como estão; só as colunas derivadas são acrescentadas
+    assert derived.column_names == ['id', 'dados_profissionais', 'metadados', 'faixa_salarial', 'dias_desde_cadastro']
+    assert derived.column('faixa_salarial').to_pylist() == ['ALTA', 'BAIXA']
+    assert derived.column('dias_desde_cadastro').to_pylist() == [10, None]
@@ -0,0 +1,81 @@
+"""
+KeyIndex: reivindicação, devolução e gravação das chaves em segmentos no bucket
+"""
+
+import numpy as np
+
+import key_index
+from key_index import KEY_INDEX_DIR, KeyIndex
+
+PREFIX = 'dataway/bronze/clients/'
+
+
+def segment_keys(s3, bucket):
+    response = s3.list_objects_v2(Bucket=bucket, Prefix=PREFIX + KEY_INDEX_DIR)
+    return [obj['Key'] for obj in response.get('Contents', [])]
+
+
+def test_claim_marks_first_occurrence_of_new_keys(s3, bucket):
+    index = KeyIndex(s3, bucket, PREFIX)
+
+    is_new = index.claim(['1', '2', '1', None, '3', None])
+
+    assert is_new.tolist() == [True, True, False, True, True, True]
+    # Chaves reivindicadas contam para os lotes seguintes da mesma execução
+    assert index.claim(['3', '4']).tolist() == [False, True]
+    assert len(index) == 4
+
+
+def test_claim_treats_numbers_and_text_alike(s3, bucket):
+    index = KeyIndex(s3, bucket, PREFIX)
+    index.claim([10, 20])
+
+    assert index.claim(['10', '30']).tolist() == [False, True]
+
+
+def test_release_returns_keys_of_failed_batch(s3, bucket):
+    index = KeyIndex(s3, bucket, PREFIX)
+    index.claim(['1', '2'])
+
+    index.release(['2'])
+
+    assert index.claim(['1', '2']).tolist() == [False, True]
+
+
+def test_commit_persists_keys_for_next_run(s3, bucket):
+    index = KeyIndex(s3, bucket, PREFIX)
+    index.claim(['1', '2', '3'])
+    index.release(['3'])
+
+    assert index.commit() == 2
+    assert index.commit() == 0
+    assert len(segment_keys(s3, bucket)) == 1
+
+    reloaded = KeyIndex(s3, bucket, PREFIX)
+    assert len(reloaded) == 2
+    assert reloaded.contains(['1', '2', '3', None]).tolist() == [True, True, False, False]
+    assert reloaded.claim(['2', '3']).tolist() == [False, True]
+
+
+def test_segments_are_sorted_and_merged(s3, bucket, monkeypatch):
+    monkeypatch.setattr(key_index, 'MAX_SEGMENTS', 2)
+    index = KeyIndex(s3, bucket, PREFIX)
+    for batch in (['5', '1'], ['4', '2'], ['3']):
+        index.claim(batch)
+        index.commit()
+
+    [key] = segment_keys(s3, bucket)
+    hashes = key_index.read_hashes(s3, bucket, key)
+    assert hashes.dtype == np.uint64
+    assert len(hashes) == 5
+    assert (np.diff(hashes.astype(np.float64)) > 0).all()
+    assert KeyIndex(s3, bucket, PREFIX).contains([str(value) for value in range(1, 7)]).tolist() == [True] * 5 + [False]
+
+
+def test_indexes_of_other_prefixes_are_independent(s3, bucket):
+    index = KeyIndex(s3, bucket, PREFIX)
+    index.claim(['1'])
+    index.commit()
+
+    other = KeyIndex(s3, bucket, 'dataway/bronze/products/')
+    assert other.claim(['1']).tolist() == [True]
@@ -0,0 +1,227 @@
+"""
+MultipartUploadWriter nos modos overwrite, skip-unchanged e resume
+"""
+
+import os
+from concurrent.futures import wait
+
+import pytest
+
+from storage import MIN_PART_SIZE, MultipartUploadWriter, using_upload_mode
+
+PART_SIZE = MIN_PART_SIZE
+
+
+def payload(size, seed=0):
+    """Bytes pseudoaleatórios (determinísticos pela seed)"""
+    import numpy as np
+
+    return np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def upload(s3, bucket, key, data, mode, chunk_size=1024 * 1024):
+    with MultipartUploadWriter(s3, bucket, key, part_size=PART_SIZE, mode=mode) as writer:
+        for start in range(0, len(data), chunk_size):
+            writer.write(data[start:start + chunk_size])
+    return writer
+
+
+def read_object(s3, bucket, key):
+    return s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+
+
+def etag(s3, bucket, key):
+    return s3.head_object(Bucket=bucket, Key=key)['ETag']
+
+
+def pending_uploads(s3, bucket):
+    return s3.list_multipart_uploads(Bucket=bucket).get('Uploads', [])
+
+
+def test_small_object_uses_single_put(s3, bucket, counters):
+    writer = upload(s3, bucket, 'small.csv', b'a,b\n1,2\n', 'overwrite')
+
+    assert writer.bytes_written == 8
+    assert read_object(s3, bucket, 'small.csv') == b'a,b\n1,2\n'
+    assert '-' not in etag(s3, bucket, 'small.csv')
+    assert counters()['objects_uploaded'] == 1
+
+
+def test_overwrite_uploads_parts(s3, bucket, counters):
+    data = payload(2 * PART_SIZE + 1000)
+    upload(s3, bucket, 'data.bin', data, 'overwrite')
+    upload(s3, bucket, 'data.bin', data, 'overwrite')
+
+    assert read_object(s3, bucket, 'data.bin') == data
+    assert etag(s3, bucket, 'data.bin').strip('"').endswith('-3')
+    recorded = counters()
+    assert recorded['objects_uploaded'] == 2
+    assert recorded['bytes_uploaded'] == 2 * len(data)
+    assert 'objects_skipped' not in recorded
+
+
+def test_gzip_extension_sets_content_encoding(s3, bucket):
+    upload(s3, bucket, 'data.ndjson.gz', b'\x1f\x8b', 'overwrite')
+
+    assert s3.head_object(Bucket=bucket, Key='data.ndjson.gz')['ContentEncoding'] == 'gzip'
+
+
+def test_exception_aborts_multipart_upload(s3, bucket):
+    with pytest.raises(RuntimeError):
+        with MultipartUploadWriter(s3, bucket, 'data.bin', part_size=PART_SIZE, mode='overwrite') as writer:
+            writer.write(payload(PART_SIZE + 10))
+            raise RuntimeError('falha na serialização')
+
+    assert pending_uploads(s3, bucket) == []
+    assert s3.list_objects_v2(Bucket=bucket).get('KeyCount') == 0
+
+
+def test_unknown_mode_is_rejected(s3, bucket):
+    with pytest.raises(ValueError):
+        MultipartUploadWriter(s3, bucket, 'data.bin', mode='append')
+
+
+def test_upload_mode_comes_from_context(s3, bucket):
+    with using_upload_mode('skip-unchanged'):
+        writer = MultipartUploadWriter(s3, bucket, 'data.bin')
+        writer.close()
+    assert writer.mode == 'skip-unchanged'
+    assert MultipartUploadWriter(s3, bucket, 'other.bin').mode == 'overwrite'
+
+
+def test_skip_unchanged_skips_identical_object(s3, bucket, counters):
+    data = payload(2 * PART_SIZE + 1000)
+    upload(s3, bucket, 'data.bin', data, 'skip-unchanged')
+    first_etag = etag(s3, bucket, 'data.bin')
+    counters()
+
+    writer = upload(s3, bucket, 'data.bin', data, 'skip-unchanged')
+
+    assert writer.skipped
+    assert etag(s3, bucket, 'data.bin') == first_etag
+    recorded = counters()
+    assert recorded['objects_skipped'] == 1
+    assert recorded['bytes_skipped'] == len(data)
+    assert 'objects_uploaded' not in recorded
+    assert pending_uploads(s3, bucket) == []
+
+
+def test_skip_unchanged_copies_unchanged_parts(s3, bucket, counters):
+    data = payload(2 * PART_SIZE + 1000)
+    upload(s3, bucket, 'data.bin', data, 'skip-unchanged')
+    counters()
+
+    # Só a última parte muda: as duas primeiras são copiadas no servidor
+    changed = data[:2 * PART_SIZE] + payload(2000, seed=1)
+    writer = upload(s3, bucket, 'data.bin', changed, 'skip-unchanged')
+
+    assert not writer.skipped
+    assert read_object(s3, bucket, 'data.bin') == changed
+    recorded = counters()
+    assert recorded['parts_copied'] == 2
+    assert recorded['bytes_reused'] == 2 * PART_SIZE
+    assert recorded['bytes_uploaded'] == 2000
+
+
+def test_skip_unchanged_reuploads_changed_first_part(s3, bucket, counters):
+    data = payload(2 * PART_SIZE)
+    upload(s3, bucket, 'data.bin', data, 'skip-unchanged')
+    counters()
+
+    changed = payload(PART_SIZE, seed=1) + data[PART_SIZE:]
+    upload(s3, bucket, 'data.bin', changed, 'skip-unchanged')
+
+    assert read_object(s3, bucket, 'data.bin') == changed
+    assert counters()['parts_copied'] == 1
+
+
+def test_skip_unchanged_small_object_without_index(s3, bucket, counters, upload_index_dir):
+    # Enviado sem o índice local: a comparação usa o ETag (MD5) do objeto
+    s3.put_object(Bucket=bucket, Key='small.csv', Body=b'a,b\n1,2\n')
+
+    writer = upload(s3, bucket, 'small.csv', b'a,b\n1,2\n', 'skip-unchanged')
+    assert writer.skipped
+    assert not os.path.exists(upload_index_dir)
+
+    writer = upload(s3, bucket, 'small.csv', b'a,b\n1,3\n', 'skip-unchanged')
+    assert not writer.skipped
+    assert read_object(s3, bucket, 'small.csv') == b'a,b\n1,3\n'
+    assert counters()['objects_skipped'] == 1
+
+
+def test_skip_unchanged_ignores_object_changed_elsewhere(s3, bucket):
+    data = payload(2 * PART_SIZE + 1000)
+    upload(s3, bucket, 'data.bin', data, 'skip-unchanged')
+    # Objeto regravado fora do writer: o índice local não vale mais para ele
+    other = payload(2 * PART_SIZE + 1000, seed=2)
+    upload(s3, bucket, 'data.bin', other, 'overwrite')
+
+    writer = upload(s3, bucket, 'data.bin', data, 'skip-unchanged')
+
+    assert not writer.skipped
+    assert read_object(s3, bucket, 'data.bin') == data
+
+
+def test_resume_reuses_parts_of_interrupted_upload(s3, bucket, counters):
+    data = payload(3 * PART_SIZE + 1000)
+    with pytest.raises(RuntimeError):
+        with MultipartUploadWriter(s3, bucket, 'data.bin', part_size=PART_SIZE, mode='resume') as writer:
+            writer.write(data[:2 * PART_SIZE + 10])
+            # As duas partes completas terminam de subir antes da interrupção
+            wait(writer._futures)
+            raise RuntimeError('conexão perdida')
+
+    # No modo resume o upload interrompido fica no servidor
+    uploads = pending_uploads(s3, bucket)
+    assert len(uploads) == 1
+    counters()
+
+    writer = upload(s3, bucket, 'data.bin', data, 'resume')
+
+    assert read_object(s3, bucket, 'data.bin') == data
+    recorded = counters()
+    assert recorded['parts_resumed'] == 2
+    assert recorded['bytes_uploaded'] == len(data) - 2 * PART_SIZE
+    assert pending_uploads(s3, bucket) == []
+
+
+def test_resume_reuploads_parts_that_changed(s3, bucket, counters):
+    data = payload(2 * PART_SIZE + 1000)
+    with pytest.raises(RuntimeError):
+        with MultipartUploadWriter(s3, bucket, 'data.bin', part_size=PART_SIZE, mode='resume') as writer:
+            writer.write(data[:2 * PART_SIZE])
+            wait(writer._futures)
+            raise RuntimeError('conexão perdida')
+    counters()
+
+    # Saída diferente na nova tentativa: só a parte com o mesmo MD5 é reaproveitada
+    changed = data[:PART_SIZE] + payload(PART_SIZE + 1000, seed=3)
+    upload(s3, bucket, 'data.bin', changed, 'resume')
+
+    assert read_object(s3, bucket, 'data.bin') == changed
+    assert counters()['parts_resumed'] == 1
+
+
+def test_resume_starts_over_when_upload_is_gone(s3, bucket):
+    data = payload(2 * PART_SIZE + 1000)
+    with pytest.raises(RuntimeError):
+        with MultipartUploadWriter(s3, bucket, 'data.bin', part_size=PART_SIZE, mode='resume') as writer:
+            writer.write(data[:PART_SIZE + 10])
+            wait(writer._futures)
+            raise RuntimeError('conexão perdida')
+    # Upload cancelado (ou expirado) no servidor
+    [pending] = pending_uploads(s3, bucket)
+    s3.abort_multipart_upload(Bucket=bucket, Key='data.bin', UploadId=pending['UploadId'])
+
+    upload(s3, bucket, 'data.bin', data, 'resume')
+
+    assert read_object(s3, bucket, 'data.bin') == data
+    assert pending_uploads(s3, bucket) == []
+
+
+def test_discard_cancels_upload_in_resume_mode(s3, bucket):
+    writer = MultipartUploadWriter(s3, bucket, 'data.bin', part_size=PART_SIZE, mode='resume')
+    writer.write(payload(PART_SIZE + 10))
+    writer.discard()
+
+    assert pending_uploads(s3, bucket) == []
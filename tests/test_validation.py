@@ -0,0 +1,105 @@
+"""
+check_table: regras de qualidade por linha e por arquivo
+"""
+
+import pandas as pd
+import pyarrow as pa
+
+from validation import check_table
+
+
+def test_row_checks_and_reasons():
+    table = pa.table({
+        'id': ['1', '2', '2', None],
+        'email': ['a@x.com', 'invalido', 'b@x.com', 'c@x.com'],
+        'idade': [30, 15, 200, None],
+        'uf': ['SP', 'RJ', 'XX', None],
+    })
+    rules = [
+        {'check': 'not_null', 'column': 'id'},
+        {'check': 'unique', 'column': 'id'},
+        {'check': 'regex', 'column': 'email', 'pattern': r'^[^@]+@[^@]+\.[a-z]+$'},
+        {'check': 'range', 'column': 'idade', 'min': 18, 'max': 120},
+        {'check': 'in', 'column': 'uf', 'values': ['SP', 'RJ']},
+    ]
+
+    valid, reasons, report = check_table(table, rules)
+
+    assert valid.tolist() == [True, False, False, False]
+    assert reasons.tolist() == ['', 'regex:email,range:idade', 'unique:id,range:idade,in:uf', 'not_null:id']
+    assert report['rows'] == 4
+    assert report['rejected'] == 3
+    assert report['violations'] == {'not_null:id': 1, 'unique:id': 1, 'regex:email': 1, 'range:idade': 2,
+                                    'in:uf': 1}
+
+
+def test_struct_fields_use_dotted_names():
+    table = pa.table({'endereco': pa.array([{'cep': '01310-100'}, {'cep': '123'}])})
+
+    valid, _, _ = check_table(table, [{'check': 'regex', 'column': 'endereco.cep', 'pattern': r'^\d{5}-?\d{3}$'}])
+
+    assert valid.tolist() == [True, False]
+
+
+def test_dictionary_columns_are_decoded():
+    table = pa.table({'uf': pa.array(['SP', 'MG', 'SP']).dictionary_encode()})
+
+    valid, _, _ = check_table(table, [{'check': 'in', 'column': 'uf', 'values': ['SP']}])
+
+    assert valid.tolist() == [True, False, True]
+
+
+def test_cnpj_check_digits():
+    table = pa.table({'cnpj': ['11.222.333/0001-81', '11222333000181', '11.222.333/0001-82', '00.000.000/0000-00',
+                               'abc', None]})
+
+    valid, _, _ = check_table(table, [{'check': 'cnpj', 'column': 'cnpj'}])
+
+    assert valid.tolist() == [True, True, False, False, False, True]
+
+
+def test_failed_table_check_rejects_every_row():
+    table = pa.table({'email': ['a@x.com', None, None]})
+
+    valid, reasons, report = check_table(table, [{'check': 'null_ratio', 'column': 'email', 'max': 0.5}])
+
+    assert not valid.any()
+    assert reasons.tolist() == ['null_ratio:email'] * 3
+    assert report['failed_checks'] == ['null_ratio:email']
+
+
+def test_missing_columns_are_skipped():
+    table = pa.table({'id': ['1']})
+
+    valid, _, report = check_table(table, [{'check': 'in', 'column': 'regiao', 'values': ['Sul']}])
+
+    assert valid.tolist() == [True]
+    assert report['skipped_checks'] == ['in:regiao']
+
+
+def test_null_typed_column_only_fails_not_null():
+    # Coluna só com nulos em um arquivo Parquet/JSON tem tipo null
+    table = pa.table({'uf': pa.nulls(2), 'idade': pa.nulls(2)})
+    rules = [
+        {'check': 'in', 'column': 'uf', 'values': ['SP']},
+        {'check': 'range', 'column': 'idade', 'min': 18},
+        {'check': 'regex', 'column': 'uf', 'pattern': '^[A-Z]{2}$'},
+    ]
+
+    valid, _, report = check_table(table, rules)
+    assert valid.tolist() == [True, True]
+    assert report['violations'] == {}
+
+    valid, _, report = check_table(table, [{'check': 'not_null', 'column': 'uf'}])
+    assert valid.tolist() == [False, False]
+
+
+def test_accepts_dataframe_and_empty_table():
+    valid, _, report = check_table(pd.DataFrame({'idade': [10, 20]}), [{'check': 'range', 'column': 'idade',
+                                                                         'min': 18}])
+    assert valid.tolist() == [False, True]
+
+    valid, _, report = check_table(pa.table({'idade': pa.array([], type=pa.int64())}),
+                                   [{'check': 'range', 'column': 'idade', 'min': 18}])
+    assert len(valid) == 0
+    assert report['rejected'] == 0